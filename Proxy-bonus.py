@@ -5,41 +5,740 @@
 #    to determine if a new copy is needed from the origin server.
 #
 # 2. Pre-fetching Associated Files: When an HTML page is fetched, the proxy 
-#    analyzes it for href and src attributes to identify associated resources,
+#    analyzes it for the stylesheets, scripts, images and fonts it links to,
 #    then pre-fetches and caches these resources.
 #
 # 3. Support for Custom Ports: The proxy handles URLs with explicit port numbers
 #    (hostname:portnumber/file) by extracting the port and connecting to it.
+#
+# 4. Concurrent Client Handling: Accepted connections are handed to a bounded
+#    pool of worker threads, so a slow client or origin server only ties up
+#    one worker instead of the whole proxy.
+#
+# 5. asyncio Serving Mode: With "--mode async" a single event loop serves all
+#    clients with non-blocking sockets (see proxy_async.py).
+#
+# 6. Multi-Process Workers: With "--processes N" a supervisor forks N worker
+#    processes that each bind the proxy port with SO_REUSEPORT and share the
+#    on-disk cache. Dead workers are restarted. Cache files are written to a
+#    temporary file and renamed into place, so no worker ever reads a
+#    half-written object.
+#
+# 7. Persistent Client Connections: HTTP/1.1 clients keep their connection
+#    open between requests (keep-alive) and may pipeline requests, which are
+#    answered in order while queued cache misses are fetched in parallel.
+#
+# 8. Origin Connection Pool: Connections to origin servers are kept alive and
+#    reused for later misses and prefetches to the same host and port, within
+#    per-host and total limits (see proxy_pool.py). The asyncio mode keeps a
+#    pool of its own within the same limits (see proxy_async.py).
+#
+# 9. DNS Cache: Resolved origin addresses (A and AAAA) are cached for a TTL,
+#    unknown names for a shorter one, and concurrent lookups of one name
+#    share a single query (see proxy_dns.py). Hit and miss counters are
+#    reported at http://proxy.stats/ (see proxy_stats.py).
+#
+# 10. Memory Cache: Small objects are kept in an LRU cache in memory within a
+#     byte budget, so hits on hot assets are answered without file system
+#     calls. Rewriting the disk copy drops the memory copy.
+#
+# 11. Cache Index: Expiry time, status, validators and sizes of every cached
+#     object are computed once when it is stored and kept in an index that
+#     is saved to ./cache/index.sqlite, so freshness checks do not re-read
+#     and re-parse cached headers.
+#
+# 12. Conditional Revalidation: A stale cached copy with an ETag or
+#     Last-Modified header is revalidated with If-None-Match and
+#     If-Modified-Since. A 304 Not Modified answer refreshes the cached copy,
+#     which is then served without downloading the body again.
+#
+# 13. Collapsed Forwarding: Concurrent misses on the same object, including
+#     a miss on an object being prefetched, share one origin fetch. The
+#     first request leads it and the others stream the response from the
+#     leader's cache file as it is written (see proxy_inflight.py).
+#
+# 14. Stale-While-Revalidate and Stale-If-Error: Within a configurable window
+#     past expiry (or the one the response's stale-while-revalidate directive
+#     gives) a stale copy is served at once and refreshed in the background.
+#     Within the stale-if-error window a stale copy is served instead of an
+#     error when the origin server cannot be reached, times out or answers
+#     with a server error.
+#
+# 15. Disk Quota: Cached files are kept within a configurable number of bytes
+#     ("--disk-cache-size"). When a store goes over it, the cache index evicts
+#     objects down to 90% of the quota in LRU, LFU or GDSF (size-aware) order
+#     ("--eviction-policy"), using the access times and hit counts it records.
+#     Worker processes ("--processes N") each keep their own index, so the
+#     quota is split evenly between them: each keeps the objects it knows of
+#     within its share, and together they stay within the quota.
+#
+# 16. Hashed Cache Layout: Objects are stored under the SHA-1 of their URL in
+#     two levels of shard directories (./cache/ab/cd/<hash>), with the URL
+#     recorded next to each one, so directories stay small and no URL makes
+#     an odd or colliding file name. A cache in the old ./<hostname>/<path>
+#     layout is migrated at startup.
+#
+# 17. Compressed Storage: Text bodies (HTML, CSS, JavaScript, JSON, XML, SVG)
+#     are stored gzip-compressed ("--compress-level", 0 turns it off).
+#     Clients sending "Accept-Encoding: gzip" get the stored bytes directly
+#     with Content-Encoding: gzip; other clients get the body inflated as it
+#     is sent, with its original Content-Length.
+#
+# 18. Packfile Store: Objects up to "--pack-object-size" bytes are appended to
+#     large segment files under ./cache/packs instead of getting a file each,
+#     and read back through a memory map. Segments that are mostly dead
+#     records are compacted in the background (see proxy_pack.py).
+#
+# 19. Fast Startup: The cache index is saved as an SQLite snapshot, writing
+#     only the entries that changed, in one crash-safe transaction. At
+#     startup the proxy accepts connections at once while a background
+#     thread loads the snapshot, imports caches in the legacy layout (like
+#     the one create_cache.py writes) and reconciles the index with the disk.
+#
+# 20. Range Requests: GETs with a Range header for a cached object are
+#     answered with 206 Partial Content, a single range or several as
+#     multipart/byteranges, sent from the cache file by offset. On a miss
+#     the whole object is fetched in the background and each range is sent
+#     as soon as its bytes arrive. If-Range is honoured; unsatisfiable
+#     ranges get 416.
+#
+# 21. Prefetch Worker Pool: Resources linked from cached pages are queued on
+#     one shared queue, which skips resources already queued, in flight or
+#     cached, and fetched by "--prefetch-workers" threads, at most
+#     "--prefetch-per-host" at a time from any one origin server.
+#
+# 22. Streaming Link Extraction: HTML pages and stylesheets are scanned for
+#     links chunk by chunk as they are relayed (src, href, srcset, preloads,
+#     <base href>, CSS url() and @import; see proxy_links.py), so linked
+#     resources are prefetched before the page has finished downloading.
+#
+# 23. Prefetch Policy: Queued resources are fetched stylesheets and scripts
+#     first, then fonts, then images. Each page prefetches at most
+#     "--prefetch-page-count" resources and "--prefetch-page-bytes" bytes,
+#     none larger than "--prefetch-max-size" by Content-Length or as it
+#     arrives, from its own origin only ("--prefetch-scope", with an allow
+#     list in "--prefetch-allow"). The links of prefetched stylesheets are
+#     followed "--prefetch-css-depth" stylesheets deep.
+#
+# 24. Learned Prefetching: For every page whose links were extracted the
+#     proxy counts how often clients request each linked resource soon
+#     after the page (by its Referer), in bounded counters that decay over
+#     time and are saved to ./cache/prefetch.sqlite. Links followed up less
+#     than "--prefetch-threshold" of the time are no longer prefetched.
+#     Prefetch precision and recall are reported at http://proxy.stats/
+#     (see proxy_learning.py).
+#
+# 25. Prefetch Throttling: Prefetching slows to one fetch at a time when the
+#     connections waiting for a worker, the client requests being served or
+#     the average origin latency reach "--prefetch-max-queue-depth",
+#     "--prefetch-max-active" or "--prefetch-max-latency", and stops at
+#     twice those. Queued prefetches are cancelled when a client has cached
+#     the object meanwhile, the page that linked it has been evicted, or
+#     they have waited too long.
 
 # Include the libraries for socket and system calls
 import socket
 import sys
 import os
-import re
 import time
+import signal
+import tempfile
 import threading
-from datetime import datetime
-from urllib.parse import urlparse, urljoin
+import queue
+import argparse
+import zlib
 
-# 1MB buffer size
-BUFFER_SIZE = 1000000
+from proxy_http import (SocketReader, read_request, build_origin_request, relay_response, get_status,
+                        prepare_client_head, bad_gateway_response, bad_request_response, get_content_length,
+                        prepare_range_response, join_ranges,
+                        KEEPALIVE_TIMEOUT, MAX_REQUESTS_PER_CONNECTION, ORIGIN_ERROR_STATUSES)
+from proxy_cache import (get_cache_location, get_cache_url, is_cache_fresh, read_cache_head, cache_index, memory_cache, CacheFileChanged,
+                         conditional_headers, refresh_cached_response, may_serve_stale, migrate_legacy_cache,
+                         MEMORY_CACHE_SIZE, MEMORY_OBJECT_SIZE, STALE_WHILE_REVALIDATE, STALE_IF_ERROR,
+                         DISK_CACHE_SIZE, EVICTION_POLICY, EVICTION_POLICIES, COMPRESS_LEVEL, cache_compression,
+                         prepare_stored_head, read_original_size, inflate_body, read_packed_object)
+from proxy_inflight import inflight_fetches
+from proxy_pool import origin_pool, MAX_CONNECTIONS_PER_HOST, MAX_CONNECTIONS_TOTAL
+from proxy_dns import dns_cache, DNS_TTL, DNS_NEGATIVE_TTL
+from proxy_pack import pack_store, PACK_OBJECT_SIZE
+from proxy_stats import STATS_HOSTNAME, stats_response
+from proxy_prefetch import (PrefetchPage, start_refresh, start_background_fetch, prefetch_queue, prefetch_policy,
+                            prefetch_throttle, PREFETCH_WORKERS, PREFETCH_PER_HOST, PREFETCH_SCOPES, PREFETCH_SCOPE,
+                            PREFETCH_PAGE_COUNT, PREFETCH_PAGE_BYTES, PREFETCH_MAX_SIZE, PREFETCH_CSS_DEPTH,
+                            PREFETCH_MAX_QUEUE_DEPTH, PREFETCH_MAX_ACTIVE, PREFETCH_MAX_LATENCY)
+from proxy_learning import prefetch_learner, PREFETCH_THRESHOLD
+from proxy_async import serve_async
 
-def main():
-    if len(sys.argv) <= 2:
-        print('Usage : "python Proxy-bonus.py server_ip server_port"\n[server_ip : IP Address Of Proxy Server]\n[server_port : Port Of Proxy Server]')
-        sys.exit(2)
-    
-    # Get the command line arguments
-    proxyHost = sys.argv[1]
-    proxyPort = int(sys.argv[2])
-    
-    # Create a server socket, bind it to a port and start listening
+# Number of worker threads serving clients concurrently
+WORKER_POOL_SIZE = 16
+
+# Number of pending connections the kernel queues before accept()
+LISTEN_BACKLOG = 128
+
+# Accepted connections waiting for a free worker
+CLIENT_QUEUE_SIZE = 256
+
+# Seconds a worker waits on a silent client before giving up
+CLIENT_TIMEOUT = 30
+
+# Most pipelined requests read ahead from one client connection
+MAX_PIPELINE_DEPTH = 8
+
+# Bytes of an early-fetched pipelined response kept in memory before spilling to disk
+SPOOL_MEMORY_SIZE = 1024 * 1024
+SPOOL_COPY_SIZE = 65536
+
+# Seconds the supervisor waits before restarting a dead worker process
+RESTART_DELAY = 1
+
+def send_cached_response(clientSocket, cacheLocation, method, keep_alive, stale=False, accept_gzip=False,
+                         byte_range=None):
+    """Send a cached object to the client, framed for its connection.
+
+    Small objects are read whole and kept in the memory cache for the next
+    hit. For larger ones only the header block is read into memory; the body
+    is sent straight from the cache file with socket.sendfile, which uses
+    os.sendfile. Objects in the packfile store are read from its mapping and
+    sent like memory cache hits. stale is True when a stale copy is served
+    on purpose.
+    A compressed body is inflated as it is sent unless accept_gzip is True.
+    byte_range is the ByteRange of a Range request, answered with just the
+    parts it asks for unless the body has to be inflated.
+    """
+    # BONUS FEATURE 18: Packfile Store
+    packed = read_packed_object(cacheLocation, stale)
+    if packed is not None:
+        head, body = packed
+        return send_memory_response(clientSocket, head, body, method, keep_alive, accept_gzip, byte_range)
+    generation = memory_cache.generation
+    # Check wether the file is currently in the cache
+    with open(cacheLocation, "rb") as cacheFile:
+        print('Cache hit! Loading from cache file: ' + cacheLocation)
+        head, body_offset = read_cache_head(cacheFile)
+        file_stat = os.fstat(cacheFile.fileno())
+        cache_index.confirm(cacheLocation, head, file_stat, stale)
+        body_length = file_stat.st_size - body_offset
+        if memory_cache.fits(body_length) and not stale:
+            cacheFile.seek(body_offset)
+            body = cacheFile.read(body_length)
+            memory_cache.put(cacheLocation, head, body, file_stat, generation)
+            return send_memory_response(clientSocket, head, body, method, keep_alive, accept_gzip, byte_range)
+
+        # BONUS FEATURE 17: Compressed Storage
+        sentHead, inflate = prepare_stored_head(head, accept_gzip)
+        # BONUS FEATURE 20: Range Requests
+        ranged = None if inflate else prepare_range_response(byte_range, sentHead, body_length)
+        if ranged is not None:
+            return send_file_ranges(clientSocket, cacheFile, body_offset, ranged, keep_alive)
+        sent_length = read_original_size(cacheFile, file_stat.st_size) if inflate else body_length
+        clientHead, keep_alive = prepare_client_head(sentHead, keep_alive, sent_length)
+        # ProxyServer finds a cache hit
+        # Send back response to client 
+        # ~~~~ INSERT CODE ~~~~
+        clientSocket.sendall(clientHead)
+        if method != 'HEAD' and body_length > 0 and inflate:
+            for piece in inflate_body(cacheFile, body_offset, body_length):
+                clientSocket.sendall(piece)
+        elif method != 'HEAD' and body_length > 0:
+            clientSocket.sendfile(cacheFile, body_offset, body_length)
+        # ~~~~ END CODE INSERT ~~~~
+    print('Sent to the client:')
+    print('> ' + str(head[:100]))
+    return keep_alive
+
+def send_memory_response(clientSocket, head, body, method, keep_alive, accept_gzip=False, byte_range=None):
+    """Send a cached object held in memory to the client in one write."""
+    head, inflate = prepare_stored_head(head, accept_gzip)
+    if inflate:
+        body = zlib.decompress(body, zlib.MAX_WBITS | 16)
+    # BONUS FEATURE 20: Range Requests
+    ranged = prepare_range_response(byte_range, head, len(body))
+    if ranged is not None:
+        head, parts, trailer = ranged
+        body = join_ranges(body, parts, trailer)
+    clientHead, keep_alive = prepare_client_head(head, keep_alive, len(body))
+    if method == 'HEAD':
+        clientSocket.sendall(clientHead)
+    else:
+        clientSocket.sendall(clientHead + body)
+    return keep_alive
+
+def send_file_ranges(clientSocket, cacheFile, body_offset, ranged, keep_alive, fetch=None):
+    """Send a range response, each part straight from a cache file by offset.
+
+    ranged is what prepare_range_response returned. With fetch, cacheFile
+    is the leader's temporary file and each part is sent as its bytes arrive.
+    """
+    rangeHead, parts, trailer = ranged
+    clientHead, keep_alive = prepare_client_head(rangeHead, keep_alive)
+    clientSocket.sendall(clientHead)
+    for prefix, first, last in parts:
+        clientSocket.sendall(prefix)
+        offset, end = body_offset + first, body_offset + last + 1
+        while offset < end:
+            available = end
+            if fetch is not None:
+                available, finished, stored = fetch.wait(offset)
+                if available <= offset:
+                    # The leader failed; the client cannot tell where a broken response ends
+                    return False
+            count = min(available, end) - offset
+            clientSocket.sendfile(cacheFile, offset, count)
+            offset += count
+    clientSocket.sendall(trailer)
+    return keep_alive
+
+def fetch_from_origin(request, clientSocket, cacheLocation, keep_alive, revalidate=True, collapse=True):
+    """Relay a request to the origin server and stream the response back.
+
+    A stale cached copy with validators is revalidated unless revalidate is
+    False, and served from the cache if the origin says it is not modified.
+    Unless collapse is False, a request for an object that is already being
+    fetched follows that fetch instead of starting another one.
+    """
+    method, hostname, port, resource = request.method, request.hostname, request.port, request.resource
+
+    # BONUS FEATURE 13: Collapsed Forwarding
+    fetch = None
+    if collapse and method in ('GET', 'HEAD'):
+        fetch, leading = inflight_fetches.join(cacheLocation, lead=method == 'GET')
+        # BONUS FEATURE 20: Range Requests
+        if leading and request.byte_range() is not None:
+            # Fetch the whole object in the background and send the range
+            # from it as soon as those bytes arrive
+            start_background_fetch(hostname, port, resource, cacheLocation, fetch)
+            leading = False
+        if fetch is not None and not leading:
+            return follow_fetch(fetch, request, clientSocket, cacheLocation, keep_alive)
+
+    # BONUS FEATURE 12: Conditional Revalidation
+    validators = []
+    if revalidate and method in ('GET', 'HEAD'):
+        validators = conditional_headers(cache_index.lookup(cacheLocation))
+    intercept = (304,) if validators else ()
+
+    # BONUS FEATURE 14: Stale-If-Error
+    stale_if_error = method in ('GET', 'HEAD') and may_serve_stale(cacheLocation, error=True)
+    if stale_if_error:
+        intercept += ORIGIN_ERROR_STATUSES
+
+    # cache miss.  Get resource from origin server
+    print(f'Connecting to: {hostname} on port {port}\n')
+    try:
+        # Construct the request to send to the origin server
+        originRequest = build_origin_request(method, hostname, resource, request.body, headers=validators)
+
+        # Request the web resource from origin server
+        print('Forwarding request to origin server:')
+        for line in originRequest.split('\r\n'):
+            print('> ' + line)
+
+        # Send it on a pooled keep-alive connection and stream the response
+        # from the origin server to the client, teeing it into the cache as
+        # it arrives. BONUS FEATURE 2: the resources linked from a cached page
+        # are queued for prefetching as the page streams through, within the
+        # page's prefetch budget (BONUS FEATURE 23)
+        # ~~~~ INSERT CODE ~~~~
+        url = get_cache_url(hostname, port, resource)
+        page = PrefetchPage(hostname, port, url, cacheLocation)
+        relay = origin_pool.send_request(
+            hostname, port, originRequest.encode() + request.body,
+            lambda originReader: relay_response(originReader, clientSocket, cacheLocation, method, keep_alive,
+                                                intercept, fetch, url, page.queue),
+            idempotent=method in ('GET', 'HEAD'))
+        # ~~~~ END CODE INSERT ~~~~
+        if relay.intercepted is not None and get_status(relay.intercepted) == 304:
+            return serve_not_modified(request, clientSocket, cacheLocation, relay.intercepted, keep_alive, fetch)
+        if relay.intercepted is not None:
+            print(f'Origin server answered with status {get_status(relay.intercepted)}')
+            stale_keep_alive = serve_stale(clientSocket, cacheLocation, method, keep_alive, error=True,
+                                           accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+            if stale_keep_alive is not None:
+                return stale_keep_alive
+            clientSocket.sendall(bad_gateway_response('origin server error', keep_alive))
+            return keep_alive
+
+        print('origin response received')
+        return relay.keep_alive
+    except OSError as err:
+        print('origin server request failed. ' + str(err))
+        if stale_if_error:
+            stale_keep_alive = serve_stale(clientSocket, cacheLocation, method, keep_alive, error=True,
+                                           accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+            if stale_keep_alive is not None:
+                return stale_keep_alive
+        # Send error response to client
+        clientSocket.sendall(bad_gateway_response(err, keep_alive))
+        return keep_alive
+    finally:
+        if fetch is not None:
+            inflight_fetches.end(fetch)
+
+def serve_stale(clientSocket, cacheLocation, method, keep_alive, error=False, accept_gzip=False, byte_range=None):
+    """Send a stale cached copy on purpose; error says whether the origin failed.
+
+    Returns keep_alive, or None if the copy has gone.
+    """
+    print('Serving stale copy: ' + cacheLocation)
+    try:
+        keep_alive = send_cached_response(clientSocket, cacheLocation, method, keep_alive, stale=True,
+                                          accept_gzip=accept_gzip, byte_range=byte_range)
+    except FileNotFoundError:
+        print('Cache file disappeared')
+        cache_index.remove(cacheLocation)
+        return None
+    cache_index.count_stale(error)
+    return keep_alive
+
+def serve_not_modified(request, clientSocket, cacheLocation, validated_head, keep_alive, fetch=None):
+    """Refresh a cached copy the origin says is not modified and send it.
+
+    Followers of fetch are let go as soon as the copy is refreshed. If the
+    copy went away in the meantime it is fetched again in full.
+    """
+    print('Origin says cached copy is not modified: ' + cacheLocation)
+    refreshed = refresh_cached_response(cacheLocation, validated_head)
+    if fetch is not None:
+        fetch.finish(refreshed)
+    if refreshed:
+        try:
+            return send_cached_response(clientSocket, cacheLocation, request.method, keep_alive,
+                                        accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+        except FileNotFoundError:
+            print('Cache file disappeared - fetching from origin')
+        except CacheFileChanged as e:
+            print(f'{e} - fetching from origin')
+    return fetch_from_origin(request, clientSocket, cacheLocation, keep_alive, revalidate=False, collapse=False)
+
+def follow_fetch(fetch, request, clientSocket, cacheLocation, keep_alive):
+    """Answer a request by following another thread's fetch of the same object.
+
+    The body is sent from the leader's temporary cache file as it grows. If
+    there is nothing to follow, the object is served from the cache when
+    the leader stored it, and fetched separately otherwise.
+    """
+    print('Following in-flight fetch of ' + cacheLocation)
+    tempFile, head = fetch.attach()
+    if tempFile is None:
+        if fetch.stored:
+            try:
+                return send_cached_response(clientSocket, cacheLocation, request.method, keep_alive,
+                                            accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+            except FileNotFoundError:
+                print('Cache file disappeared - fetching from origin')
+            except CacheFileChanged as e:
+                print(f'{e} - fetching from origin')
+        return fetch_from_origin(request, clientSocket, cacheLocation, keep_alive, collapse=False)
+
+    with tempFile:
+        sentHead, inflate = prepare_stored_head(head, request.accepts_gzip())
+        # BONUS FEATURE 20: Range Requests
+        length = get_content_length(head.decode('latin-1'))
+        ranged = None if inflate or length is None else prepare_range_response(request.byte_range(), sentHead, length)
+        if ranged is not None:
+            return send_file_ranges(clientSocket, tempFile, len(head), ranged, keep_alive, fetch)
+        clientHead, keep_alive = prepare_client_head(sentHead, keep_alive)
+        clientSocket.sendall(clientHead)
+        offset = len(head)
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16) if inflate else None
+        while request.method != 'HEAD':
+            available, finished, stored = fetch.wait(offset)
+            if available > offset and decompressor is not None:
+                clientSocket.sendall(decompressor.decompress(os.pread(tempFile.fileno(), available - offset, offset)))
+                offset = available
+            elif available > offset:
+                clientSocket.sendfile(tempFile, offset, available - offset)
+                offset = available
+            elif finished:
+                # The client cannot tell where a broken response ends
+                keep_alive = keep_alive and stored
+                break
+    return keep_alive
+
+def is_cache_hit(request):
+    """Check whether a request can be answered from a fresh cached copy."""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    cacheLocation = get_cache_location(request.hostname, request.port, request.resource)
+    return is_cache_fresh(cacheLocation)
+
+def serve_request(request, clientSocket, keep_alive):
+    """Answer one request from the cache or the origin server.
+
+    Returns whether the client connection can stay open afterwards.
+    """
+    if request.hostname == STATS_HOSTNAME:
+        clientSocket.sendall(stats_response(keep_alive))
+        return keep_alive
+
+    # Check if resource is in cache
+    cacheLocation = get_cache_location(request.hostname, request.port, request.resource)
+    print('Cache location:\t\t' + cacheLocation)
+
+    # BONUS FEATURE 24: learn which linked resources clients go on to request
+    if request.method == 'GET':
+        prefetch_learner.observe(get_cache_url(request.hostname, request.port, request.resource), cacheLocation,
+                                 request.headers.get('referer'))
+
+    # Hot objects are answered from memory without touching the disk
+    if request.method in ('GET', 'HEAD'):
+        entry = memory_cache.get(cacheLocation)
+        if entry:
+            print('Memory cache hit: ' + cacheLocation)
+            return send_memory_response(clientSocket, entry.head, entry.body, request.method, keep_alive,
+                                        request.accepts_gzip(), request.byte_range())
+
+    # BONUS FEATURE 1: Expires Header Checking
+    if is_cache_hit(request):
+        try:
+            return send_cached_response(clientSocket, cacheLocation, request.method, keep_alive,
+                                        accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+        except FileNotFoundError:
+            print('Cache file disappeared - fetching from origin')
+            cache_index.remove(cacheLocation)
+        except CacheFileChanged as e:
+            print(f'{e} - fetching from origin')
+
+    # BONUS FEATURE 14: Stale-While-Revalidate
+    if request.method in ('GET', 'HEAD') and may_serve_stale(cacheLocation):
+        start_refresh(request.hostname, request.port, request.resource, cacheLocation)
+        stale_keep_alive = serve_stale(clientSocket, cacheLocation, request.method, keep_alive,
+                                       accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+        if stale_keep_alive is not None:
+            return stale_keep_alive
+    return fetch_from_origin(request, clientSocket, cacheLocation, keep_alive)
+
+class ResponseSpool:
+    """Stands in for the client socket while a pipelined response is fetched early.
+
+    Responses to pipelined requests must reach the client in request order.
+    Misses queued behind another response are fetched on their own thread into
+    a spool, so they download in parallel and are copied to the client as soon
+    as every earlier response has been sent.
+    """
+
+    def __init__(self, request, keep_alive):
+        self.request = request
+        self.keep_alive = keep_alive
+        self.spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE)
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self.fill)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def sendall(self, data):
+        self.spool.write(data)
+
+    def sendfile(self, file, offset=0, count=None):
+        """Copy part of a cache file into the spool, like socket.sendfile."""
+        file.seek(offset)
+        while count is None or count > 0:
+            data = file.read(SPOOL_COPY_SIZE if count is None else min(SPOOL_COPY_SIZE, count))
+            if not data:
+                break
+            self.spool.write(data)
+            if count is not None:
+                count -= len(data)
+
+    def fill(self):
+        try:
+            self.keep_alive = serve_request(self.request, self, self.keep_alive)
+        except Exception as e:
+            print(f"Error fetching pipelined request: {e}")
+            self.spool.write(bad_gateway_response(e))
+            self.keep_alive = False
+        finally:
+            self.finished.set()
+
+    def copy_to(self, clientSocket):
+        """Wait for the response, send it to the client and return keep_alive."""
+        self.finished.wait()
+        self.spool.seek(0)
+        while True:
+            data = self.spool.read(SPOOL_COPY_SIZE)
+            if not data:
+                break
+            clientSocket.sendall(data)
+        self.spool.close()
+        return self.keep_alive
+
+def serve_pipeline(requests, clientSocket):
+    """Answer pipelined requests in order while fetching queued misses in parallel.
+
+    requests is a list of (request, keep_alive). Cache hits are answered
+    straight from the cache as soon as the responses before them have been
+    sent; they never wait for an origin fetch of their own.
+    """
+    spools = {}
+    for index, (request, keep_alive) in enumerate(requests):
+        if index > 0 and not is_cache_hit(request):
+            spools[index] = ResponseSpool(request, keep_alive)
+
+    for index, (request, keep_alive) in enumerate(requests):
+        if index in spools:
+            keep_alive = spools[index].copy_to(clientSocket)
+        else:
+            keep_alive = serve_request(request, clientSocket, keep_alive)
+        if not keep_alive:
+            return False
+    return True
+
+def handle_client(clientSocket, clientAddr, options):
+    """Serve requests on a client connection until it closes or goes idle.
+
+    HTTP/1.1 connections stay open for up to options.max_requests requests.
+    Requests the client pipelines are read together and answered in order.
+    """
+    clientReader = SocketReader(clientSocket)
+    requests_served = 0
+    keep_alive = True
+
+    while keep_alive:
+        # Wait longer for the first request than between keep-alive requests
+        clientSocket.settimeout(CLIENT_TIMEOUT if requests_served == 0 else options.keepalive_timeout)
+        try:
+            # Get HTTP request from client
+            # ~~~~ INSERT CODE ~~~~
+            request = read_request(clientReader)
+            # ~~~~ END CODE INSERT ~~~~
+            if request is None:
+                break
+            requests = [request]
+            # Pick up any further requests the client has already pipelined
+            while clientReader.has_request() and len(requests) < MAX_PIPELINE_DEPTH:
+                requests.append(read_request(clientReader))
+        except socket.timeout:
+            print(f'Connection from {clientAddr} idle - closing')
+            break
+        except (ValueError, IndexError, UnicodeDecodeError) as e:
+            print(f"Error processing request: {e}")
+            # Send error response to client
+            clientSocket.sendall(bad_request_response(e))
+            break
+
+        framed = []
+        for request in requests:
+            requests_served += 1
+            keep_alive = request.wants_keep_alive() and requests_served < options.max_requests
+            framed.append((request, keep_alive))
+            if not keep_alive:
+                break
+
+        clientSocket.settimeout(CLIENT_TIMEOUT)
+        # BONUS FEATURE 25: prefetching backs off while clients are busy
+        prefetch_throttle.begin(len(framed))
+        try:
+            if len(framed) == 1:
+                request, keep_alive = framed[0]
+                keep_alive = serve_request(request, clientSocket, keep_alive)
+            else:
+                print(f'Serving {len(framed)} pipelined requests')
+                keep_alive = serve_pipeline(framed, clientSocket)
+        finally:
+            prefetch_throttle.end(len(framed))
+
+    try:
+        clientSocket.close()
+    except:
+        print('Failed to close client socket')
+
+def worker(clientQueue, options):
+    """Worker thread: take accepted connections off the queue and serve them."""
+    while True:
+        clientSocket, clientAddr = clientQueue.get()
+        try:
+            handle_client(clientSocket, clientAddr, options)
+        except Exception as e:
+            print(f"Worker failed while serving {clientAddr}: {e}")
+            try:
+                clientSocket.close()
+            except:
+                pass
+        finally:
+            clientQueue.task_done()
+
+def parse_options(args):
+    """Parse the optional settings that follow server_ip and server_port."""
+    parser = argparse.ArgumentParser(prog='Proxy-bonus.py')
+    parser.add_argument('--pool-size', type=int, default=WORKER_POOL_SIZE,
+                        help='number of worker threads serving clients')
+    parser.add_argument('--backlog', type=int, default=LISTEN_BACKLOG,
+                        help='accept backlog passed to listen()')
+    parser.add_argument('--mode', choices=['threads', 'async'], default='threads',
+                        help='serve clients from a thread pool or an asyncio event loop')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='fork this many SO_REUSEPORT worker processes under a supervisor')
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT,
+                        help='seconds an idle keep-alive client connection stays open')
+    parser.add_argument('--max-requests', type=int, default=MAX_REQUESTS_PER_CONNECTION,
+                        help='requests served on one client connection before closing it')
+    parser.add_argument('--origin-per-host', type=int, default=MAX_CONNECTIONS_PER_HOST,
+                        help='most pooled connections open to one origin server')
+    parser.add_argument('--origin-total', type=int, default=MAX_CONNECTIONS_TOTAL,
+                        help='most pooled origin connections open in total')
+    parser.add_argument('--dns-ttl', type=float, default=DNS_TTL,
+                        help='seconds a resolved hostname is cached')
+    parser.add_argument('--dns-negative-ttl', type=float, default=DNS_NEGATIVE_TTL,
+                        help='seconds a hostname that does not exist is remembered')
+    parser.add_argument('--memory-cache-size', type=int, default=MEMORY_CACHE_SIZE,
+                        help='bytes of small hot objects kept in memory (0 disables the memory cache)')
+    parser.add_argument('--memory-object-size', type=int, default=MEMORY_OBJECT_SIZE,
+                        help='largest object in bytes kept in the memory cache')
+    parser.add_argument('--stale-while-revalidate', type=float, default=STALE_WHILE_REVALIDATE,
+                        help='seconds past expiry a stale copy is served while it is refreshed in the background')
+    parser.add_argument('--stale-if-error', type=float, default=STALE_IF_ERROR,
+                        help='seconds past expiry a stale copy is served when the origin server fails')
+    parser.add_argument('--disk-cache-size', type=int, default=DISK_CACHE_SIZE,
+                        help='bytes of cache files kept on disk (0 for no limit), split evenly between '
+                             'worker processes')
+    parser.add_argument('--compress-level', type=int, choices=range(10), default=COMPRESS_LEVEL,
+                        help='zlib level text bodies are stored compressed with (0 stores them uncompressed)')
+    parser.add_argument('--eviction-policy', choices=sorted(EVICTION_POLICIES), default=EVICTION_POLICY,
+                        help='order in which cached objects are evicted to stay within the disk quota')
+    parser.add_argument('--pack-object-size', type=int, default=PACK_OBJECT_SIZE,
+                        help='largest object in bytes kept in the packfile store (0 gives every object its own file)')
+    parser.add_argument('--prefetch-workers', type=int, default=PREFETCH_WORKERS,
+                        help='worker threads fetching linked resources into the cache')
+    parser.add_argument('--prefetch-per-host', type=int, default=PREFETCH_PER_HOST,
+                        help='most resources prefetched from one origin server at a time')
+    parser.add_argument('--prefetch-scope', choices=PREFETCH_SCOPES, default=PREFETCH_SCOPE,
+                        help="hosts linked resources are prefetched from: the page's own origin, that and the "
+                             "--prefetch-allow hosts, or any host")
+    parser.add_argument('--prefetch-allow', default='',
+                        help='comma-separated hosts resources are also prefetched from with --prefetch-scope allow-list')
+    parser.add_argument('--prefetch-page-count', type=int, default=PREFETCH_PAGE_COUNT,
+                        help='most resources prefetched for one page')
+    parser.add_argument('--prefetch-page-bytes', type=int, default=PREFETCH_PAGE_BYTES,
+                        help='most bytes prefetched for one page')
+    parser.add_argument('--prefetch-max-size', type=int, default=PREFETCH_MAX_SIZE,
+                        help='largest resource in bytes that is prefetched')
+    parser.add_argument('--prefetch-css-depth', type=int, default=PREFETCH_CSS_DEPTH,
+                        help='stylesheets deep the links of prefetched stylesheets are prefetched (0 for none)')
+    parser.add_argument('--prefetch-max-queue-depth', type=int, default=PREFETCH_MAX_QUEUE_DEPTH,
+                        help='connections waiting for a worker thread at which prefetching slows down '
+                             '(and stops at twice as many; 0 for no limit)')
+    parser.add_argument('--prefetch-max-active', type=int, default=PREFETCH_MAX_ACTIVE,
+                        help='client requests being served at which prefetching slows down (0 for no limit)')
+    parser.add_argument('--prefetch-max-latency', type=float, default=PREFETCH_MAX_LATENCY,
+                        help='average seconds origin servers take to answer at which prefetching slows down '
+                             '(0 for no limit)')
+    parser.add_argument('--prefetch-threshold', type=float, default=PREFETCH_THRESHOLD,
+                        help='fraction of requests of a page a link must be followed up in to be prefetched '
+                             '(0 prefetches every link)')
+    return parser.parse_args(args)
+
+def open_server_socket(proxyHost, proxyPort, backlog, reuse_port=False):
+    """Create a server socket, bind it to a port and start listening."""
     try:
         # Create a server socket
         # ~~~~ INSERT CODE ~~~~
         serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         # ~~~~ END CODE INSERT ~~~~
+        if reuse_port:
+            # Let every worker process bind the same address; the kernel
+            # spreads incoming connections across their listen queues
+            serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         print('Created socket')
     except:
         print('Failed to create socket')
@@ -58,13 +757,27 @@ def main():
     try:
         # Listen on the server socket
         # ~~~~ INSERT CODE ~~~~
-        serverSocket.listen(5)  # Allow up to 5 queued connections
+        serverSocket.listen(backlog)
         # ~~~~ END CODE INSERT ~~~~
         print('Listening to socket')
     except:
         print('Failed to listen')
         sys.exit()
     
+    return serverSocket
+
+def serve_threads(serverSocket, options):
+    """Accept connections forever and serve them from a pool of worker threads."""
+    # Start the worker pool. The queue is bounded so that a flood of
+    # connections blocks accept() instead of growing memory without limit.
+    clientQueue = queue.Queue(CLIENT_QUEUE_SIZE)
+    prefetch_throttle.queue_depth = clientQueue.qsize
+    for i in range(options.pool_size):
+        workerThread = threading.Thread(target=worker, args=(clientQueue, options))
+        workerThread.daemon = True
+        workerThread.start()
+    print(f'Started {options.pool_size} worker threads')
+    
     # continuously accept connections
     while True:
         print('Waiting for connection...')
@@ -80,440 +793,131 @@ def main():
             print('Failed to accept connection')
             sys.exit()
     
-        # Get HTTP request from client
-        # and store it in the variable: message_bytes
-        # ~~~~ INSERT CODE ~~~~
-        message_bytes = b''
-        while True:
-            data = clientSocket.recv(BUFFER_SIZE)
-            message_bytes += data
-            # If either no more data or we've received the end of the HTTP request (blank line)
-            if not data or b'\r\n\r\n' in message_bytes:
-                break
-        # ~~~~ END CODE INSERT ~~~~
-    
+        # Hand the connection to a worker thread
+        clientQueue.put((clientSocket, clientAddr))
+
+def serve(serverSocket, options):
+    """Serve clients on a listening socket using the selected mode."""
+    # Load the cache index snapshot in the background and keep saving it
+    # while serving; on SIGTERM exit through the finally below so the latest
+    # changes are saved. The packfile store is opened first, so packed
+    # objects are found
+    pack_store.open()
+    pack_store.start_compactor()
+    cache_index.start_loader()
+    cache_index.start_saver()
+    prefetch_learner.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if options.mode == 'async':
+            serve_async(serverSocket, options)
+        else:
+            serve_threads(serverSocket, options)
+    finally:
+        cache_index.save()
+        prefetch_learner.save()
+
+def start_worker_process(proxyHost, proxyPort, options):
+    """Fork a worker process with its own SO_REUSEPORT listening socket."""
+    pid = os.fork()
+    if pid == 0:
+        # Child: serve until killed, never return into the supervisor loop
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exitCode = 0
         try:
-            message = message_bytes.decode('utf-8')
-            print('Received request:')
-            print('< ' + message)
-    
-            # Extract the method, URI and version of the HTTP client request 
-            requestParts = message.split()
-            method = requestParts[0]
-            URI = requestParts[1]
-            version = requestParts[2]
-    
-            print('Method:\t\t' + method)
-            print('URI:\t\t' + URI)
-            print('Version:\t' + version)
-            print('')
-    
-            # Get the requested resource from URI
-            # Remove http protocol from the URI
-            URI = re.sub('^(/?)http(s?)://', '', URI, count=1)
-    
-            # Remove parent directory changes - security
-            URI = URI.replace('/..', '')
-    
-            # BONUS FEATURE 3: Support for Custom Ports
-            # Extract hostname, port, and resource from URI
-            port = 80  # Default HTTP port
-            
-            # Check if there's a port specified in the hostname part
-            port_match = re.match(r'^([^/:]+):(\d+)(/.*)?$', URI)
-            if port_match:
-                hostname = port_match.group(1)
-                port = int(port_match.group(2))
-                resource = port_match.group(3) if port_match.group(3) else '/'
-                print(f"Found custom port: {port}")
-            else:
-                # Standard format without custom port
-                resourceParts = URI.split('/', 1)
-                hostname = resourceParts[0]
-                resource = '/'
-                
-                if len(resourceParts) == 2:
-                    # Resource is absolute URI with hostname and resource
-                    resource = resource + resourceParts[1]
-    
-            print('Requested Resource:\t' + resource)
-            print(f'Hostname: {hostname}, Port: {port}')
-    
-            # Check if resource is in cache
+            serverSocket = open_server_socket(proxyHost, proxyPort, options.backlog, reuse_port=True)
+            serve(serverSocket, options)
+        except SystemExit as e:
+            exitCode = e.code if isinstance(e.code, int) else 1
+        except BaseException as e:
+            print(f'Worker process {os.getpid()} crashed: {e}')
+            exitCode = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(exitCode)
+    print(f'Started worker process {pid}')
+    return pid
+
+def run_supervisor(proxyHost, proxyPort, options):
+    """Keep options.processes worker processes running, restarting any that die."""
+    workers = set()
+
+    def stop_workers(signum, frame):
+        for pid in workers:
             try:
-                # Create cache location key including port if not default
-                cache_key = hostname
-                if port != 80:
-                    cache_key += f"_{port}"
-                    
-                cacheLocation = './' + cache_key + resource
-                if cacheLocation.endswith('/'):
-                    cacheLocation = cacheLocation + 'default'
-    
-                print('Cache location:\t\t' + cacheLocation)
-    
-                # BONUS FEATURE 1: Expires Header Checking
-                use_cache = False
-                if os.path.isfile(cacheLocation):
-                    with open(cacheLocation, 'rb') as f:
-                        headers_data = f.read(1024)  # Read enough to get headers
-                        headers_text = headers_data.decode('utf-8', errors='replace')
-                        
-                        # Check for redirect - don't use cache for redirects
-                        status_line = headers_text.split('\r\n')[0]
-                        if '301 ' in status_line or '302 ' in status_line:
-                            print("Cache contains redirect response - not using")
-                            use_cache = False
-                        else:
-                            # Check for Cache-Control: max-age
-                            max_age_match = re.search(r'Cache-Control:.*?max-age=(\d+)', headers_text, re.IGNORECASE)
-                            if max_age_match:
-                                max_age = int(max_age_match.group(1))
-                                if max_age == 0:
-                                    print("Cache-Control: max-age=0 found, not using cache")
-                                    use_cache = False
-                                else:
-                                    # Check if file is still fresh based on modification time
-                                    file_mtime = os.path.getmtime(cacheLocation)
-                                    current_time = time.time()
-                                    if (current_time - file_mtime) > max_age:
-                                        print(f"Cache expired according to max-age: {max_age}s")
-                                        use_cache = False
-                                    else:
-                                        use_cache = True
-                            else:
-                                # BONUS FEATURE 1: Check for Expires header
-                                expires_match = re.search(r'Expires: (.*?)(\r\n|\r|\n)', headers_text, re.IGNORECASE)
-                                if expires_match:
-                                    expires_str = expires_match.group(1).strip()
-                                    try:
-                                        # Handle multiple date formats
-                                        for fmt in ["%a, %d %b %Y %H:%M:%S GMT", "%A, %d-%b-%y %H:%M:%S GMT", "%A, %d-%b-%Y %H:%M:%S GMT"]:
-                                            try:
-                                                expires_date = datetime.strptime(expires_str, fmt)
-                                                current_date = datetime.utcnow()
-                                                if current_date > expires_date:
-                                                    print(f"Cache expired according to Expires header: {expires_date}")
-                                                    use_cache = False
-                                                else:
-                                                    print(f"Cache valid according to Expires header: {expires_date}")
-                                                    use_cache = True
-                                                break
-                                            except ValueError:
-                                                continue
-                                    except Exception as e:
-                                        print(f"Error parsing Expires date: {e}")
-                                        use_cache = False
-                                else:
-                                    # No cache control directives found, use cache
-                                    use_cache = True
-                
-                if use_cache:
-                    # Check wether the file is currently in the cache
-                    cacheFile = open(cacheLocation, "rb")
-                    cacheData = cacheFile.read()
-    
-                    print('Cache hit! Loading from cache file: ' + cacheLocation)
-                    # ProxyServer finds a cache hit
-                    # Send back response to client 
-                    # ~~~~ INSERT CODE ~~~~
-                    clientSocket.sendall(cacheData)
-                    # ~~~~ END CODE INSERT ~~~~
-                    cacheFile.close()
-                    print('Sent to the client:')
-                    print('> ' + str(cacheData[:100]))
-                else:
-                    raise Exception("Cache validation failed or cache not usable")
-            except:
-                # cache miss.  Get resource from origin server
-                originServerSocket = None
-                # Create a socket to connect to origin server
-                # and store in originServerSocket
-                # ~~~~ INSERT CODE ~~~~
-                originServerSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                originServerSocket.settimeout(10)  # 10 second timeout
-                # ~~~~ END CODE INSERT ~~~~
-    
-                print(f'Connecting to: {hostname} on port {port}\n')
-                try:
-                    # Get the IP address for a hostname
-                    address = socket.gethostbyname(hostname)
-                    # Connect to the origin server
-                    # ~~~~ INSERT CODE ~~~~
-                    # BONUS FEATURE 3: Connect using the custom port
-                    originServerSocket.connect((address, port))
-                    # ~~~~ END CODE INSERT ~~~~
-                    print('Connected to origin Server')
-    
-                    originServerRequest = ''
-                    originServerRequestHeader = ''
-                    # Create origin server request line and headers to send
-                    # and store in originServerRequestHeader and originServerRequest
-                    # originServerRequest is the first line in the request and
-                    # originServerRequestHeader is the second line in the request
-                    # ~~~~ INSERT CODE ~~~~
-                    originServerRequest = method + ' ' + resource + ' HTTP/1.1'
-                    originServerRequestHeader = 'Host: ' + hostname + '\r\nConnection: close'
-                    # ~~~~ END CODE INSERT ~~~~
-    
-                    # Construct the request to send to the origin server
-                    request = originServerRequest + '\r\n' + originServerRequestHeader + '\r\n\r\n'
-    
-                    # Request the web resource from origin server
-                    print('Forwarding request to origin server:')
-                    for line in request.split('\r\n'):
-                        print('> ' + line)
-    
-                    try:
-                        originServerSocket.sendall(request.encode())
-                    except socket.error:
-                        print('Forward request to origin failed')
-                        sys.exit()
-    
-                    print('Request sent to origin server\n')
-    
-                    # Get the response from the origin server
-                    # ~~~~ INSERT CODE ~~~~
-                    response_bytes = b''
-                    try:
-                        while True:
-                            chunk = originServerSocket.recv(BUFFER_SIZE)
-                            if not chunk:
-                                break
-                            response_bytes += chunk
-                    except socket.timeout:
-                        print("Socket timeout while receiving - response might be incomplete")
-                    # ~~~~ END CODE INSERT ~~~~
-    
-                    # Send the response to the client
-                    # ~~~~ INSERT CODE ~~~~
-                    clientSocket.sendall(response_bytes)
-                    # ~~~~ END CODE INSERT ~~~~
-    
-                    # Check if we should cache this response
-                    should_cache = True
-                    
-                    # Check if it's a redirect response
-                    is_redirect = False
-                    is_html = False
-                    try:
-                        # Split headers and body
-                        header_end = response_bytes.find(b'\r\n\r\n')
-                        if header_end > 0:
-                            headers = response_bytes[:header_end].decode('utf-8', errors='replace')
-                            body = response_bytes[header_end+4:]
-                            
-                            # Check response status code
-                            status_line = headers.split('\r\n')[0]
-                            if '301 ' in status_line or '302 ' in status_line:
-                                print(f"Redirect response detected: {status_line}")
-                                should_cache = False
-                                is_redirect = True
-                            
-                            # Check for no-store directive
-                            if 'Cache-Control: no-store' in headers or 'Cache-Control: no-cache' in headers:
-                                should_cache = False
-                            
-                            # Check if this is HTML content
-                            if 'Content-Type: text/html' in headers:
-                                is_html = True
-                    except Exception as e:
-                        print(f"Error checking response headers: {e}")
-                    
-                    # If we should cache, save the response
-                    if should_cache:
-                        # Create directory structure for cache
-                        cache_key = hostname
-                        if port != 80:
-                            cache_key += f"_{port}"
-                            
-                        cacheLocation = './' + cache_key + resource
-                        if cacheLocation.endswith('/'):
-                            cacheLocation = cacheLocation + 'default'
-                            
-                        cacheDir, file = os.path.split(cacheLocation)
-                        print('cached directory ' + cacheDir)
-                        if not os.path.exists(cacheDir):
-                            os.makedirs(cacheDir)
-                        cacheFile = open(cacheLocation, 'wb')
-        
-                        # Save origin server response in the cache file
-                        # ~~~~ INSERT CODE ~~~~
-                        cacheFile.write(response_bytes)
-                        # ~~~~ END CODE INSERT ~~~~
-                        cacheFile.close()
-                        print('cache file closed')
-                        
-                        # BONUS FEATURE 2: Pre-fetching Associated Files
-                        if is_html and not is_redirect:
-                            # Start a thread to prefetch resources
-                            def prefetch_resources():
-                                try:
-                                    # Extract URLs from HTML (href and src attributes)
-                                    html_content = body.decode('utf-8', errors='replace')
-                                    
-                                    # Find all href attributes
-                                    href_urls = re.findall(r'href=[\'"]?([^\'" >]+)', html_content)
-                                    
-                                    # Find all src attributes
-                                    src_urls = re.findall(r'src=[\'"]?([^\'" >]+)', html_content)
-                                    
-                                    # Combine URLs
-                                    all_urls = href_urls + src_urls
-                                    print(f"Found {len(all_urls)} resources to potentially prefetch")
-                                    
-                                    # Base URL for resolving relative URLs
-                                    base_url = f"http://{hostname}:{port}"
-                                    
-                                    # Process each URL
-                                    for url in all_urls:
-                                        # Skip non-HTTP URLs and fragment identifiers
-                                        if url.startswith(('javascript:', 'mailto:', '#')):
-                                            continue
-                                            
-                                        # Convert relative URL to absolute
-                                        if not url.startswith(('http://', 'https://')):
-                                            if url.startswith('/'):
-                                                full_url = f"{base_url}{url}"
-                                            else:
-                                                # Handle relative path
-                                                path_parts = resource.split('/')
-                                                path_dir = '/'.join(path_parts[:-1]) + '/'
-                                                full_url = f"{base_url}{path_dir}{url}"
-                                        else:
-                                            full_url = url
-                                            
-                                        # Skip URLs that aren't HTTP
-                                        if not full_url.startswith('http://'):
-                                            continue
-                                            
-                                        # Extract hostname and resource path
-                                        parsed_url = urlparse(full_url)
-                                        prefetch_hostname = parsed_url.netloc
-                                        prefetch_resource = parsed_url.path
-                                        if not prefetch_resource:
-                                            prefetch_resource = '/'
-                                            
-                                        # Extract port if specified
-                                        prefetch_port = 80
-                                        if ':' in prefetch_hostname:
-                                            hostname_parts = prefetch_hostname.split(':')
-                                            prefetch_hostname = hostname_parts[0]
-                                            prefetch_port = int(hostname_parts[1])
-                                            
-                                        # Generate cache location
-                                        prefetch_cache_key = prefetch_hostname
-                                        if prefetch_port != 80:
-                                            prefetch_cache_key += f"_{prefetch_port}"
-                                            
-                                        prefetch_cache_location = './' + prefetch_cache_key + prefetch_resource
-                                        if prefetch_cache_location.endswith('/'):
-                                            prefetch_cache_location += 'default'
-                                            
-                                        # Skip if already cached
-                                        if os.path.exists(prefetch_cache_location):
-                                            continue
-                                            
-                                        print(f"Prefetching: {full_url}")
-                                        
-                                        # Create socket for prefetch request
-                                        try:
-                                            prefetch_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                                            prefetch_socket.settimeout(5)  # Short timeout
-                                            
-                                            # Get IP address
-                                            prefetch_address = socket.gethostbyname(prefetch_hostname)
-                                            
-                                            # Connect
-                                            prefetch_socket.connect((prefetch_address, prefetch_port))
-                                            
-                                            # Create request
-                                            prefetch_request = f"GET {prefetch_resource} HTTP/1.1\r\nHost: {prefetch_hostname}\r\nConnection: close\r\n\r\n"
-                                            
-                                            # Send request
-                                            prefetch_socket.sendall(prefetch_request.encode())
-                                            
-                                            # Get response
-                                            prefetch_response = b''
-                                            while True:
-                                                try:
-                                                    chunk = prefetch_socket.recv(BUFFER_SIZE)
-                                                    if not chunk:
-                                                        break
-                                                    prefetch_response += chunk
-                                                except socket.timeout:
-                                                    break
-                                                except Exception as e:
-                                                    print(f"Error receiving prefetch data: {e}")
-                                                    break
-                                            
-                                            # Close socket
-                                            prefetch_socket.close()
-                                            
-                                            # Check if we should cache this prefetched response
-                                            should_cache_prefetch = True
-                                            
-                                            # Check for redirect and other non-cacheable responses
-                                            try:
-                                                prefetch_headers = prefetch_response[:100].decode('utf-8', errors='replace')
-                                                prefetch_status = prefetch_headers.split('\r\n')[0]
-                                                
-                                                if '301 ' in prefetch_status or '302 ' in prefetch_status:
-                                                    should_cache_prefetch = False
-                                                
-                                                if 'Cache-Control: no-store' in prefetch_headers or 'Cache-Control: no-cache' in prefetch_headers:
-                                                    should_cache_prefetch = False
-                                            except:
-                                                pass
-                                            
-                                            # Cache the prefetched resource if appropriate
-                                            if should_cache_prefetch and prefetch_response:
-                                                try:
-                                                    # Create directories if needed
-                                                    prefetch_dir = os.path.dirname(prefetch_cache_location)
-                                                    if not os.path.exists(prefetch_dir):
-                                                        os.makedirs(prefetch_dir)
-                                                        
-                                                    # Write to cache file
-                                                    with open(prefetch_cache_location, 'wb') as f:
-                                                        f.write(prefetch_response)
-                                                    
-                                                    print(f"Successfully cached prefetched resource: {full_url}")
-                                                except Exception as e:
-                                                    print(f"Error caching prefetched resource: {e}")
-                                                    
-                                        except Exception as e:
-                                            print(f"Error prefetching {full_url}: {e}")
-                                except Exception as e:
-                                    print(f"Error in prefetch thread: {e}")
-                            
-                            # Start prefetch thread
-                            prefetch_thread = threading.Thread(target=prefetch_resources)
-                            prefetch_thread.daemon = True
-                            prefetch_thread.start()
-                            print("Started prefetching thread for associated resources")
-    
-                    # finished communicating with origin server - shutdown socket writes
-                    print('origin response received. Closing sockets')
-                    originServerSocket.close()
-                     
-                    clientSocket.shutdown(socket.SHUT_WR)
-                    print('client socket shutdown for writing')
-                except OSError as err:
-                    print('origin server request failed. ' + str(err))
-                    # Send error response to client
-                    error_response = f"HTTP/1.1 502 Bad Gateway\r\n\r\n<html><body><h1>502 Bad Gateway</h1><p>{str(err)}</p></body></html>"
-                    clientSocket.sendall(error_response.encode())
-        except Exception as e:
-            print(f"Error processing request: {e}")
-            # Send error response to client
-            error_response = f"HTTP/1.1 400 Bad Request\r\n\r\n<html><body><h1>400 Bad Request</h1><p>{str(e)}</p></body></html>"
-            clientSocket.sendall(error_response.encode())
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+
+    for i in range(options.processes):
+        workers.add(start_worker_process(proxyHost, proxyPort, options))
+
+    while True:
+        pid, status = os.wait()
+        workers.discard(pid)
+        print(f'Worker process {pid} exited with status {status}, restarting')
+        # Back off a little so a worker that fails at startup does not spin
+        time.sleep(RESTART_DELAY)
+        workers.add(start_worker_process(proxyHost, proxyPort, options))
+
+def main():
+    if len(sys.argv) <= 2:
+        print('Usage : "python Proxy-bonus.py server_ip server_port [options]"\n[server_ip : IP Address Of Proxy Server]\n[server_port : Port Of Proxy Server]\n[options : Run "python Proxy-bonus.py server_ip server_port --help" To List Them]')
+        sys.exit(2)
     
-        try:
-            clientSocket.close()
-        except:
-            print('Failed to close client socket')
+    # Get the command line arguments
+    proxyHost = sys.argv[1]
+    proxyPort = int(sys.argv[2])
+    options = parse_options(sys.argv[3:])
+    origin_pool.max_per_host = options.origin_per_host
+    origin_pool.max_total = options.origin_total
+    dns_cache.ttl = options.dns_ttl
+    dns_cache.negative_ttl = options.dns_negative_ttl
+    memory_cache.max_size = options.memory_cache_size
+    memory_cache.max_object_size = options.memory_object_size
+    cache_index.stale_while_revalidate = options.stale_while_revalidate
+    cache_index.stale_if_error = options.stale_if_error
+    cache_index.max_size = options.disk_cache_size
+    cache_index.policy = options.eviction_policy
+    cache_compression.level = options.compress_level
+    pack_store.max_object_size = options.pack_object_size
+    prefetch_queue.workers = options.prefetch_workers
+    prefetch_queue.per_host = options.prefetch_per_host
+    prefetch_policy.scope = options.prefetch_scope
+    prefetch_policy.allowed_hosts = {host.strip().lower() for host in options.prefetch_allow.split(',') if host.strip()}
+    prefetch_policy.page_count = options.prefetch_page_count
+    prefetch_policy.page_bytes = options.prefetch_page_bytes
+    prefetch_policy.max_size = options.prefetch_max_size
+    prefetch_policy.css_depth = options.prefetch_css_depth
+    prefetch_learner.threshold = options.prefetch_threshold
+    prefetch_throttle.max_queue_depth = options.prefetch_max_queue_depth
+    prefetch_throttle.max_active = options.prefetch_max_active
+    prefetch_throttle.max_latency = options.prefetch_max_latency
+    if options.processes > 0 and options.pack_object_size > 0:
+        # Every worker would keep its own index of the segments and append
+        # to them at the same time
+        print('The packfile store cannot be shared by worker processes; storing every object in its own file')
+        pack_store.max_object_size = 0
+    if options.processes > 0 and options.disk_cache_size > 0:
+        # Each worker only accounts for the objects its own index knows of;
+        # an object known to several is counted by each, so together the
+        # shares keep the cache within the quota, if sometimes below it
+        cache_index.max_size = max(1, options.disk_cache_size // options.processes)
+
+    if options.processes > 0:
+        # Move a cache left in the legacy layout into the hashed one before
+        # any worker process starts serving from it; a single process does
+        # this while loading the cache index
+        migrate_legacy_cache()
+        run_supervisor(proxyHost, proxyPort, options)
+    else:
+        serverSocket = open_server_socket(proxyHost, proxyPort, options.backlog)
+        serve(serverSocket, options)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,8 +6,7 @@ import re
 import time
 from datetime import datetime
 
-# 1MB buffer size
-BUFFER_SIZE = 1000000
+from proxy_http import SocketReader, relay_response
 
 def main():
     if len(sys.argv) <= 2:
@@ -68,13 +67,15 @@ def main():
         # Get HTTP request from client
         # and store it in the variable: message_bytes
         # ~~~~ INSERT CODE ~~~~
-        message_bytes = b''
-        while True:
-            data = clientSocket.recv(BUFFER_SIZE)
-            message_bytes += data
-            # If either no more data or we've received the end of the HTTP request (blank line)
-            if not data or b'\r\n\r\n' in message_bytes:
-                break
+        # Read until we've received the end of the HTTP request (blank line)
+        # or the client closes the connection
+        clientReader = SocketReader(clientSocket)
+        try:
+            message_bytes = clientReader.read_until(b'\r\n\r\n')
+        except (OSError, ValueError) as e:
+            print(f'Failed to read request: {e}')
+            clientSocket.close()
+            continue
         # ~~~~ END CODE INSERT ~~~~
     
         try:
@@ -153,17 +154,17 @@ def main():
                     
                     # Check wether the file is currently in the cache
                     cacheFile = open(cacheLocation, "rb")
-                    cacheData = cacheFile.read()
         
                     print('Cache hit! Loading from cache file: ' + cacheLocation)
                     # ProxyServer finds a cache hit
-                    # Send back response to client 
+                    # Send back response to client straight from the file
+                    # (os.sendfile), without reading it into memory
                     # ~~~~ INSERT CODE ~~~~
-                    clientSocket.sendall(cacheData)
+                    clientSocket.sendfile(cacheFile)
                     # ~~~~ END CODE INSERT ~~~~
                     cacheFile.close()
                     print('Sent to the client:')
-                    print('> ' + str(cacheData[:100]))
+                    print('> ' + str(head_data[:100]))
                 else:
                     raise Exception("Cache validation failed or cache not usable")
             except:
@@ -212,54 +213,16 @@ def main():
     
                     print('Request sent to origin server\n')
     
-                    # Get the response from the origin server
-                    # ~~~~ INSERT CODE ~~~~
-                    response_bytes = b''
-                    while True:
-                        chunk = originServerSocket.recv(BUFFER_SIZE)
-                        if not chunk:
-                            break
-                        response_bytes += chunk
-                    # ~~~~ END CODE INSERT ~~~~
-    
-                    # Send the response to the client
+                    # Stream the response from the origin server to the client,
+                    # teeing it into the cache as it arrives. Redirects and
+                    # responses marked no-store/no-cache are not cached.
+                    # Hits are sent straight from the file, so bodies are
+                    # stored uncompressed.
                     # ~~~~ INSERT CODE ~~~~
-                    clientSocket.sendall(response_bytes)
+                    relay_response(SocketReader(originServerSocket), clientSocket, cacheLocation, method,
+                                   compress=False)
                     # ~~~~ END CODE INSERT ~~~~
     
-                    # Check if we should cache this response
-                    should_cache = True
-                    
-                    # Don't cache redirects
-                    try:
-                        response_start = response_bytes[:100].decode('utf-8', errors='replace')
-                        status_line = response_start.split('\r\n')[0]
-                        if '301 ' in status_line or '302 ' in status_line:
-                            print("Not caching redirect response")
-                            should_cache = False
-                        
-                        # Don't cache if Cache-Control says not to
-                        if 'Cache-Control: no-store' in response_start or 'Cache-Control: no-cache' in response_start:
-                            print("Not caching due to Cache-Control directive")
-                            should_cache = False
-                    except:
-                        pass
-                    
-                    if should_cache:
-                        # Create a new file in the cache for the requested file.
-                        cacheDir, file = os.path.split(cacheLocation)
-                        print('cached directory ' + cacheDir)
-                        if not os.path.exists(cacheDir):
-                            os.makedirs(cacheDir)
-                        cacheFile = open(cacheLocation, 'wb')
-        
-                        # Save origin server response in the cache file
-                        # ~~~~ INSERT CODE ~~~~
-                        cacheFile.write(response_bytes)
-                        # ~~~~ END CODE INSERT ~~~~
-                        cacheFile.close()
-                        print('cache file closed')
-    
                     # finished communicating with origin server - shutdown socket writes
                     print('origin response received. Closing sockets')
                     originServerSocket.close()
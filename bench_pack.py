@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for storing small objects
+Compares loose cache files (one file per object in the hashed layout,
+written to a temporary file and renamed into place, read with open, read
+and close) with the packfile store (appended to a segment, read through its
+memory map) for many small objects. Reports the time to store and to read
+every object, and the number of files each leaves on disk.
+
+Usage: python bench_pack.py [object_size_in_bytes ...]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from proxy_cache import get_hashed_location
+from proxy_pack import PackStore
+
+# Object sizes to test, in bytes
+DEFAULT_SIZES = [512, 4096, 16384]
+
+# Objects stored per size and method
+OBJECT_COUNT = 20000
+
+# Every object is read this many times; the best pass is reported
+REPEATS = 3
+
+CACHED_HEAD = b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\nCache-Control: max-age=3600\r\n\r\n"
+
+def store_loose(root, urls, response):
+    """Store each object in its own file, the way CacheWriter does without the packfile store."""
+    for url in urls:
+        cacheLocation = get_hashed_location(url, root)
+        cacheDir = os.path.dirname(cacheLocation)
+        os.makedirs(cacheDir, exist_ok=True)
+        fd, tempLocation = tempfile.mkstemp(dir=cacheDir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as cacheFile:
+            cacheFile.write(response)
+        os.replace(tempLocation, cacheLocation)
+
+def read_loose(root, urls):
+    for url in urls:
+        with open(get_hashed_location(url, root), 'rb') as cacheFile:
+            cacheFile.read()
+
+def store_packed(store, root, urls, response):
+    for url in urls:
+        store.put(get_hashed_location(url, root), response, url)
+
+def read_packed(store, root, urls):
+    for url in urls:
+        store.get(get_hashed_location(url, root))
+
+def count_files(root):
+    return sum(len(fileNames) for dirPath, dirNames, fileNames in os.walk(root))
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def run(size):
+    """Benchmark OBJECT_COUNT objects of size bytes; returns the report line."""
+    response = CACHED_HEAD + os.urandom(max(size - len(CACHED_HEAD), 0))
+    urls = [f'http://bench.example/{size}/{i}' for i in range(OBJECT_COUNT)]
+    workDir = tempfile.mkdtemp(prefix='bench_pack_')
+    try:
+        looseRoot = os.path.join(workDir, 'loose')
+        looseStore = timed(store_loose, looseRoot, urls, response)
+        looseRead = min(timed(read_loose, looseRoot, urls) for i in range(REPEATS))
+        looseFiles = count_files(looseRoot)
+
+        packRoot = os.path.join(workDir, 'packed')
+        store = PackStore(os.path.join(packRoot, 'packs'), size)
+        store.open()
+        packStore = timed(store_packed, store, packRoot, urls, response)
+        packRead = min(timed(read_packed, store, packRoot, urls) for i in range(REPEATS))
+        packFiles = count_files(packRoot)
+    finally:
+        shutil.rmtree(workDir)
+
+    def rate(seconds):
+        return f'{OBJECT_COUNT / seconds:>9.0f}/s'
+    return (f'{size:>7} B  loose: store {rate(looseStore)} read {rate(looseRead)} {looseFiles:>6} files   '
+            f'packed: store {rate(packStore)} read {rate(packRead)} {packFiles:>6} files')
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f'{OBJECT_COUNT} objects per size')
+    for size in sizes:
+        print(run(size))
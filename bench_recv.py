@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the proxy's receive loops
+Compares the original pattern (bytes += sock.recv(1000000)) with
+proxy_http.SocketReader (recv_into a reusable buffer, bytearray accumulation)
+when reading multi-MB bodies over a local socket pair.
+
+Usage: python bench_recv.py [size_in_MB ...]
+"""
+
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+from proxy_http import SocketReader
+
+# Body sizes to test, in MB
+DEFAULT_SIZES = [4, 16, 64]
+
+# Sender writes in pieces this large, like a typical origin server
+SEND_PIECE = 16384
+
+# Original receive size used by Proxy.py and Proxy-bonus.py
+OLD_BUFFER_SIZE = 1000000
+
+def send_body(sock, size):
+    """Send size bytes in SEND_PIECE pieces, then close the socket."""
+    piece = b'x' * SEND_PIECE
+    remaining = size
+    while remaining > 0:
+        sock.sendall(piece[:remaining])
+        remaining -= SEND_PIECE
+    sock.close()
+
+def read_with_bytes(sock):
+    """The original receive loop: grow an immutable bytes object."""
+    response_bytes = b''
+    while True:
+        chunk = sock.recv(OLD_BUFFER_SIZE)
+        if not chunk:
+            break
+        response_bytes += chunk
+    return len(response_bytes)
+
+def read_with_reader(sock):
+    """The SocketReader receive loop: recv_into and bytearray accumulation."""
+    reader = SocketReader(sock)
+    response = bytearray()
+    while True:
+        chunk = reader.recv_chunk()
+        if not chunk:
+            break
+        response += chunk
+    return len(response)
+
+def run(read_function, size):
+    """Time one read of a size-byte body and measure its peak Python memory."""
+    receiver, sender = socket.socketpair()
+    sender_thread = threading.Thread(target=send_body, args=(sender, size))
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    sender_thread.start()
+    received = read_function(receiver)
+    elapsed = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    sender_thread.join()
+    receiver.close()
+    assert received == size, f"received {received} of {size} bytes"
+    return elapsed, peak
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(f"{'size':>8} {'method':<14} {'time':>10} {'peak memory':>14}")
+    print("-" * 50)
+    for size_mb in sizes:
+        size = size_mb * 1024 * 1024
+        for name, read_function in (('bytes +=', read_with_bytes), ('SocketReader', read_with_reader)):
+            elapsed, peak = run(read_function, size)
+            print(f"{size_mb:>6}MB {name:<14} {elapsed * 1000:>8.1f}ms {peak / 1024 / 1024:>12.1f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for serving cache hits
+Compares the original hit path (read the whole cache file, then sendall)
+with the sendfile path (read only the header block, then socket.sendfile
+from the body offset) when serving multi-MB cached objects over a local
+socket pair. Reports wall time, CPU time and peak Python memory per hit.
+
+Usage: python bench_sendfile.py [size_in_MB ...]
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from proxy_cache import read_cache_head
+
+# Cached object sizes to test, in MB
+DEFAULT_SIZES = [4, 16, 64]
+
+# Hits served per size and method; the best time is reported
+REPEATS = 3
+
+# Receiver drains the socket in pieces this large
+DRAIN_SIZE = 1024 * 1024
+
+CACHED_HEAD = b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\nCache-Control: max-age=3600\r\n\r\n"
+
+def make_cache_file(size):
+    """Write a cache file with a header block and a size-byte body; returns its path."""
+    fd, path = tempfile.mkstemp(prefix='bench_sendfile_')
+    with os.fdopen(fd, 'wb') as cacheFile:
+        cacheFile.write(CACHED_HEAD)
+        piece = os.urandom(1024 * 1024)
+        remaining = size
+        while remaining > 0:
+            cacheFile.write(piece[:remaining])
+            remaining -= len(piece)
+    return path
+
+def drain(sock, results):
+    """Read until the sender closes and record the byte count."""
+    received = 0
+    while True:
+        data = sock.recv(DRAIN_SIZE)
+        if not data:
+            break
+        received += len(data)
+    results.append(received)
+
+def serve_with_read(sock, cacheLocation):
+    """The original hit path: read the whole file into memory and sendall it."""
+    with open(cacheLocation, 'rb') as cacheFile:
+        cacheData = cacheFile.read()
+    sock.sendall(cacheData)
+
+def serve_with_sendfile(sock, cacheLocation):
+    """The sendfile hit path: read the header block, then sendfile the body."""
+    with open(cacheLocation, 'rb') as cacheFile:
+        head, body_offset = read_cache_head(cacheFile)
+        body_length = os.fstat(cacheFile.fileno()).st_size - body_offset
+        sock.sendall(head)
+        sock.sendfile(cacheFile, body_offset, body_length)
+
+def run(serve_function, cacheLocation, size):
+    """Serve one hit; returns (wall time, CPU time, peak Python memory)."""
+    sender, receiver = socket.socketpair()
+    results = []
+    receiver_thread = threading.Thread(target=drain, args=(receiver, results))
+    receiver_thread.start()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    start_cpu = time.thread_time()
+    serve_function(sender, cacheLocation)
+    cpu = time.thread_time() - start_cpu
+    sender.close()
+    receiver_thread.join()
+    elapsed = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    receiver.close()
+    expected = size + len(CACHED_HEAD)
+    assert results[0] == expected, f"received {results[0]} of {expected} bytes"
+    return elapsed, cpu, peak
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(f"{'size':>8} {'method':<14} {'time':>10} {'cpu':>10} {'peak memory':>14}")
+    print("-" * 60)
+    for size_mb in sizes:
+        size = size_mb * 1024 * 1024
+        cacheLocation = make_cache_file(size)
+        try:
+            for name, serve_function in (('read+sendall', serve_with_read), ('sendfile', serve_with_sendfile)):
+                elapsed, cpu, peak = min(run(serve_function, cacheLocation, size) for i in range(REPEATS))
+                print(f"{size_mb:>6}MB {name:<14} {elapsed * 1000:>8.1f}ms {cpu * 1000:>8.1f}ms {peak / 1024 / 1024:>12.1f}MB")
+        finally:
+            os.unlink(cacheLocation)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,753 @@
+# proxy_async.py - asyncio event-loop serving mode for Proxy-bonus.py
+#
+# Selected with "--mode async". One event loop multiplexes every client and
+# origin connection with non-blocking sockets, so idle keep-alive clients cost
+# a few kilobytes instead of a worker thread each. Hostname lookups go through
+# the shared DNS cache on the loop's default executor, and cache disk I/O
+# (freshness checks, reads and writes) is offloaded to a small thread pool so
+# it never stalls the loop.
+#
+# The caching behaviour is the same as the threaded mode: the same cache
+# locations, Expires/max-age freshness checks, revalidation and stale serving,
+# collapsed forwarding, custom ports and prefetching. Origin connections are
+# kept alive for reuse in a pool of the event loop's own.
+
+import asyncio
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from proxy_http import (ClientRequest, build_origin_request, ResponseFramer, RelayResult, get_status,
+                        prepare_client_head, prepare_cache_head, bad_gateway_response, bad_request_response,
+                        get_content_length, prepare_range_response, join_ranges,
+                        OriginClosedError, MAX_REQUEST_SIZE, ORIGIN_ERROR_STATUSES)
+from proxy_cache import (get_cache_location, get_cache_url, is_cache_fresh, check_headers, CacheWriter, read_cache_head, cache_index,
+                         memory_cache, CacheFileChanged, conditional_headers, refresh_cached_response, may_serve_stale,
+                         cache_compression, prepare_stored_head, read_original_size, inflate_body, read_packed_object)
+from proxy_dns import dns_cache
+from proxy_inflight import inflight_fetches
+from proxy_pool import origin_pool, MAX_CONNECTIONS_PER_HOST, MAX_CONNECTIONS_TOTAL, IDLE_TIMEOUT
+from proxy_prefetch import PrefetchPage, start_refresh, start_background_fetch, prefetch_throttle
+from proxy_learning import prefetch_learner
+from proxy_links import make_link_extractor
+from proxy_stats import STATS_HOSTNAME, stats_response
+
+# Bytes requested from a stream per read
+READ_SIZE = 65536
+
+# Seconds to wait for a client request or an origin server read
+CLIENT_TIMEOUT = 30
+ORIGIN_TIMEOUT = 10
+
+# Threads used for blocking cache file operations
+CACHE_IO_THREADS = 4
+
+cache_executor = ThreadPoolExecutor(max_workers=CACHE_IO_THREADS, thread_name_prefix='cache-io')
+
+def open_cache_file(cacheLocation, stale=False):
+    """Open a cached response and read its header block.
+
+    Returns (cacheFile, head, body_offset, body_length, body); the caller
+    closes cacheFile. Small objects are read whole into the memory cache as
+    well, and their body is returned; for others body is None. stale is
+    True when a stale copy is served on purpose; it is not kept in memory.
+    Objects in the packfile store have no file; cacheFile is None for them.
+    """
+    # BONUS FEATURE 18: Packfile Store
+    packed = read_packed_object(cacheLocation, stale)
+    if packed is not None:
+        head, body = packed
+        return None, head, len(head), len(body), body
+    generation = memory_cache.generation
+    cacheFile = open(cacheLocation, 'rb')
+    try:
+        head, body_offset = read_cache_head(cacheFile)
+        file_stat = os.fstat(cacheFile.fileno())
+        cache_index.confirm(cacheLocation, head, file_stat, stale)
+        body_length = file_stat.st_size - body_offset
+        if memory_cache.fits(body_length) and not stale:
+            cacheFile.seek(body_offset)
+            body = cacheFile.read(body_length)
+            memory_cache.put(cacheLocation, head, body, file_stat, generation)
+            return cacheFile, head, body_offset, body_length, body
+    except BaseException:
+        cacheFile.close()
+        raise
+    return cacheFile, head, body_offset, body_length, None
+
+def write_cache(cacheWriter, data, fetch):
+    """Write part of a response to the cache and let followers of fetch see it."""
+    cacheWriter.write(data)
+    if fetch is not None:
+        fetch.progress(cacheWriter)
+
+def commit_cache(cacheWriter, fetch):
+    """Store a complete response, letting followers of fetch see its end first."""
+    cacheWriter.end_body()
+    if fetch is not None:
+        fetch.progress(cacheWriter)
+    cacheWriter.commit()
+
+async def open_origin_connection(addresses, port):
+    """Open streams to the first of addresses that accepts on port."""
+    last_error = None
+    for family, address in addresses:
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(address, port), ORIGIN_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            last_error = e
+    raise last_error or OSError(f'no addresses to connect to on port {port}')
+
+class AsyncOriginConnection:
+    """Streams to an origin server, kept open between requests."""
+
+    def __init__(self, key, reader, writer):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0
+        self.idle_since = time.monotonic()
+
+    def is_healthy(self):
+        """Check that an idle connection is still open; one the origin closed reads as EOF."""
+        return not self.reader.at_eof() and not self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+class AsyncConnectionPool:
+    """Keep-alive origin connections for the event loop, keyed by (hostname, port).
+
+    The asyncio counterpart of proxy_pool.ConnectionPool, with the same
+    limits. It is only used from the loop's thread, so the condition only
+    serves to wait for a free slot.
+    """
+
+    def __init__(self, max_per_host=MAX_CONNECTIONS_PER_HOST, max_total=MAX_CONNECTIONS_TOTAL,
+                 idle_timeout=IDLE_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        # Created on the running loop by the first acquire
+        self.available = None
+        # Idle connections per key, most recently used last
+        self.idle = {}
+        # Open connections (idle or in use) per key and in total
+        self.open_per_host = {}
+        self.open_total = 0
+
+    async def acquire(self, hostname, port, timeout=ORIGIN_TIMEOUT):
+        """Return an idle connection to hostname:port, or open a new one.
+
+        Waits up to timeout seconds for a free slot when the per-host or total
+        limit is reached, then raises asyncio.TimeoutError.
+        """
+        if self.available is None:
+            self.available = asyncio.Condition()
+        key = (hostname, port)
+        deadline = time.monotonic() + timeout
+        async with self.available:
+            while True:
+                self.expire_idle()
+                idle = self.idle.get(key, [])
+                while idle:
+                    connection = idle.pop()
+                    if connection.is_healthy():
+                        print(f'Reusing connection to {hostname}:{port}')
+                        return connection
+                    print(f'Pooled connection to {hostname}:{port} was closed by the origin')
+                    self.forget(connection)
+
+                if self.open_per_host.get(key, 0) < self.max_per_host:
+                    if self.open_total >= self.max_total:
+                        self.close_oldest_idle()
+                    if self.open_total < self.max_total:
+                        # Reserve the slot before connecting outside the lock
+                        self.open_per_host[key] = self.open_per_host.get(key, 0) + 1
+                        self.open_total += 1
+                        break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f'no free origin connection to {hostname}:{port}')
+                try:
+                    await asyncio.wait_for(self.available.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+        try:
+            return AsyncOriginConnection(key, *await self.connect(hostname, port))
+        except BaseException:
+            async with self.available:
+                self.unreserve(key)
+            raise
+
+    async def connect(self, hostname, port):
+        """Open streams to an origin server."""
+        loop = asyncio.get_running_loop()
+        # Resolve the hostname without blocking the event loop
+        addresses = await loop.run_in_executor(None, dns_cache.resolve, hostname)
+        # BONUS FEATURE 3: Connect using the custom port
+        streams = await open_origin_connection(addresses, port)
+        print(f'Connected to origin server {hostname}:{port}')
+        return streams
+
+    async def release(self, connection, reusable):
+        """Return a connection after use; it is kept only if reusable."""
+        async with self.available:
+            if reusable:
+                connection.requests += 1
+                connection.idle_since = time.monotonic()
+                self.idle.setdefault(connection.key, []).append(connection)
+            else:
+                self.forget(connection)
+            self.available.notify_all()
+
+    async def send_request(self, hostname, port, request_bytes, read_response, idempotent=True):
+        """Send a request on a pooled connection and read its response.
+
+        Like ConnectionPool.send_request, but read_response(originReader,
+        sent_at) is a coroutine function; sent_at is when the request was
+        sent, for the origin latency.
+        """
+        while True:
+            connection = await self.acquire(hostname, port)
+            reused = connection.requests > 0
+            try:
+                sent_at = time.monotonic()
+                connection.writer.write(request_bytes)
+                await connection.writer.drain()
+                result = await read_response(connection.reader, sent_at)
+            except ConnectionError as e:
+                await self.release(connection, False)
+                if reused and idempotent:
+                    print(f'Stale connection to {hostname}:{port} ({e}) - retrying on a new one')
+                    continue
+                raise
+            except BaseException:
+                await self.release(connection, False)
+                raise
+            await self.release(connection, result.origin_reusable)
+            return result
+
+    def expire_idle(self):
+        """Close connections that have been idle longer than idle_timeout (lock held)."""
+        cutoff = time.monotonic() - self.idle_timeout
+        for key, idle in list(self.idle.items()):
+            while idle and idle[0].idle_since < cutoff:
+                self.forget(idle.pop(0))
+            if not idle:
+                del self.idle[key]
+
+    def close_oldest_idle(self):
+        """Close the longest-idle connection to make room under the total limit (lock held)."""
+        oldest = None
+        for idle in self.idle.values():
+            if idle and (oldest is None or idle[0].idle_since < oldest.idle_since):
+                oldest = idle[0]
+        if oldest:
+            self.idle[oldest.key].remove(oldest)
+            self.forget(oldest)
+
+    def forget(self, connection):
+        """Close a connection and give up its slot (lock held)."""
+        connection.close()
+        self.unreserve(connection.key)
+
+    def unreserve(self, key):
+        self.open_per_host[key] -= 1
+        if not self.open_per_host[key]:
+            del self.open_per_host[key]
+        self.open_total -= 1
+        self.available.notify_all()
+
+# BONUS FEATURE 8: origin connections of the event loop; prefetches run in
+# threads and use proxy_pool.origin_pool
+async_origin_pool = AsyncConnectionPool()
+
+async def fetch_from_origin(writer, request, cacheLocation, keep_alive, validators=(), intercept=(), fetch=None):
+    """Stream an origin response to the client, teeing it into the cache.
+
+    validators are the conditional headers revalidating a stale cached
+    copy, intercept the statuses not relayed to the client and fetch the
+    InFlightFetch other requests for the object follow. Returns a
+    RelayResult like proxy_http.relay_response.
+    """
+    method, hostname, port, resource = request.method, request.hostname, request.port, request.resource
+    print(f'Connecting to: {hostname} on port {port}\n')
+
+    # Send it on a pooled keep-alive connection; a reused connection the
+    # origin has just closed is retried on a new one
+    originRequest = build_origin_request(method, hostname, resource, request.body, headers=validators)
+    return await async_origin_pool.send_request(
+        hostname, port, originRequest.encode() + request.body,
+        lambda originReader, sent_at: relay_origin_response(originReader, sent_at, writer, request, cacheLocation,
+                                                            keep_alive, intercept, fetch),
+        idempotent=method in ('GET', 'HEAD'))
+
+async def relay_origin_response(originReader, sent_at, writer, request, cacheLocation, keep_alive, intercept, fetch):
+    """Read one origin response and stream it to the client and the cache."""
+    loop = asyncio.get_running_loop()
+    method, hostname, port, resource = request.method, request.hostname, request.port, request.resource
+    print('Request sent to origin server\n')
+
+    # Forward each chunk to the client as it arrives and tee it into a
+    # temporary cache file, committed only once the response is complete
+    framer = ResponseFramer(method)
+    cacheWriter = None
+    is_redirect, is_html = False, False
+    extractor = None
+    complete = False
+    intercepted = None
+    client_gone = False
+
+    async def send_to_client(data):
+        # If the client has gone away keep downloading, so the object still
+        # reaches the cache
+        nonlocal client_gone
+        if client_gone:
+            return
+        try:
+            if data:
+                writer.write(data)
+            await writer.drain()
+        except OSError as e:
+            print(f"Client went away during relay: {e}")
+            client_gone = True
+
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(originReader.read(READ_SIZE), ORIGIN_TIMEOUT)
+            except (OSError, asyncio.TimeoutError) as e:
+                # Nothing has reached the client yet, so it can still get an error page
+                if not framer.started():
+                    raise
+                print(f"Origin connection failed while receiving ({e!r}) - response is incomplete")
+                break
+            if not chunk:
+                if not framer.started():
+                    raise OriginClosedError('origin server closed the connection without a response')
+                complete = framer.complete_at_close()
+                break
+            if not framer.started():
+                # Prefetching backs off when origin servers are slow
+                origin_pool.record_latency(time.monotonic() - sent_at)
+
+            try:
+                head, body_part = framer.feed(chunk)
+            except ValueError as e:
+                print(f"Malformed response from origin ({e}) - response is incomplete")
+                break
+            if head is not None and framer.status in intercept:
+                # The caller answers the client, usually from the cached copy
+                intercepted = bytes(head)
+            elif head is not None:
+                should_cache, is_redirect, is_html = check_headers(framer.headers)
+                clientHead, keep_alive = prepare_client_head(head, keep_alive)
+                await send_to_client(clientHead)
+                if should_cache and method == 'GET':
+                    compress = cache_compression.should_compress(framer.headers)
+                    cacheWriter = await loop.run_in_executor(cache_executor, CacheWriter, cacheLocation,
+                                                             get_cache_url(hostname, port, resource), compress)
+                    await loop.run_in_executor(cache_executor, cacheWriter.write,
+                                               prepare_cache_head(head, framer.chunked, compress))
+                    if not is_redirect:
+                        extractor = make_link_extractor(framer.headers, get_cache_url(hostname, port, resource))
+                        prefetch_page = PrefetchPage(hostname, port, get_cache_url(hostname, port, resource),
+                                                     cacheLocation)
+                if fetch is not None:
+                    await loop.run_in_executor(cache_executor, fetch.publish, cacheWriter)
+            if body_part:
+                if cacheWriter:
+                    await loop.run_in_executor(cache_executor, write_cache, cacheWriter, framer.payload, fetch)
+                if intercepted is None:
+                    await send_to_client(body_part)
+                # BONUS FEATURE 22: Streaming Link Extraction
+                if extractor is not None:
+                    links = extractor.feed(framer.payload)
+                    if links:
+                        # Queued off the loop; queueing checks the disk
+                        cache_executor.submit(prefetch_page.queue, links)
+            if framer.done:
+                complete = True
+                break
+    finally:
+        if extractor is not None and complete:
+            cache_executor.submit(prefetch_page.queue, extractor.close())
+        if cacheWriter:
+            if complete:
+                await loop.run_in_executor(cache_executor, commit_cache, cacheWriter, fetch)
+            else:
+                await loop.run_in_executor(cache_executor, cacheWriter.discard)
+            if fetch is not None:
+                fetch.finish(complete)
+    # The client cannot tell where a broken response ends
+    return RelayResult(cacheWriter is not None and complete, is_redirect, is_html,
+                       keep_alive and complete and not client_gone, complete and framer.origin_reusable(),
+                       intercepted, framer.body_received, False)
+
+async def read_request_async(reader, timeout):
+    """Read one framed request from a client stream, or None if the client closed."""
+    try:
+        message_bytes = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise ValueError('connection closed in the middle of a request')
+    except asyncio.LimitOverrunError:
+        raise ValueError(f'request headers larger than {MAX_REQUEST_SIZE} bytes')
+    message = message_bytes.decode('utf-8')
+    print('Received request:')
+    print('< ' + message)
+
+    request = ClientRequest(message)
+    request.body = await asyncio.wait_for(reader.readexactly(request.body_length()), timeout)
+    return request
+
+async def send_memory_response(writer, head, body, method, keep_alive, accept_gzip=False, byte_range=None):
+    """Send a cached object held in memory to the client."""
+    head, inflate = prepare_stored_head(head, accept_gzip)
+    if inflate:
+        body = zlib.decompress(body, zlib.MAX_WBITS | 16)
+    # BONUS FEATURE 20: Range Requests
+    ranged = prepare_range_response(byte_range, head, len(body))
+    if ranged is not None:
+        head, parts, trailer = ranged
+        body = join_ranges(body, parts, trailer)
+    clientHead, keep_alive = prepare_client_head(head, keep_alive, len(body))
+    writer.write(clientHead)
+    if method != 'HEAD':
+        writer.write(body)
+    await writer.drain()
+    return keep_alive
+
+async def send_cached_response(writer, cacheLocation, method, keep_alive, stale=False, accept_gzip=False,
+                               byte_range=None):
+    """Send a cached object to the client, framed for its connection.
+
+    Raises FileNotFoundError or CacheFileChanged if the cached copy cannot
+    be served after all. stale is True when a stale copy is served on purpose.
+    A compressed body is inflated as it is sent unless accept_gzip is True.
+    byte_range is the ByteRange of a Range request, answered with just the
+    parts it asks for unless the body has to be inflated.
+    """
+    loop = asyncio.get_running_loop()
+    cacheFile, head, body_offset, body_length, body = await loop.run_in_executor(
+        cache_executor, open_cache_file, cacheLocation, stale)
+    print('Cache hit! Loading from cache file: ' + cacheLocation)
+    try:
+        if body is not None:
+            return await send_memory_response(writer, head, body, method, keep_alive, accept_gzip, byte_range)
+        # BONUS FEATURE 17: Compressed Storage
+        sentHead, inflate = prepare_stored_head(head, accept_gzip)
+        # BONUS FEATURE 20: Range Requests
+        ranged = None if inflate else prepare_range_response(byte_range, sentHead, body_length)
+        if ranged is not None:
+            return await send_file_ranges(writer, cacheFile, body_offset, ranged, keep_alive)
+        sent_length = body_length
+        if inflate:
+            sent_length = await loop.run_in_executor(cache_executor, read_original_size, cacheFile,
+                                                     body_offset + body_length)
+        clientHead, keep_alive = prepare_client_head(sentHead, keep_alive, sent_length)
+        writer.write(clientHead)
+        await writer.drain()
+        if method != 'HEAD' and body_length > 0 and inflate:
+            # Each piece is read and inflated off the loop
+            pieces = inflate_body(cacheFile, body_offset, body_length)
+            while True:
+                piece = await loop.run_in_executor(cache_executor, next, pieces, None)
+                if piece is None:
+                    break
+                writer.write(piece)
+                await writer.drain()
+        elif method != 'HEAD' and body_length > 0:
+            # The body goes from the file to the socket with os.sendfile
+            # where the transport supports it
+            await loop.sendfile(writer.transport, cacheFile, body_offset, body_length)
+    finally:
+        if cacheFile is not None:
+            cacheFile.close()
+    return keep_alive
+
+async def send_file_ranges(writer, cacheFile, body_offset, ranged, keep_alive, fetch=None):
+    """Send a range response, each part from a cache file by offset.
+
+    Like send_file_ranges in Proxy-bonus.py, but waits on the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    rangeHead, parts, trailer = ranged
+    clientHead, keep_alive = prepare_client_head(rangeHead, keep_alive)
+    writer.write(clientHead)
+    for prefix, first, last in parts:
+        writer.write(prefix)
+        await writer.drain()
+        offset, end = body_offset + first, body_offset + last + 1
+        while offset < end:
+            available = end
+            if fetch is not None:
+                available, finished, stored = await fetch.wait_async(offset)
+                if available <= offset:
+                    # The leader failed; the client cannot tell where a broken response ends
+                    return False
+            count = min(available, end) - offset
+            await loop.sendfile(writer.transport, cacheFile, offset, count)
+            offset += count
+    writer.write(trailer)
+    await writer.drain()
+    return keep_alive
+
+async def serve_request_async(request, writer, keep_alive):
+    """Answer one request from the cache or the origin; returns keep_alive."""
+    loop = asyncio.get_running_loop()
+    if request.hostname == STATS_HOSTNAME:
+        writer.write(stats_response(keep_alive))
+        await writer.drain()
+        return keep_alive
+
+    # An object still in the legacy layout is moved into place on lookup
+    cacheLocation = await loop.run_in_executor(cache_executor, get_cache_location, request.hostname, request.port,
+                                               request.resource)
+    print('Cache location:\t\t' + cacheLocation)
+
+    # BONUS FEATURE 24: learn which linked resources clients go on to request
+    if request.method == 'GET':
+        prefetch_learner.observe(get_cache_url(request.hostname, request.port, request.resource), cacheLocation,
+                                 request.headers.get('referer'))
+
+    # Hot objects are answered from memory without touching the disk
+    if request.method in ('GET', 'HEAD'):
+        entry = memory_cache.get(cacheLocation)
+        if entry:
+            print('Memory cache hit: ' + cacheLocation)
+            return await send_memory_response(writer, entry.head, entry.body, request.method, keep_alive,
+                                              request.accepts_gzip(), request.byte_range())
+
+    # BONUS FEATURE 1: Expires Header Checking
+    use_cache = False
+    if request.method in ('GET', 'HEAD'):
+        use_cache = await loop.run_in_executor(cache_executor, is_cache_fresh, cacheLocation)
+
+    if use_cache:
+        try:
+            return await send_cached_response(writer, cacheLocation, request.method, keep_alive,
+                                              accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+        except FileNotFoundError:
+            cache_index.remove(cacheLocation)
+        except CacheFileChanged as e:
+            print(f'{e} - fetching from origin')
+
+    # BONUS FEATURE 14: Stale-While-Revalidate
+    serve_stale_copy = False
+    if request.method in ('GET', 'HEAD'):
+        serve_stale_copy = await loop.run_in_executor(cache_executor, may_serve_stale, cacheLocation)
+    if serve_stale_copy:
+        start_refresh(request.hostname, request.port, request.resource, cacheLocation)
+        stale_keep_alive = await serve_stale(writer, cacheLocation, request.method, keep_alive,
+                                             accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+        if stale_keep_alive is not None:
+            return stale_keep_alive
+
+    return await serve_from_origin(request, writer, cacheLocation, keep_alive)
+
+async def serve_stale(writer, cacheLocation, method, keep_alive, error=False, accept_gzip=False, byte_range=None):
+    """Send a stale cached copy on purpose; error says whether the origin failed.
+
+    Returns keep_alive, or None if the copy has gone.
+    """
+    print('Serving stale copy: ' + cacheLocation)
+    try:
+        keep_alive = await send_cached_response(writer, cacheLocation, method, keep_alive, stale=True,
+                                                accept_gzip=accept_gzip, byte_range=byte_range)
+    except FileNotFoundError:
+        print('Cache file disappeared')
+        cache_index.remove(cacheLocation)
+        return None
+    cache_index.count_stale(error)
+    return keep_alive
+
+async def serve_from_origin(request, writer, cacheLocation, keep_alive, collapse=True):
+    """Answer a request the cache could not answer; returns keep_alive.
+
+    Stale copies are revalidated, and unless collapse is False a request for
+    an object that is already being fetched follows that fetch.
+    """
+    loop = asyncio.get_running_loop()
+
+    # BONUS FEATURE 13: Collapsed Forwarding
+    fetch = None
+    if collapse and request.method in ('GET', 'HEAD'):
+        fetch, leading = inflight_fetches.join(cacheLocation, lead=request.method == 'GET')
+        # BONUS FEATURE 20: Range Requests
+        if leading and request.byte_range() is not None:
+            # Fetch the whole object in the background and send the range
+            # from it as soon as those bytes arrive
+            start_background_fetch(request.hostname, request.port, request.resource, cacheLocation, fetch)
+            leading = False
+        if fetch is not None and not leading:
+            return await follow_fetch(fetch, request, writer, cacheLocation, keep_alive)
+
+    # BONUS FEATURE 12: Conditional Revalidation
+    validators = []
+    if request.method in ('GET', 'HEAD'):
+        meta = await loop.run_in_executor(cache_executor, cache_index.lookup, cacheLocation)
+        validators = conditional_headers(meta)
+    intercept = (304,) if validators else ()
+
+    # BONUS FEATURE 14: Stale-If-Error
+    stale_if_error = False
+    if request.method in ('GET', 'HEAD'):
+        stale_if_error = await loop.run_in_executor(cache_executor, may_serve_stale, cacheLocation, True)
+    if stale_if_error:
+        intercept += ORIGIN_ERROR_STATUSES
+
+    try:
+        relay = await fetch_from_origin(writer, request, cacheLocation, keep_alive, validators, intercept, fetch)
+        if relay.intercepted is not None and get_status(relay.intercepted) != 304:
+            print(f'Origin server answered with status {get_status(relay.intercepted)}')
+            stale_keep_alive = await serve_stale(writer, cacheLocation, request.method, keep_alive, error=True,
+                                                 accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+            if stale_keep_alive is not None:
+                return stale_keep_alive
+            writer.write(bad_gateway_response('origin server error', keep_alive))
+            await writer.drain()
+            return keep_alive
+        if relay.intercepted is not None:
+            print('Origin says cached copy is not modified: ' + cacheLocation)
+            refreshed = await loop.run_in_executor(cache_executor, refresh_cached_response, cacheLocation,
+                                                   relay.intercepted)
+            if fetch is not None:
+                fetch.finish(refreshed)
+            if refreshed:
+                try:
+                    return await send_cached_response(writer, cacheLocation, request.method, keep_alive,
+                                                      accept_gzip=request.accepts_gzip(),
+                                                      byte_range=request.byte_range())
+                except FileNotFoundError:
+                    print('Cache file disappeared - fetching from origin')
+                except CacheFileChanged as e:
+                    print(f'{e} - fetching from origin')
+            relay = await fetch_from_origin(writer, request, cacheLocation, keep_alive)
+    except (OSError, asyncio.TimeoutError) as err:
+        print('origin server request failed. ' + repr(err))
+        if stale_if_error:
+            stale_keep_alive = await serve_stale(writer, cacheLocation, request.method, keep_alive, error=True,
+                                                 accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+            if stale_keep_alive is not None:
+                return stale_keep_alive
+        writer.write(bad_gateway_response(err, keep_alive))
+        await writer.drain()
+        return keep_alive
+    finally:
+        if fetch is not None:
+            inflight_fetches.end(fetch)
+    return relay.keep_alive
+
+async def follow_fetch(fetch, request, writer, cacheLocation, keep_alive):
+    """Answer a request by following a fetch of the same object already in flight.
+
+    Like the threaded follow_fetch in Proxy-bonus.py, but waits on the
+    event loop.
+    """
+    loop = asyncio.get_running_loop()
+    print('Following in-flight fetch of ' + cacheLocation)
+    tempFile, head = await fetch.attach_async()
+    if tempFile is None:
+        if fetch.stored:
+            try:
+                return await send_cached_response(writer, cacheLocation, request.method, keep_alive,
+                                                  accept_gzip=request.accepts_gzip(), byte_range=request.byte_range())
+            except FileNotFoundError:
+                print('Cache file disappeared - fetching from origin')
+            except CacheFileChanged as e:
+                print(f'{e} - fetching from origin')
+        return await serve_from_origin(request, writer, cacheLocation, keep_alive, collapse=False)
+
+    with tempFile:
+        sentHead, inflate = prepare_stored_head(head, request.accepts_gzip())
+        # BONUS FEATURE 20: Range Requests
+        length = get_content_length(head.decode('latin-1'))
+        ranged = None if inflate or length is None else prepare_range_response(request.byte_range(), sentHead, length)
+        if ranged is not None:
+            return await send_file_ranges(writer, tempFile, len(head), ranged, keep_alive, fetch)
+        clientHead, keep_alive = prepare_client_head(sentHead, keep_alive)
+        writer.write(clientHead)
+        await writer.drain()
+        offset = len(head)
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16) if inflate else None
+        while request.method != 'HEAD':
+            available, finished, stored = await fetch.wait_async(offset)
+            if available > offset and decompressor is not None:
+                data = await loop.run_in_executor(cache_executor, os.pread, tempFile.fileno(), available - offset,
+                                                  offset)
+                writer.write(decompressor.decompress(data))
+                await writer.drain()
+                offset = available
+            elif available > offset:
+                await loop.sendfile(writer.transport, tempFile, offset, available - offset)
+                offset = available
+            elif finished:
+                # The client cannot tell where a broken response ends
+                keep_alive = keep_alive and stored
+                break
+    return keep_alive
+
+async def handle_client_async(reader, writer, options):
+    """Serve requests on a client connection until it closes or goes idle.
+
+    Pipelined requests simply wait in the stream buffer and are answered in
+    order, one after another.
+    """
+    clientAddr = writer.get_extra_info('peername')
+    print('Received a connection from:', clientAddr)
+    requests_served = 0
+    keep_alive = True
+
+    try:
+        while keep_alive:
+            # Wait longer for the first request than between keep-alive requests
+            timeout = CLIENT_TIMEOUT if requests_served == 0 else options.keepalive_timeout
+            try:
+                request = await read_request_async(reader, timeout)
+            except asyncio.TimeoutError:
+                print(f'Connection from {clientAddr} idle - closing')
+                break
+            except (ValueError, IndexError, UnicodeDecodeError, asyncio.IncompleteReadError) as e:
+                print(f"Error processing request: {e}")
+                writer.write(bad_request_response(e))
+                break
+            if request is None:
+                break
+
+            requests_served += 1
+            keep_alive = request.wants_keep_alive() and requests_served < options.max_requests
+            # BONUS FEATURE 25: prefetching backs off while clients are busy
+            prefetch_throttle.begin()
+            try:
+                keep_alive = await serve_request_async(request, writer, keep_alive)
+            finally:
+                prefetch_throttle.end()
+    except ConnectionError as e:
+        print(f'Connection from {clientAddr} failed: {e}')
+    finally:
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+async def run_server(serverSocket, options):
+    """Serve clients from an already listening server socket until cancelled."""
+    server = await asyncio.start_server(lambda reader, writer: handle_client_async(reader, writer, options),
+                                        sock=serverSocket, limit=MAX_REQUEST_SIZE)
+    print('Serving with asyncio event loop')
+    async with server:
+        await server.serve_forever()
+
+def serve_async(serverSocket, options):
+    """Entry point used by Proxy-bonus.py for the asyncio serving mode."""
+    serverSocket.setblocking(False)
+    async_origin_pool.max_per_host = options.origin_per_host
+    async_origin_pool.max_total = options.origin_total
+    asyncio.run(run_server(serverSocket, options))
@@ -0,0 +1,1311 @@
+# proxy_cache.py - On-disk cache shared by the proxy serving modes
+#
+# Cached responses are stored verbatim (status line, headers and body) in
+# ./cache/<h0h1>/<h2h3>/<hash>, where hash is the SHA-1 of the object's URL,
+# with the URL itself recorded next to it in <hash>.url. Two levels of 256
+# shard directories keep every directory small however many objects are
+# cached, and no URL (query strings, very long paths, /a next to /a/b) can
+# produce an awkward or colliding file name. Caches in the earlier layout,
+# ./<hostname>[_<port>]/<resource>, are moved over by migrate_legacy_cache
+# at startup, and single legacy files (like the ones create_cache.py and
+# the tests write) when they are first requested, if they lie inside a
+# legacy cache directory and not under ./cache. These helpers decide
+# where an object lives, whether the stored copy is still fresh and whether
+# a response from the origin server may be stored at all.
+#
+# Freshness metadata (expiry time, status, validators, sizes) is computed
+# once when an object is stored and kept in an index (CacheIndex) that is
+# saved to an SQLite snapshot in the cache directory and loaded back in the
+# background at startup, so deciding whether a copy may be served is a
+# dictionary lookup. Stale copies that carry an ETag or Last-Modified are
+# revalidated with a conditional request, and a 304 Not Modified answer
+# refreshes the stored copy instead of downloading it again. Within their
+# stale-while-revalidate and stale-if-error windows stale copies are served
+# at once while they are refreshed in the background, or instead of an
+# error when the origin server fails. Small, frequently hit objects are
+# also kept in memory (MemoryCache), so serving them needs no file system
+# calls at all.
+#
+# Text bodies (HTML, CSS, JavaScript, JSON, ...) are stored gzip-compressed,
+# marked with an X-Cache-Encoding header that is never sent on. Clients that
+# accept gzip are sent the stored bytes as they are; others get the body
+# inflated as it is sent, with the original size taken from the gzip
+# trailer.
+#
+# Objects no larger than --pack-object-size are kept in the packfile store
+# (proxy_pack) instead of files of their own. stat_cached, remove_cached and
+# read_packed_object look in both places, so the index, eviction and the
+# memory cache treat packed and loose objects alike.
+
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import heapq
+import calendar
+import time
+import shutil
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from contextlib import closing
+from datetime import datetime
+
+from proxy_stats import register
+from proxy_pack import pack_store
+
+# Directory the cache is stored in
+CACHE_ROOT = './cache'
+
+# Legacy cache directories are named <hostname> or <hostname>_<port>. Only
+# dotted names, localhost and names with a port are taken for one at startup,
+# so directories like venv are not searched
+LEGACY_DIR_PATTERN = re.compile(r'^(localhost|[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)+)(_[0-9]+)?$|^[A-Za-z0-9-]+_[0-9]+$')
+
+# Bytes of cached objects kept in memory, and the largest single object kept
+MEMORY_CACHE_SIZE = 64 * 1024 * 1024
+MEMORY_OBJECT_SIZE = 256 * 1024
+
+# Bytes read at a time while looking for the end of a cached header block
+HEAD_READ_SIZE = 4096
+
+# zlib level text bodies are stored compressed with (0 stores them as they
+# are), the content types that are compressed, and the smallest body worth it
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/x-javascript', 'application/json',
+                      'application/xml', 'application/xhtml+xml', 'application/rss+xml', 'image/svg+xml')
+COMPRESS_MIN_SIZE = 256
+
+# Header line marking a body the proxy compressed, as opposed to one the
+# origin server sent compressed
+COMPRESSED_MARKER = b'X-Cache-Encoding: gzip'
+
+# Bytes of a compressed body read at a time while inflating it for a client
+INFLATE_READ_SIZE = 65536
+
+# Seconds past expiry a stale copy may still be served while it is refreshed
+# in the background, and while the origin server fails, for responses that
+# do not carry stale-while-revalidate or stale-if-error directives
+STALE_WHILE_REVALIDATE = 0
+STALE_IF_ERROR = 0
+
+# Bytes of cache files kept on disk (0 for no limit), the eviction policy
+# used to stay within it, and the fraction of the quota eviction frees down
+# to, so it runs in batches rather than on every store
+DISK_CACHE_SIZE = 1024 * 1024 * 1024
+EVICTION_POLICY = 'lru'
+EVICTION_TARGET = 0.9
+
+# File the cache index snapshot is saved to, and seconds between saves.
+# An index saved as JSON by earlier versions is imported from
+# LEGACY_INDEX_LOCATION when there is no snapshot yet
+INDEX_LOCATION = './cache/index.sqlite'
+LEGACY_INDEX_LOCATION = './.cache_index.json'
+INDEX_SAVE_INTERVAL = 30
+
+# Snapshot rows added to the index at a time while it loads, and seconds a
+# save waits for another worker process's save to finish
+INDEX_LOAD_BATCH = 1000
+INDEX_LOCK_TIMEOUT = 10
+
+# Cache files in the hashed layout are named after the SHA-1 of their URL
+CACHE_FILE_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+# Seconds a memory copy is served before checking the disk copy is unchanged
+# (other worker processes may have rewritten it)
+MEMORY_CHECK_INTERVAL = 1
+
+# Headers of a 304 Not Modified answer that are not copied into the cached
+# copy it validated: framing and connection headers describe the 304 itself,
+# and leaving Date alone lets an otherwise unchanged copy be refreshed
+# without rewriting its body
+UNREFRESHED_HEADERS = (b'content-length', b'transfer-encoding', b'date', b'connection', b'keep-alive',
+                       b'proxy-connection', b'te', b'trailer', b'upgrade')
+
+def get_cache_url(hostname, port, resource):
+    """Return the URL a resource is cached under, the key its location is hashed from."""
+    netloc = hostname.lower()
+    if port != 80:
+        netloc += f':{port}'
+    return 'http://' + netloc + resource
+
+def get_cache_location(hostname, port, resource):
+    """Return the cache file path for a resource.
+
+    A copy of the resource still in the legacy layout is moved into place
+    first, so it is found like any other cached object.
+    """
+    url = get_cache_url(hostname, port, resource)
+    cacheLocation = get_hashed_location(url)
+    if cacheLocation not in cache_index.entries:
+        legacyLocation = find_legacy_file(hostname, port, resource)
+        if legacyLocation is not None:
+            import_legacy_file(legacyLocation, cacheLocation, url)
+    return cacheLocation
+
+def get_hashed_location(url, cacheRoot=CACHE_ROOT):
+    """Return the cache file path for a URL: its SHA-1, under two shard directories."""
+    digest = hashlib.sha1(url.encode()).hexdigest()
+    return os.path.join(cacheRoot, digest[:2], digest[2:4], digest)
+
+def get_url_location(cacheLocation):
+    """Return the path of the record holding the URL of the object at cacheLocation."""
+    return cacheLocation + '.url'
+
+def read_cache_url(cacheLocation):
+    """Return the URL the object at cacheLocation was cached under, or None."""
+    if cacheLocation in pack_store:
+        return pack_store.url(cacheLocation)
+    try:
+        with open(get_url_location(cacheLocation)) as urlFile:
+            return urlFile.read().strip()
+    except OSError:
+        return None
+
+def write_cache_url(cacheLocation, url):
+    """Record the URL of the object at cacheLocation, unless it already is."""
+    urlLocation = get_url_location(cacheLocation)
+    if os.path.exists(urlLocation):
+        return
+    with open(urlLocation, 'w') as urlFile:
+        urlFile.write(url + '\n')
+
+def stat_cached(cacheLocation):
+    """Return the os.stat of a cached object, or the PackStat of a packed one.
+
+    Raises FileNotFoundError if the object is stored in neither place.
+    """
+    packStat = pack_store.stat(cacheLocation)
+    return packStat if packStat is not None else os.stat(cacheLocation)
+
+def is_stored(cacheLocation):
+    """Check whether an object is cached, packed or in a file of its own."""
+    return cacheLocation in pack_store or os.path.exists(cacheLocation)
+
+def remove_cached(cacheLocation):
+    """Remove a cached object and its URL record, wherever it is stored."""
+    if pack_store.delete(cacheLocation):
+        return
+    os.unlink(cacheLocation)
+    os.unlink(get_url_location(cacheLocation))
+
+def get_legacy_location(hostname, port, resource):
+    """Return where the legacy layout kept a resource: ./<hostname>[_<port>]/<resource>."""
+    cache_key = hostname
+    if port != 80:
+        cache_key += f"_{port}"
+
+    cacheLocation = './' + cache_key + resource
+    if cacheLocation.endswith('/'):
+        cacheLocation = cacheLocation + 'default'
+    return cacheLocation
+
+def find_legacy_file(hostname, port, resource):
+    """Return the legacy layout's copy of a resource, or None if there is none.
+
+    The path is built from the client's request, so it is only taken if it
+    lies in a legacy cache directory (named as in LEGACY_DIR_PATTERN), is a
+    regular file reached without symlinks or "..", and is not under
+    CACHE_ROOT. Without such a directory this costs a single stat.
+    """
+    legacyLocation = get_legacy_location(hostname, port, resource)
+    hostDir = legacyLocation.split('/')[1]
+    if not LEGACY_DIR_PATTERN.match(hostDir) or not os.path.isdir(hostDir):
+        return None
+    path = os.path.abspath(legacyLocation)
+    hostPath = os.path.abspath(hostDir)
+    cachePath = os.path.abspath(CACHE_ROOT)
+    if (not os.path.isfile(path) or os.path.realpath(path) != path
+            or os.path.commonpath([path, hostPath]) != hostPath or os.path.commonpath([path, cachePath]) == cachePath):
+        return None
+    return legacyLocation
+
+def is_cached_response(location):
+    """Check that location is a regular file holding a stored HTTP response."""
+    try:
+        with open(location, 'rb') as cacheFile:
+            return cacheFile.read(5) == b'HTTP/'
+    except (IsADirectoryError, FileNotFoundError, NotADirectoryError):
+        return False
+
+def import_legacy_file(legacyLocation, cacheLocation, url):
+    """Move a legacy cache file to cacheLocation; returns True if it was moved.
+
+    Nothing is moved if the object is already cached in the new layout.
+    The rename keeps the file's inode and modification time, so its
+    freshness is unchanged.
+    """
+    if is_stored(cacheLocation) or not is_cached_response(legacyLocation):
+        return False
+    try:
+        os.makedirs(os.path.dirname(cacheLocation), exist_ok=True)
+        os.replace(legacyLocation, cacheLocation)
+        write_cache_url(cacheLocation, url)
+    except OSError as e:
+        print(f'Failed to move legacy cache file {legacyLocation}: {e}')
+        return False
+    print(f'Moved legacy cache file {legacyLocation} to {cacheLocation}')
+    return True
+
+def migrate_legacy_cache(root='.'):
+    """Move every object cached in the legacy layout under root into CACHE_ROOT.
+
+    Legacy directories are the ones named like a host, optionally with a
+    port. Only files holding a stored response are moved, so anything else
+    that happens to live in such a directory stays where it is, and
+    directories left empty are removed. Returns the number of files moved.
+    A file named "default" is taken to be the directory's own URL, which
+    is what the legacy layout stored it as.
+    """
+    moved = 0
+    cacheRoot = os.path.normpath(os.path.join(root, CACHE_ROOT))
+    for entry in os.scandir(root):
+        if (not entry.is_dir(follow_symlinks=False) or not LEGACY_DIR_PATTERN.match(entry.name)
+                or os.path.normpath(entry.path) == cacheRoot):
+            continue
+        hostname, _, port = entry.name.partition('_')
+        port = int(port) if port else 80
+        for dirPath, dirNames, fileNames in os.walk(entry.path, topdown=False):
+            for fileName in fileNames:
+                legacyLocation = os.path.join(dirPath, fileName)
+                resource = '/' + os.path.relpath(legacyLocation, entry.path).replace(os.sep, '/')
+                if fileName == 'default':
+                    resource = resource[:-len('default')]
+                url = get_cache_url(hostname, port, resource)
+                cacheLocation = get_hashed_location(url, cacheRoot)
+                if import_legacy_file(legacyLocation, cacheLocation, url):
+                    moved += 1
+            try:
+                os.rmdir(dirPath)
+            except OSError:
+                pass
+    if moved:
+        print(f'Migrated {moved} cached objects from the legacy cache layout')
+    return moved
+
+def split_response(response_data):
+    """Return (head, body_offset) for a stored response.
+
+    Cache files written by hand (like the ones create_cache.py and the tests
+    make) may use bare \\n line endings, so both separators are accepted.
+    """
+    header_end = response_data.find(b'\r\n\r\n')
+    if header_end >= 0:
+        return bytes(response_data[:header_end+4]), header_end + 4
+    header_end = response_data.find(b'\n\n')
+    if header_end >= 0:
+        return bytes(response_data[:header_end+2]), header_end + 2
+    return bytes(response_data), len(response_data)
+
+def read_cache_head(cacheFile):
+    """Read just the header block of an open cache file.
+
+    Returns (head, body_offset) like split_response, so the body can be sent
+    from body_offset without reading it into memory.
+    """
+    data = bytearray()
+    while True:
+        chunk = cacheFile.read(HEAD_READ_SIZE)
+        data += chunk
+        if not chunk or b'\r\n\r\n' in data or b'\n\n' in data:
+            return split_response(data)
+
+def get_expiry(headers_text, file_mtime):
+    """Return the time until which a cached response may be served.
+
+    0 means the copy must never be served and float('inf') that it carries
+    no expiry directives.
+    """
+    # Check for redirect - don't use cache for redirects
+    status_line = headers_text.split('\r\n')[0]
+    if '301 ' in status_line or '302 ' in status_line:
+        print("Cache contains redirect response - not using")
+        return 0
+
+    # Check for Cache-Control: max-age
+    max_age_match = re.search(r'Cache-Control:.*?max-age=(\d+)', headers_text, re.IGNORECASE)
+    if max_age_match:
+        max_age = int(max_age_match.group(1))
+        if max_age == 0:
+            print("Cache-Control: max-age=0 found, not using cache")
+            return 0
+        # Fresh for max_age seconds after the file was written
+        return file_mtime + max_age
+
+    # BONUS FEATURE 1: Check for Expires header
+    expires_match = re.search(r'Expires: (.*?)(\r\n|\r|\n)', headers_text, re.IGNORECASE)
+    if expires_match:
+        expires_str = expires_match.group(1).strip()
+        # Handle multiple date formats
+        for fmt in ["%a, %d %b %Y %H:%M:%S GMT", "%A, %d-%b-%y %H:%M:%S GMT", "%A, %d-%b-%Y %H:%M:%S GMT"]:
+            try:
+                expires_date = datetime.strptime(expires_str, fmt)
+            except ValueError:
+                continue
+            return calendar.timegm(expires_date.timetuple())
+        print(f"Error parsing Expires date: {expires_str}")
+        return 0
+
+    # No cache control directives found, use cache
+    return float('inf')
+
+class CacheFileChanged(Exception):
+    """A cache file changed after its freshness was checked and may not be served."""
+
+# Metadata of a stored response. expiry is as returned by get_expiry, size
+# is the body length, head_length the length of the header block and
+# file_id the (inode, mtime in ns) of the cache file it describes.
+# stale_while_revalidate and stale_if_error are the windows in seconds
+# given by the response's Cache-Control directives, or None.
+CacheMeta = namedtuple('CacheMeta', ['status', 'expiry', 'etag', 'last_modified', 'size', 'head_length', 'file_id',
+                                     'stale_while_revalidate', 'stale_if_error'])
+
+def get_stale_window(headers_text, directive):
+    """Return the seconds given by a Cache-Control stale-* directive, or None."""
+    match = re.search(r'Cache-Control:.*?' + directive + r'=(\d+)', headers_text, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+def build_meta(head, size, file_stat):
+    """Compute the index metadata of a stored response from its header block."""
+    headers_text = head.decode('utf-8', errors='replace')
+    status_match = re.match(r'\S+\s+(\d{3})', headers_text)
+    etag_match = re.search(r'^ETag:\s*(.*?)\s*$', headers_text, re.IGNORECASE | re.MULTILINE)
+    last_modified_match = re.search(r'^Last-Modified:\s*(.*?)\s*$', headers_text, re.IGNORECASE | re.MULTILINE)
+    return CacheMeta(int(status_match.group(1)) if status_match else 0,
+                     get_expiry(headers_text, file_stat.st_mtime),
+                     etag_match.group(1) if etag_match else None,
+                     last_modified_match.group(1) if last_modified_match else None,
+                     size, len(head), (file_stat.st_ino, file_stat.st_mtime_ns),
+                     get_stale_window(headers_text, 'stale-while-revalidate'),
+                     get_stale_window(headers_text, 'stale-if-error'))
+
+def scan_cache_file(cacheLocation):
+    """Read a cache file's header block and build its metadata; None if there is no file."""
+    packed = pack_store.get(cacheLocation)
+    if packed is not None:
+        head, body_offset = split_response(packed.data)
+        return build_meta(head, len(packed.data) - body_offset, packed.stat)
+    try:
+        with open(cacheLocation, 'rb') as cacheFile:
+            head, body_offset = read_cache_head(cacheFile)
+            file_stat = os.fstat(cacheFile.fileno())
+    except OSError:
+        return None
+    return build_meta(head, file_stat.st_size - body_offset, file_stat)
+
+class CacheUsage:
+    """How recently and how often a cached object was served, for eviction."""
+
+    def __init__(self, last_access, hits=0, priority=0.0):
+        self.last_access = last_access
+        self.hits = hits
+        # GDSF priority: inflation value when last served + hits / size
+        self.priority = priority
+
+def gdsf_priority(inflation, hits, meta):
+    """Return the GDSF priority of an object served hits times, at the given inflation value."""
+    return inflation + hits / max(1, meta.head_length + meta.size)
+
+# Eviction policies: each maps an object's CacheUsage to a sort key, and the
+# objects with the smallest keys are evicted first
+EVICTION_POLICIES = {
+    # Least recently used
+    'lru': lambda usage: usage.last_access,
+    # Least frequently used, least recently used among equals
+    'lfu': lambda usage: (usage.hits, usage.last_access),
+    # Greedy-Dual-Size-Frequency: large, rarely used objects go first, and
+    # objects that are not used again age out as the inflation value rises
+    'gdsf': lambda usage: usage.priority,
+}
+
+# Columns of the snapshot table: the location, the CacheMeta fields with
+# file_id split in two, and the CacheUsage fields. Snapshots saved before
+# priority was a column get it added, empty.
+INDEX_COLUMNS = ('location', 'status', 'expiry', 'etag', 'last_modified', 'size', 'head_length', 'inode',
+                 'mtime_ns', 'stale_while_revalidate', 'stale_if_error', 'last_access', 'hits', 'priority')
+INDEX_SCHEMA = f'CREATE TABLE IF NOT EXISTS entries ({", ".join(INDEX_COLUMNS)}, PRIMARY KEY (location)) WITHOUT ROWID'
+
+# Values of the index as a whole, such as the GDSF inflation value
+INDEX_STATE_SCHEMA = 'CREATE TABLE IF NOT EXISTS state (name PRIMARY KEY, value) WITHOUT ROWID'
+
+def make_index_row(cacheLocation, meta, usage):
+    """Return the snapshot row of an index entry."""
+    return (cacheLocation, *meta[:6], *meta.file_id, *meta[7:], usage.last_access, usage.hits, usage.priority)
+
+def read_index_row(row, inflation=0.0):
+    """Return (cacheLocation, meta, usage) from a snapshot row.
+
+    A row without a GDSF priority gets one from its hits at inflation.
+    """
+    cacheLocation, *values, inode, mtime_ns, stale_while_revalidate, stale_if_error, last_access, hits, priority = row
+    meta = CacheMeta(*values, (inode, mtime_ns), stale_while_revalidate, stale_if_error)
+    if priority is None:
+        priority = gdsf_priority(inflation, hits, meta)
+    return cacheLocation, meta, CacheUsage(last_access, hits, priority)
+
+class CacheIndex:
+    """Metadata of every cached object, keyed by cache location.
+
+    Entries are added when an object is stored. Objects the index has not
+    seen (written by hand, by create_cache.py or by another worker process)
+    are scanned from disk the first time they are looked up. The entries
+    that changed are written to an SQLite snapshot at INDEX_LOCATION every
+    INDEX_SAVE_INTERVAL seconds and on exit. At startup the snapshot is
+    loaded and checked against the disk by a background thread while the
+    proxy is already serving (see start_loader). Worker processes each keep
+    their own index and save their changes to the same snapshot; whatever
+    one of them misses is scanned again on demand.
+
+    The index also records when and how often each object is served and
+    keeps the cached bytes within max_size, evicting objects in the order
+    of the selected policy.
+    """
+
+    def __init__(self, location=INDEX_LOCATION, stale_while_revalidate=STALE_WHILE_REVALIDATE,
+                 stale_if_error=STALE_IF_ERROR, max_size=DISK_CACHE_SIZE, policy=EVICTION_POLICY):
+        self.location = location
+        # Stale windows for objects whose response does not set its own
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.max_size = max_size
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.entries = {}
+        # cacheLocation -> CacheUsage, for every entry
+        self.usage = {}
+        # Bytes of all indexed cache files
+        self.size = 0
+        # GDSF inflation value: the priority of the last object evicted,
+        # and the value last saved to the snapshot
+        self.inflation = 0.0
+        self.saved_inflation = 0.0
+        # Locations whose entry or usage changed since the last save
+        self.changed = set()
+        # False while the snapshot is being loaded and reconciled; the
+        # cached bytes are not known until then, so nothing is evicted
+        self.loaded = True
+        self.load_seconds = 0.0
+        self.snapshot_entries = 0
+        self.found_on_disk = 0
+        self.dropped = 0
+        self.lookups = 0
+        self.scans = 0
+        self.stale_served = 0
+        self.stale_served_on_error = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def lookup(self, cacheLocation):
+        """Return the CacheMeta of a cached object, or None if it is not cached."""
+        with self.lock:
+            self.lookups += 1
+            meta = self.entries.get(cacheLocation)
+        if meta is None:
+            meta = scan_cache_file(cacheLocation)
+            with self.lock:
+                self.scans += 1
+            if meta is not None:
+                self.put(cacheLocation, meta)
+        return meta
+
+    def put(self, cacheLocation, meta):
+        """Index a stored object, evicting others if the cache is now over quota."""
+        with self.lock:
+            self.add(cacheLocation, meta, self.usage.get(cacheLocation))
+        self.evict(keep=cacheLocation)
+
+    def add(self, cacheLocation, meta, usage=None):
+        """Add or replace an entry (lock held); usage defaults to just stored."""
+        self.discard(cacheLocation)
+        self.entries[cacheLocation] = meta
+        self.usage[cacheLocation] = usage or CacheUsage(time.time(), 0, self.inflation)
+        self.size += meta.head_length + meta.size
+        self.changed.add(cacheLocation)
+
+    def discard(self, cacheLocation):
+        """Drop an entry if present (lock held); returns its (meta, usage)."""
+        meta = self.entries.pop(cacheLocation, None)
+        usage = self.usage.pop(cacheLocation, None)
+        if meta is not None:
+            self.size -= meta.head_length + meta.size
+            self.changed.add(cacheLocation)
+        return meta, usage
+
+    def record_access(self, cacheLocation):
+        """Note that a cached object was served."""
+        with self.lock:
+            usage = self.usage.get(cacheLocation)
+            if usage is None:
+                return
+            meta = self.entries[cacheLocation]
+            usage.last_access = time.time()
+            usage.hits += 1
+            usage.priority = gdsf_priority(self.inflation, usage.hits, meta)
+            self.changed.add(cacheLocation)
+
+    def evict(self, keep=None):
+        """Remove cache files until the cache is within max_size again.
+
+        Eviction frees space down to EVICTION_TARGET of the quota, taking
+        objects in the order of the eviction policy. keep (the object just
+        stored) is never evicted. The candidates are ordered in a heap
+        built outside the lock; one served since it was built is passed over.
+        """
+        victims = []
+        with self.lock:
+            if not self.loaded or not self.max_size or self.size <= self.max_size:
+                return
+            key = EVICTION_POLICIES[self.policy]
+            candidates = [(key(usage), cacheLocation) for cacheLocation, usage in self.usage.items()
+                          if cacheLocation != keep]
+        heapq.heapify(candidates)
+        with self.lock:
+            while candidates and self.size > self.max_size * EVICTION_TARGET:
+                order, cacheLocation = heapq.heappop(candidates)
+                usage = self.usage.get(cacheLocation)
+                if usage is None or key(usage) != order:
+                    continue
+                meta, usage = self.discard(cacheLocation)
+                self.inflation = max(self.inflation, usage.priority)
+                self.evictions += 1
+                self.evicted_bytes += meta.head_length + meta.size
+                victims.append((cacheLocation, meta))
+
+        for cacheLocation, meta in victims:
+            memory_cache.invalidate(cacheLocation)
+            try:
+                # Leave the file alone if it was replaced since it was chosen
+                file_stat = stat_cached(cacheLocation)
+                if (file_stat.st_ino, file_stat.st_mtime_ns) == meta.file_id:
+                    remove_cached(cacheLocation)
+            except OSError as e:
+                print(f'Failed to evict {cacheLocation}: {e}')
+        if victims:
+            print(f'Evicted {len(victims)} cached objects ({self.policy})')
+
+    def confirm(self, cacheLocation, head, file_stat, stale=False):
+        """Check an opened cache file is the one its index entry describes.
+
+        Files rewritten behind the index's back (by hand, or by another
+        worker process) are re-indexed from the header block already read.
+        Raises CacheFileChanged if the file found may no longer be served;
+        with stale True the caller is serving a stale copy anyway and any
+        file found will do.
+        """
+        self.record_access(cacheLocation)
+        with self.lock:
+            meta = self.entries.get(cacheLocation)
+        if meta is not None and meta.file_id == (file_stat.st_ino, file_stat.st_mtime_ns):
+            return
+        meta = build_meta(head, file_stat.st_size - len(head), file_stat)
+        self.put(cacheLocation, meta)
+        if not stale and time.time() > meta.expiry:
+            raise CacheFileChanged(f'{cacheLocation} changed on disk and is no longer fresh')
+
+    def remove(self, cacheLocation):
+        """Forget an object whose cache file has gone."""
+        with self.lock:
+            self.discard(cacheLocation)
+
+    def start_loader(self):
+        """Load the snapshot and reconcile it with the disk in a background thread.
+
+        Lookups are answered meanwhile: objects not loaded yet are scanned
+        from disk as usual, and entries stored or removed while loading are
+        not overwritten by older snapshot rows. Eviction waits until the
+        cached bytes are known.
+        """
+        self.loaded = False
+        def loader():
+            startTime = time.monotonic()
+            try:
+                self.load()
+                migrate_legacy_cache()
+                self.reconcile()
+            except (OSError, sqlite3.Error) as e:
+                print(f'Failed to load cache index: {e}')
+            with self.lock:
+                self.loaded = True
+                self.load_seconds = time.monotonic() - startTime
+            print(f'Cache index ready with {len(self.entries)} entries after {self.load_seconds:.2f}s')
+            self.evict()
+        loaderThread = threading.Thread(target=loader)
+        loaderThread.daemon = True
+        loaderThread.start()
+
+    def connect(self):
+        """Open the snapshot, creating it if needed."""
+        os.makedirs(os.path.dirname(self.location), exist_ok=True)
+        db = sqlite3.connect(self.location, timeout=INDEX_LOCK_TIMEOUT)
+        # Write-ahead logging keeps the snapshot intact if the proxy dies
+        # during a save, and lets a load read while another worker saves
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute(INDEX_SCHEMA)
+        db.execute(INDEX_STATE_SCHEMA)
+        if 'priority' not in [column[1] for column in db.execute('PRAGMA table_info(entries)')]:
+            db.execute('ALTER TABLE entries ADD COLUMN priority')
+        return db
+
+    def load(self):
+        """Add the snapshot's entries to the index, INDEX_LOAD_BATCH at a time.
+
+        Entries are taken as saved; reconcile checks them against the disk
+        afterwards, and a hit on a file changed since is re-indexed by
+        confirm. Without a snapshot a JSON index saved by earlier versions
+        is imported instead.
+        """
+        if not os.path.exists(self.location):
+            self.load_legacy_index()
+            return
+        with closing(self.connect()) as db:
+            saved = db.execute("SELECT value FROM state WHERE name = 'inflation'").fetchone()
+            with self.lock:
+                if saved is not None and saved[0] > self.inflation:
+                    self.inflation = self.saved_inflation = saved[0]
+                inflation = self.inflation
+            rows = db.execute(f'SELECT {", ".join(INDEX_COLUMNS)} FROM entries')
+            while True:
+                batch = rows.fetchmany(INDEX_LOAD_BATCH)
+                if not batch:
+                    break
+                with self.lock:
+                    for row in batch:
+                        cacheLocation, meta, usage = read_index_row(row, inflation)
+                        if cacheLocation not in self.entries:
+                            self.add(cacheLocation, meta, usage)
+                            # Already saved as it is
+                            self.changed.discard(cacheLocation)
+                            self.snapshot_entries += 1
+        print(f'Loaded {self.snapshot_entries} cache index entries from {self.location}')
+
+    def load_legacy_index(self, location=LEGACY_INDEX_LOCATION):
+        """Import a JSON index saved by earlier versions, then remove it."""
+        try:
+            with open(location) as indexFile:
+                saved = json.load(indexFile)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f'Ignoring unreadable cache index {location}: {e}')
+            return
+        fieldCount = len(CacheMeta._fields)
+        with self.lock:
+            for cacheLocation, values in saved.items():
+                try:
+                    meta = CacheMeta(*values[:fieldCount])
+                except TypeError:
+                    continue
+                last_access, hits = (values[fieldCount:] + [time.time(), 0])[:2]
+                if cacheLocation not in self.entries:
+                    self.add(cacheLocation, meta._replace(file_id=tuple(meta.file_id)),
+                             CacheUsage(last_access, hits, gdsf_priority(self.inflation, hits, meta)))
+        os.unlink(location)
+        print(f'Imported {len(saved)} cache index entries from {location}')
+
+    def reconcile(self, cacheRoot=CACHE_ROOT):
+        """Check the index against the disk: drop entries whose file changed or
+        went, and index the cached objects it does not know yet.
+
+        Changed files are dropped first and then found again as unknown
+        ones, so their metadata is rebuilt from the file.
+        """
+        for cacheLocation in list(self.entries):
+            meta = self.entries.get(cacheLocation)
+            try:
+                file_stat = stat_cached(cacheLocation)
+                file_id = (file_stat.st_ino, file_stat.st_mtime_ns)
+            except OSError:
+                file_id = None
+            if meta is not None and file_id != meta.file_id:
+                with self.lock:
+                    if self.entries.get(cacheLocation) is meta:
+                        self.discard(cacheLocation)
+                        self.dropped += 1
+
+        def unknown_locations():
+            for dirPath, dirNames, fileNames in os.walk(cacheRoot):
+                for fileName in fileNames:
+                    if CACHE_FILE_PATTERN.match(fileName):
+                        yield os.path.join(dirPath, fileName)
+            yield from list(pack_store.entries)
+
+        for cacheLocation in unknown_locations():
+            if cacheLocation in self.entries:
+                continue
+            meta = scan_cache_file(cacheLocation)
+            if meta is None:
+                continue
+            with self.lock:
+                if cacheLocation not in self.entries:
+                    self.add(cacheLocation, meta)
+                    self.found_on_disk += 1
+        print(f'Reconciled cache index with {cacheRoot}: {self.found_on_disk} objects found, {self.dropped} dropped')
+
+    def save(self):
+        """Write the entries that changed since the last save to the snapshot.
+
+        Each save is one transaction, so the snapshot holds either all of
+        its changes or none of them.
+        """
+        with self.lock:
+            if not self.changed and self.inflation == self.saved_inflation:
+                return
+            changed, self.changed = self.changed, set()
+            inflation = self.inflation
+            rows = [make_index_row(cacheLocation, self.entries[cacheLocation], self.usage[cacheLocation])
+                    for cacheLocation in changed if cacheLocation in self.entries]
+            removed = [(cacheLocation,) for cacheLocation in changed if cacheLocation not in self.entries]
+        try:
+            with closing(self.connect()) as db, db:
+                db.executemany(f'INSERT OR REPLACE INTO entries ({", ".join(INDEX_COLUMNS)}) '
+                               f'VALUES ({", ".join("?" * len(INDEX_COLUMNS))})', rows)
+                db.executemany('DELETE FROM entries WHERE location = ?', removed)
+                # Worker processes share the snapshot; the highest inflation value is kept
+                db.execute("INSERT INTO state VALUES ('inflation', ?) "
+                           "ON CONFLICT (name) DO UPDATE SET value = max(value, excluded.value)", (inflation,))
+        except BaseException:
+            with self.lock:
+                self.changed |= changed
+            raise
+        with self.lock:
+            self.saved_inflation = inflation
+
+    def start_saver(self, interval=INDEX_SAVE_INTERVAL):
+        """Save the index every interval seconds from a daemon thread."""
+        def saver():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.save()
+                except (OSError, sqlite3.Error) as e:
+                    print(f'Failed to save cache index: {e}')
+        saverThread = threading.Thread(target=saver)
+        saverThread.daemon = True
+        saverThread.start()
+
+    def count_stale(self, error=False):
+        """Count a stale copy served while revalidating, or because the origin failed."""
+        with self.lock:
+            if error:
+                self.stale_served_on_error += 1
+            else:
+                self.stale_served += 1
+
+    def counters(self):
+        """Return the index counters for the stats report."""
+        with self.lock:
+            return {'entries': len(self.entries), 'lookups': self.lookups, 'scans': self.scans,
+                    'stale_served': self.stale_served, 'stale_served_on_error': self.stale_served_on_error,
+                    'bytes': self.size, 'quota': self.max_size, 'policy': self.policy,
+                    'evictions': self.evictions, 'evicted_bytes': self.evicted_bytes, 'loaded': int(self.loaded),
+                    'load_seconds': round(self.load_seconds, 3), 'snapshot_entries': self.snapshot_entries,
+                    'found_on_disk': self.found_on_disk, 'dropped': self.dropped}
+
+# Shared by every thread of this process
+cache_index = CacheIndex()
+register('index', cache_index.counters)
+
+def conditional_headers(meta):
+    """Return the request headers revalidating a stale cached copy with its validators.
+
+    The list is empty if there is no cached copy or it cannot be revalidated.
+    """
+    if meta is None or meta.status != 200:
+        return []
+    headers = []
+    if meta.etag:
+        headers.append('If-None-Match: ' + meta.etag)
+    if meta.last_modified:
+        headers.append('If-Modified-Since: ' + meta.last_modified)
+    return headers
+
+def merge_validated_head(head, validated_head):
+    """Apply the headers of a 304 Not Modified answer to a stored header block.
+
+    Returns the updated header block, or None if the 304 changed nothing.
+    """
+    def name(line):
+        return line.partition(b':')[0].strip().lower()
+
+    def normalize(line):
+        return name(line), line.partition(b':')[2].strip()
+
+    lines = re.split(rb'\r?\n', bytes(head).rstrip(b'\r\n'))
+    updates = [line for line in re.split(rb'\r?\n', bytes(validated_head).rstrip(b'\r\n'))[1:]
+               if b':' in line and name(line) not in UNREFRESHED_HEADERS]
+    names = {name(line) for line in updates}
+    replaced = [normalize(line) for line in lines[1:] if name(line) in names]
+    if replaced == [normalize(line) for line in updates]:
+        return None
+    kept = [line for line in lines[1:] if name(line) not in names]
+    return b'\r\n'.join([lines[0]] + kept + updates) + b'\r\n\r\n'
+
+def refresh_cached_response(cacheLocation, validated_head):
+    """Refresh a stale cached copy the origin answered with 304 Not Modified.
+
+    If the 304 carries no new headers the file is only touched, which
+    restarts its max-age clock without copying the body; otherwise the
+    updated header block and the stored body are written to a new copy.
+    Returns False if the cached copy has gone and must be fetched again.
+    """
+    packed = pack_store.get(cacheLocation)
+    if packed is not None:
+        return refresh_packed_response(cacheLocation, packed, validated_head)
+    try:
+        with open(cacheLocation, 'rb') as cacheFile:
+            head, body_offset = read_cache_head(cacheFile)
+            merged = merge_validated_head(head, validated_head)
+            if merged is not None:
+                cacheWriter = CacheWriter(cacheLocation)
+                try:
+                    cacheWriter.write(merged)
+                    cacheFile.seek(body_offset)
+                    shutil.copyfileobj(cacheFile, cacheWriter)
+                except BaseException:
+                    cacheWriter.discard()
+                    raise
+                cacheWriter.commit()
+                return True
+            os.utime(cacheFile.fileno())
+            file_stat = os.fstat(cacheFile.fileno())
+    except FileNotFoundError:
+        cache_index.remove(cacheLocation)
+        return False
+    memory_cache.invalidate(cacheLocation)
+    cache_index.put(cacheLocation, build_meta(head, file_stat.st_size - body_offset, file_stat))
+    return True
+
+def refresh_packed_response(cacheLocation, packed, validated_head):
+    """refresh_cached_response for an object in the packfile store.
+
+    A packed record cannot be touched, so the object is stored again, with
+    the updated header block if the 304 carried one.
+    """
+    head, body_offset = split_response(packed.data)
+    merged = merge_validated_head(head, validated_head)
+    data = packed.data
+    if merged is not None:
+        head, data = merged, merged + packed.data[body_offset:]
+    file_stat = pack_store.put(cacheLocation, data, packed.url)
+    memory_cache.invalidate(cacheLocation)
+    cache_index.put(cacheLocation, build_meta(head, len(data) - len(head), file_stat))
+    return True
+
+def is_cache_fresh(cacheLocation):
+    """Check whether the cached copy at cacheLocation exists and may be served.
+
+    The decision is made from the object's entry in cache_index; the file
+    itself is only read for objects the index has not seen yet.
+    """
+    # BONUS FEATURE 1: Expires Header Checking
+    meta = cache_index.lookup(cacheLocation)
+    if meta is None:
+        return False
+    use_cache = time.time() <= meta.expiry
+    if meta.expiry and not use_cache:
+        print(f"Cache expired at {time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(meta.expiry))}")
+    return use_cache
+
+def may_serve_stale(cacheLocation, error=False):
+    """Check whether a stale cached copy is within its stale-while-revalidate window.
+
+    With error True the stale-if-error window is checked instead, for when
+    the origin server cannot be reached or answers with a server error.
+    Only copies of 200 responses that had a freshness lifetime qualify.
+    """
+    meta = cache_index.lookup(cacheLocation)
+    if meta is None or meta.status != 200 or not meta.expiry:
+        return False
+    if error:
+        window = meta.stale_if_error
+        default = cache_index.stale_if_error
+    else:
+        window = meta.stale_while_revalidate
+        default = cache_index.stale_while_revalidate
+    return time.time() <= meta.expiry + (default if window is None else window)
+
+def check_headers(headers):
+    """Inspect origin response headers and return (should_cache, is_redirect, is_html)."""
+    # Check if we should cache this response
+    should_cache = True
+
+    # Check if it's a redirect response
+    is_redirect = False
+    is_html = False
+
+    # Check response status code
+    status_line = headers.split('\r\n')[0]
+    if '301 ' in status_line or '302 ' in status_line:
+        print(f"Redirect response detected: {status_line}")
+        should_cache = False
+        is_redirect = True
+
+    # Check for no-store directive
+    if 'Cache-Control: no-store' in headers or 'Cache-Control: no-cache' in headers:
+        should_cache = False
+
+    # Check if this is HTML content
+    if 'Content-Type: text/html' in headers:
+        is_html = True
+
+    return should_cache, is_redirect, is_html
+
+class CacheCompression:
+    """Which bodies are stored compressed, and how much that saved."""
+
+    def __init__(self, level=COMPRESS_LEVEL, min_size=COMPRESS_MIN_SIZE):
+        self.level = level
+        self.min_size = min_size
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.original_bytes = 0
+        self.stored_bytes = 0
+        self.served_compressed = 0
+        self.served_inflated = 0
+
+    def should_compress(self, headers_text):
+        """Check whether a cacheable origin response is stored compressed.
+
+        Only 200 responses with a text content type that the origin did not
+        encode itself are, and not if they declare a body under min_size.
+        """
+        if not self.level or not re.match(r'\S+\s+200\b', headers_text):
+            return False
+        if re.search(r'^Content-Encoding:', headers_text, re.IGNORECASE | re.MULTILINE):
+            return False
+        type_match = re.search(r'^Content-Type:\s*(\S+)', headers_text, re.IGNORECASE | re.MULTILINE)
+        if not type_match or not type_match.group(1).lower().startswith(COMPRESSIBLE_TYPES):
+            return False
+        length_match = re.search(r'^Content-Length:\s*(\d+)', headers_text, re.IGNORECASE | re.MULTILINE)
+        return not length_match or int(length_match.group(1)) >= self.min_size
+
+    def count_stored(self, original_size, stored_size):
+        with self.lock:
+            self.stored += 1
+            self.original_bytes += original_size
+            self.stored_bytes += stored_size
+
+    def count_served(self, inflated):
+        with self.lock:
+            if inflated:
+                self.served_inflated += 1
+            else:
+                self.served_compressed += 1
+
+    def counters(self):
+        """Return the compression counters for the stats report."""
+        with self.lock:
+            return {'level': self.level, 'stored': self.stored, 'original_bytes': self.original_bytes,
+                    'stored_bytes': self.stored_bytes, 'served_compressed': self.served_compressed,
+                    'served_inflated': self.served_inflated}
+
+# Shared by every thread of this process
+cache_compression = CacheCompression()
+register('compression', cache_compression.counters)
+
+def prepare_compressed_head(head, accept_gzip):
+    """Rewrite the stored header block of a compressed body for a client.
+
+    Clients that accept gzip keep Content-Encoding, with the ETag weakened
+    since the bytes differ from the origin's; for the others it is dropped
+    and the body is inflated. Either way the framing is left to the caller
+    and Vary tells downstream caches that the encoding depends on the request.
+    """
+    lines = re.split(rb'\r?\n', head.rstrip(b'\r\n'))
+    kept = [lines[0]]
+    vary = False
+    for line in lines[1:]:
+        name, _, value = line.partition(b':')
+        name, value = name.strip().lower(), value.strip()
+        if line == COMPRESSED_MARKER or name == b'content-length':
+            continue
+        if name == b'content-encoding' and not accept_gzip:
+            continue
+        if name == b'etag' and accept_gzip and not value.startswith(b'W/'):
+            line = b'ETag: W/' + value
+        if name == b'vary':
+            vary = True
+            line += b', Accept-Encoding'
+        kept.append(line)
+    if not vary:
+        kept.append(b'Vary: Accept-Encoding')
+    return b'\r\n'.join(kept) + b'\r\n\r\n'
+
+def prepare_stored_head(head, accept_gzip):
+    """Return (head, inflate) for sending a stored object to a client.
+
+    inflate is True if the body was compressed by the proxy and the client
+    does not accept gzip, so it has to be inflated on the way out.
+    """
+    if COMPRESSED_MARKER not in head:
+        return head, False
+    inflate = not accept_gzip
+    cache_compression.count_served(inflate)
+    return prepare_compressed_head(head, accept_gzip), inflate
+
+def read_original_size(cacheFile, file_size):
+    """Return the size of a compressed body once inflated, from its gzip trailer."""
+    return int.from_bytes(os.pread(cacheFile.fileno(), 4, file_size - 4), 'little')
+
+def inflate_body(cacheFile, offset, length):
+    """Yield the inflated pieces of the compressed body stored at offset in cacheFile."""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    end = offset + length
+    while offset < end:
+        data = os.pread(cacheFile.fileno(), min(INFLATE_READ_SIZE, end - offset), offset)
+        if not data:
+            break
+        offset += len(data)
+        piece = decompressor.decompress(data)
+        if piece:
+            yield piece
+    piece = decompressor.flush()
+    if piece:
+        yield piece
+
+class CacheWriter:
+    """Stream a response into a temporary file, then commit or discard it.
+
+    The temporary file lives next to cacheLocation and is renamed into place
+    on commit. The rename is atomic, so concurrent readers in other threads or
+    worker processes see either the old object or the new one, never a
+    partial write. Objects small enough for the packfile store are copied
+    into it instead, and the temporary file is removed.
+    """
+
+    def __init__(self, cacheLocation, url=None, compress=False):
+        self.cacheLocation = cacheLocation
+        # URL recorded next to a newly cached object, if known
+        self.url = url
+        # The header block, once it has been written, for the index entry
+        self.head = None
+        self.prefix = bytearray()
+        # With compress the body is gzip-compressed as it is written
+        self.compressor = None
+        if compress:
+            self.compressor = zlib.compressobj(cache_compression.level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        self.original_size = 0
+        self.ended = False
+        cacheDir, file = os.path.split(cacheLocation)
+        print('cached directory ' + cacheDir)
+        # Other workers may create the same directory at the same time
+        os.makedirs(cacheDir, exist_ok=True)
+        fd, self.tempLocation = tempfile.mkstemp(dir=cacheDir, prefix='.' + file + '.', suffix='.tmp')
+        # mkstemp creates the file owner-only; cache files are world readable
+        os.fchmod(fd, 0o644)
+        self.cacheFile = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        if self.head is not None:
+            self.write_body(data)
+            return
+        self.prefix += data
+        if b'\r\n\r\n' in self.prefix or b'\n\n' in self.prefix:
+            self.head, body_offset = split_response(self.prefix)
+            self.cacheFile.write(self.head)
+            self.write_body(self.prefix[body_offset:])
+            self.prefix = None
+
+    def write_body(self, data):
+        self.original_size += len(data)
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        if data:
+            self.cacheFile.write(data)
+
+    def end_body(self):
+        """Write out the end of a compressed body; nothing may be written after it."""
+        if self.compressor is not None and not self.ended:
+            self.cacheFile.write(self.compressor.flush())
+        self.ended = True
+
+    def commit(self):
+        """Publish the temporary file as the cached object and index it."""
+        if self.head is None:
+            # Never saw the end of the header block; store what arrived
+            self.cacheFile.write(self.prefix)
+        self.end_body()
+        if self.compressor is not None:
+            # The gzip trailer only holds the original size modulo 2**32
+            if self.original_size >= 2 ** 32:
+                print('Body too large to store compressed')
+                self.discard()
+                return
+        self.cacheFile.flush()
+        file_stat = os.fstat(self.cacheFile.fileno())
+        # BONUS FEATURE 18: Packfile Store
+        if pack_store.accepts(file_stat.st_size):
+            data = os.pread(self.cacheFile.fileno(), file_stat.st_size, 0)
+            self.cacheFile.close()
+            file_stat = pack_store.put(self.cacheLocation, data, self.url or read_cache_url(self.cacheLocation))
+            os.unlink(self.tempLocation)
+            # Drop a loose copy stored before, with its URL record
+            for location in (self.cacheLocation, get_url_location(self.cacheLocation)):
+                try:
+                    os.unlink(location)
+                except FileNotFoundError:
+                    pass
+        else:
+            self.cacheFile.close()
+            url = self.url or read_cache_url(self.cacheLocation)
+            os.replace(self.tempLocation, self.cacheLocation)
+            pack_store.delete(self.cacheLocation)
+            if url is not None:
+                write_cache_url(self.cacheLocation, url)
+        memory_cache.invalidate(self.cacheLocation)
+        head = self.head if self.head is not None else bytes(self.prefix)
+        cache_index.put(self.cacheLocation, build_meta(head, file_stat.st_size - len(head), file_stat))
+        if self.compressor is not None:
+            cache_compression.count_stored(self.original_size, file_stat.st_size - len(head))
+        print('cache file closed')
+
+    def discard(self):
+        """Throw away an incomplete or uncacheable response."""
+        self.cacheFile.close()
+        try:
+            os.unlink(self.tempLocation)
+        except FileNotFoundError:
+            pass
+        print('cache file discarded')
+
+class MemoryEntry:
+    """A cached response held in memory, with what is needed to serve it."""
+
+    def __init__(self, head, body, expiry, file_id):
+        self.head = head
+        self.body = body
+        self.expiry = expiry
+        # (inode, mtime) of the disk copy the entry was loaded from
+        self.file_id = file_id
+        self.checked = time.monotonic()
+
+class MemoryCache:
+    """Byte-bounded LRU cache of small objects, keyed by cache location.
+
+    Entries are dropped when this process rewrites the disk copy, and
+    checked against the disk copy at most every MEMORY_CHECK_INTERVAL
+    seconds in case another worker process rewrote it.
+    """
+
+    def __init__(self, max_size=MEMORY_CACHE_SIZE, max_object_size=MEMORY_OBJECT_SIZE):
+        self.max_size = max_size
+        self.max_object_size = max_object_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        # Bumped on every invalidation, so a load that raced with a rewrite
+        # is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, cacheLocation):
+        """Return the fresh MemoryEntry for cacheLocation, or None."""
+        with self.lock:
+            entry = self.entries.get(cacheLocation)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() > entry.expiry:
+                self.remove(cacheLocation)
+                self.misses += 1
+                return None
+            check = time.monotonic() - entry.checked > MEMORY_CHECK_INTERVAL
+        if check and not self.still_on_disk(cacheLocation, entry):
+            self.invalidate(cacheLocation)
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            if cacheLocation in self.entries:
+                self.entries.move_to_end(cacheLocation)
+            self.hits += 1
+        cache_index.record_access(cacheLocation)
+        return entry
+
+    def still_on_disk(self, cacheLocation, entry):
+        """Check the disk copy is the one the entry was loaded from."""
+        try:
+            stat = stat_cached(cacheLocation)
+        except OSError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns) != entry.file_id:
+            return False
+        entry.checked = time.monotonic()
+        return True
+
+    def fits(self, body_length):
+        """True if an object with this body length may be kept in memory."""
+        return 0 < self.max_size and body_length <= min(self.max_object_size, self.max_size)
+
+    def put(self, cacheLocation, head, body, file_stat, generation):
+        """Keep a response loaded from disk; returns the entry, or None if it may not be kept.
+
+        generation is the value of self.generation read before the disk
+        copy was opened.
+        """
+        expiry = get_expiry(head.decode('utf-8', errors='replace'), file_stat.st_mtime)
+        if not expiry or not self.fits(len(body)):
+            return None
+        entry = MemoryEntry(head, body, expiry, (file_stat.st_ino, file_stat.st_mtime_ns))
+        size = len(head) + len(body)
+        with self.lock:
+            if generation != self.generation:
+                return None
+            self.remove(cacheLocation)
+            self.entries[cacheLocation] = entry
+            self.size += size
+            # Evict the least recently used entries to stay within budget
+            while self.size > self.max_size:
+                oldest = next(iter(self.entries))
+                self.remove(oldest)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, cacheLocation):
+        """Forget the memory copy of an object whose disk copy changed."""
+        with self.lock:
+            self.generation += 1
+            if cacheLocation in self.entries:
+                self.remove(cacheLocation)
+                self.invalidations += 1
+
+    def remove(self, cacheLocation):
+        """Drop an entry if present (lock held)."""
+        entry = self.entries.pop(cacheLocation, None)
+        if entry:
+            self.size -= len(entry.head) + len(entry.body)
+
+    def counters(self):
+        """Return the memory tier counters for the stats report."""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'invalidations': self.invalidations, 'objects': len(self.entries), 'bytes': self.size}
+
+# Shared by every thread of this process
+memory_cache = MemoryCache()
+register('memory_cache', memory_cache.counters)
+
+def read_packed_object(cacheLocation, stale=False):
+    """Return (head, body) of an object in the packfile store, or None if it is not packed.
+
+    Like a hit on a cache file, the index entry is confirmed (raising
+    CacheFileChanged the same way) and the object is kept in the memory
+    cache unless it is served stale.
+    """
+    generation = memory_cache.generation
+    packed = pack_store.get(cacheLocation)
+    if packed is None:
+        return None
+    print('Cache hit! Loading from pack: ' + cacheLocation)
+    head, body_offset = split_response(packed.data)
+    cache_index.confirm(cacheLocation, head, packed.stat, stale)
+    body = packed.data[body_offset:]
+    if not stale:
+        memory_cache.put(cacheLocation, head, body, packed.stat, generation)
+    return head, body
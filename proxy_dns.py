@@ -0,0 +1,130 @@
+# proxy_dns.py - Cached hostname resolution shared by every origin connection
+#
+# Every cache miss and every prefetched URL needs the origin server's
+# address, and a page's assets usually all live on the same few hosts.
+# Lookups go through getaddrinfo, so both A and AAAA records are returned,
+# and the answers are kept for a fixed TTL (getaddrinfo does not expose the
+# record TTLs). Names that do not exist are remembered for a shorter
+# negative TTL. When several threads look up the same name at once only the
+# first one asks the resolver; the others wait for its answer.
+
+import socket
+import threading
+import time
+
+from proxy_stats import register
+
+# Seconds a successful lookup is reused
+DNS_TTL = 300
+
+# Seconds a failed lookup of a name that does not exist is remembered
+DNS_NEGATIVE_TTL = 30
+
+# Cached names kept before expired entries are swept out
+DNS_MAX_ENTRIES = 1024
+
+# getaddrinfo errors meaning the name does not exist, rather than a
+# temporary resolver failure that is worth retrying
+NEGATIVE_ERRORS = (socket.EAI_NONAME, getattr(socket, 'EAI_NODATA', socket.EAI_NONAME))
+
+class DNSCache:
+    """TTL cache in front of getaddrinfo with single-flight lookups."""
+
+    def __init__(self, ttl=DNS_TTL, negative_ttl=DNS_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        # hostname -> (expiry time, list of (family, address) or a gaierror)
+        self.entries = {}
+        # hostname -> Event set when the lookup in progress finishes
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.collapsed = 0
+
+    def resolve(self, hostname):
+        """Return the addresses of hostname as a list of (family, address).
+
+        Raises socket.gaierror if the name cannot be resolved.
+        """
+        while True:
+            with self.lock:
+                entry = self.entries.get(hostname)
+                if entry and entry[0] > time.monotonic():
+                    if isinstance(entry[1], socket.gaierror):
+                        self.negative_hits += 1
+                        raise entry[1]
+                    self.hits += 1
+                    return entry[1]
+                lookup = self.in_flight.get(hostname)
+                if lookup is None:
+                    # This thread does the lookup
+                    lookup = self.in_flight[hostname] = threading.Event()
+                    self.misses += 1
+                    break
+                self.collapsed += 1
+            # Another thread is already asking the resolver; use its answer
+            lookup.wait()
+
+        try:
+            addresses = self.lookup(hostname)
+        except socket.gaierror as e:
+            with self.lock:
+                if e.errno in NEGATIVE_ERRORS:
+                    self.entries[hostname] = (time.monotonic() + self.negative_ttl, e)
+                del self.in_flight[hostname]
+            lookup.set()
+            raise
+        except BaseException:
+            with self.lock:
+                del self.in_flight[hostname]
+            lookup.set()
+            raise
+
+        with self.lock:
+            if len(self.entries) >= DNS_MAX_ENTRIES:
+                self.expire()
+            self.entries[hostname] = (time.monotonic() + self.ttl, addresses)
+            del self.in_flight[hostname]
+        lookup.set()
+        return addresses
+
+    def expire(self):
+        """Drop entries whose TTL has run out (lock held)."""
+        now = time.monotonic()
+        for hostname in [name for name, entry in self.entries.items() if entry[0] <= now]:
+            del self.entries[hostname]
+
+    def lookup(self, hostname):
+        """Ask the resolver for the A and AAAA records of hostname."""
+        print(f'DNS lookup: {hostname}')
+        addresses = []
+        for family, _, _, _, sockaddr in socket.getaddrinfo(hostname, None, type=socket.SOCK_STREAM):
+            if (family, sockaddr[0]) not in addresses:
+                addresses.append((family, sockaddr[0]))
+        return addresses
+
+    def counters(self):
+        """Return the lookup counters for the stats report."""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'negative_hits': self.negative_hits,
+                    'collapsed': self.collapsed, 'cached_names': len(self.entries)}
+
+def connect_to(addresses, port, timeout):
+    """Connect to the first of addresses that accepts on port and return the socket."""
+    last_error = None
+    for family, address in addresses:
+        originServerSocket = socket.socket(family, socket.SOCK_STREAM)
+        originServerSocket.settimeout(timeout)
+        try:
+            originServerSocket.connect((address, port))
+            return originServerSocket
+        except OSError as e:
+            originServerSocket.close()
+            last_error = e
+    raise last_error or OSError(f'no addresses to connect to on port {port}')
+
+# Shared by the miss path, the prefetch threads and the asyncio mode
+dns_cache = DNSCache()
+register('dns', dns_cache.counters)
@@ -0,0 +1,688 @@
+# proxy_http.py - HTTP request parsing and framing shared by the proxy serving modes
+#
+# Both the threaded handler in Proxy-bonus.py and the asyncio engine in
+# proxy_async.py parse client requests the same way, so the logic lives here,
+# together with the streaming relay used by Proxy.py and Proxy-bonus.py.
+#
+# Client connections are persistent (HTTP/1.1 keep-alive), so every request
+# and response has to be framed: request bodies are read by Content-Length,
+# and responses sent to the client carry a Content-Length or chunked encoding,
+# or are followed by closing the connection. Origin connections are
+# persistent as well (see proxy_pool.py), so origin responses are framed by
+# Content-Length or chunked encoding rather than by the origin closing.
+
+import os
+import re
+from collections import namedtuple
+
+from proxy_cache import CacheWriter, check_headers, cache_compression, COMPRESSED_MARKER
+from proxy_links import make_link_extractor
+
+# Size of the reusable receive buffer each SocketReader reads into
+RECV_BUFFER_SIZE = 65536
+
+# Largest request header block accepted from a client
+MAX_REQUEST_SIZE = 65536
+
+# Seconds an idle keep-alive client connection stays open between requests
+KEEPALIVE_TIMEOUT = 15
+
+# Requests served on one client connection before it is closed
+MAX_REQUESTS_PER_CONNECTION = 100
+
+# Response status codes that never carry a body
+NO_BODY_STATUSES = (204, 304)
+
+# Origin server errors a stale cached copy may be served instead of
+# (stale-if-error)
+ORIGIN_ERROR_STATUSES = (500, 502, 503, 504)
+
+# Hop-by-hop headers that describe one connection and must not be forwarded
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'proxy-connection', 'te', 'trailer', 'upgrade')
+
+# Most byte ranges answered in one multipart/byteranges response; requests
+# for more get the whole object
+MAX_RANGES = 16
+
+# The Range and If-Range headers of a GET request
+ByteRange = namedtuple('ByteRange', ['spec', 'if_range'])
+
+class SocketReader:
+    """Buffered reader over a socket built on recv_into and a reusable buffer.
+
+    Growing an immutable bytes object with += copies everything received so
+    far on every recv, which is O(n^2) for large responses. SocketReader
+    receives into one preallocated bytearray and hands out memoryview slices
+    of it, and accumulates only when the caller really needs the bytes kept.
+    """
+
+    def __init__(self, sock, buffer_size=RECV_BUFFER_SIZE):
+        self.sock = sock
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        # Bytes already received but not yet returned to the caller
+        self.pending = bytearray()
+        # Called once, when the next chunk with data is returned
+        self.on_first_chunk = None
+
+    def recv_chunk(self):
+        """Return the next chunk of data, or an empty view once the peer closes.
+
+        The returned memoryview points into the reusable buffer and is only
+        valid until the next call.
+        """
+        if self.pending:
+            chunk = memoryview(bytes(self.pending))
+            self.pending.clear()
+        else:
+            received = self.sock.recv_into(self.buffer)
+            chunk = self.view[:received]
+        if chunk and self.on_first_chunk is not None:
+            on_first_chunk, self.on_first_chunk = self.on_first_chunk, None
+            on_first_chunk()
+        return chunk
+
+    def read_until(self, delimiter, limit=MAX_REQUEST_SIZE):
+        """Read up to and including delimiter; anything after it stays buffered.
+
+        Returns whatever was received if the peer closes first. Raises
+        ValueError if more than limit bytes arrive without the delimiter.
+        """
+        data = self.pending
+        search_start = 0
+        while True:
+            found = data.find(delimiter, search_start)
+            if found >= 0:
+                end = found + len(delimiter)
+                result = bytes(data[:end])
+                del data[:end]
+                return result
+            if len(data) > limit:
+                raise ValueError(f'no {delimiter!r} within {limit} bytes')
+            # Only rescan the tail that could hold a delimiter split across reads
+            search_start = max(0, len(data) - len(delimiter) + 1)
+            received = self.sock.recv_into(self.buffer)
+            if not received:
+                result = bytes(data)
+                data.clear()
+                return result
+            data += self.view[:received]
+
+    def read_exactly(self, size):
+        """Read exactly size bytes, or fewer if the peer closes first."""
+        data = self.pending
+        while len(data) < size:
+            received = self.sock.recv_into(self.buffer)
+            if not received:
+                break
+            data += self.view[:received]
+        result = bytes(data[:size])
+        del data[:size]
+        return result
+
+    def has_request(self):
+        """True if a complete request header block is already buffered (pipelining)."""
+        return b'\r\n\r\n' in self.pending
+
+def parse_headers(head):
+    """Parse a header block into a dict keyed by lower-case header name."""
+    headers = {}
+    for line in re.split(r'\r?\n', head)[1:]:
+        name, sep, value = line.partition(':')
+        if not sep:
+            continue
+        name = name.strip().lower()
+        value = value.strip()
+        if name in headers:
+            headers[name] += ', ' + value
+        else:
+            headers[name] = value
+    return headers
+
+def parse_request(message):
+    """Split a client request into (method, hostname, port, resource, version)."""
+    # Extract the method, URI and version of the HTTP client request
+    requestParts = message.split()
+    method = requestParts[0]
+    URI = requestParts[1]
+    version = requestParts[2]
+
+    print('Method:\t\t' + method)
+    print('URI:\t\t' + URI)
+    print('Version:\t' + version)
+    print('')
+
+    # Get the requested resource from URI
+    # Remove http protocol from the URI
+    URI = re.sub('^(/?)http(s?)://', '', URI, count=1)
+
+    # Remove parent directory changes - security
+    URI = URI.replace('/..', '')
+
+    # BONUS FEATURE 3: Support for Custom Ports
+    # Extract hostname, port, and resource from URI
+    port = 80  # Default HTTP port
+
+    # Check if there's a port specified in the hostname part
+    port_match = re.match(r'^([^/:]+):(\d+)(/.*)?$', URI)
+    if port_match:
+        hostname = port_match.group(1)
+        port = int(port_match.group(2))
+        resource = port_match.group(3) if port_match.group(3) else '/'
+        print(f"Found custom port: {port}")
+    else:
+        # Standard format without custom port
+        resourceParts = URI.split('/', 1)
+        hostname = resourceParts[0]
+        resource = '/'
+
+        if len(resourceParts) == 2:
+            # Resource is absolute URI with hostname and resource
+            resource = resource + resourceParts[1]
+
+    print('Requested Resource:\t' + resource)
+    print(f'Hostname: {hostname}, Port: {port}')
+
+    return method, hostname, port, resource, version
+
+class ClientRequest:
+    """A parsed client request together with its headers and body."""
+
+    def __init__(self, message):
+        self.method, self.hostname, self.port, self.resource, self.version = parse_request(message)
+        self.headers = parse_headers(message)
+        self.body = b''
+
+    def body_length(self):
+        """Number of body bytes following the request headers."""
+        if 'transfer-encoding' in self.headers:
+            raise ValueError('chunked request bodies are not supported')
+        return int(self.headers.get('content-length', 0))
+
+    def accepts_gzip(self):
+        """Check whether the client's Accept-Encoding allows a gzip-encoded response."""
+        for coding in self.headers.get('accept-encoding', '').split(','):
+            name, _, params = coding.partition(';')
+            if name.strip().lower() in ('gzip', 'x-gzip'):
+                quality = re.search(r'q\s*=\s*([0-9.]+)', params)
+                return not quality or float(quality.group(1)) > 0
+        return False
+
+    def byte_range(self):
+        """Return the ByteRange a GET asks for, or None if it wants the whole object."""
+        if self.method != 'GET' or 'range' not in self.headers:
+            return None
+        return ByteRange(self.headers['range'], self.headers.get('if-range'))
+
+    def wants_keep_alive(self):
+        """HTTP/1.1 connections persist unless closed, HTTP/1.0 ones only on request."""
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
+
+def read_request(clientReader):
+    """Read one framed request from a client connection.
+
+    Returns None when the client closed the connection between requests.
+    """
+    message_bytes = clientReader.read_until(b'\r\n\r\n')
+    if not message_bytes.strip():
+        return None
+    message = message_bytes.decode('utf-8')
+    print('Received request:')
+    print('< ' + message)
+
+    request = ClientRequest(message)
+    request.body = clientReader.read_exactly(request.body_length())
+    return request
+
+def build_origin_request(method, hostname, resource, body=b'', keep_alive=True, headers=()):
+    """Build the request sent to the origin server for a client request.
+
+    headers are extra header lines, such as the validators of a
+    conditional request.
+    """
+    connection = 'keep-alive' if keep_alive else 'close'
+    originServerRequest = method + ' ' + resource + ' HTTP/1.1'
+    originServerRequestHeader = 'Host: ' + hostname + '\r\nConnection: ' + connection
+    for header in headers:
+        originServerRequestHeader += '\r\n' + header
+    if body:
+        originServerRequestHeader += f'\r\nContent-Length: {len(body)}'
+    return originServerRequest + '\r\n' + originServerRequestHeader + '\r\n\r\n'
+
+def error_response(status, err, keep_alive=False):
+    """Build a framed HTML error page for the client."""
+    body = f"<html><body><h1>{status}</h1><p>{str(err)}</p></body></html>".encode()
+    connection = 'keep-alive' if keep_alive else 'close'
+    head = f"HTTP/1.1 {status}\r\nContent-Type: text/html\r\nContent-Length: {len(body)}\r\nConnection: {connection}\r\n\r\n"
+    return head.encode() + body
+
+def bad_gateway_response(err, keep_alive=False):
+    """Error page sent when the origin server cannot be reached."""
+    return error_response('502 Bad Gateway', err, keep_alive)
+
+def bad_request_response(err):
+    """Error page sent when the client request cannot be processed."""
+    return error_response('400 Bad Request', err)
+
+def get_status(head):
+    """Return the numeric status code from a response header block."""
+    try:
+        return int(head.split(None, 2)[1])
+    except (IndexError, ValueError):
+        return 0
+
+def prepare_client_head(head, keep_alive, body_length=None):
+    """Rewrite a response header block for the client connection.
+
+    Hop-by-hop headers from the origin are dropped and a Connection header
+    for this client connection is added. If the body length is known but the
+    response has no Content-Length or chunked encoding it gets one, otherwise
+    the connection has to close after the body. Returns (head, keep_alive).
+    """
+    text = head.decode('latin-1').rstrip('\r\n')
+    lines = re.split(r'\r?\n', text)
+    headers = parse_headers(text)
+    status = get_status(text)
+
+    framed = ('content-length' in headers or 'chunked' in headers.get('transfer-encoding', '').lower()
+              or status in NO_BODY_STATUSES or 100 <= status < 200)
+    if not framed and body_length is not None:
+        lines.append(f'Content-Length: {body_length}')
+        framed = True
+    keep_alive = keep_alive and framed
+
+    lines = [lines[0]] + [line for line in lines[1:] if line.partition(':')[0].strip().lower() not in HOP_BY_HOP_HEADERS]
+    lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'), keep_alive
+
+def prepare_cache_head(head, chunked, compressed=False):
+    """Return the header block stored in the cache for a response.
+
+    Chunked bodies are decoded before they are stored, so their
+    Transfer-Encoding header is dropped; the hit path adds a Content-Length
+    from the size of the stored body. Bodies stored compressed lose their
+    Content-Length for the same reason and are marked with
+    Content-Encoding and COMPRESSED_MARKER.
+    """
+    if not chunked and not compressed:
+        return bytes(head)
+    dropped = (b'transfer-encoding', b'content-length') if compressed else (b'transfer-encoding',)
+    lines = re.split(rb'\r?\n', bytes(head).rstrip(b'\r\n'))
+    lines = [lines[0]] + [line for line in lines[1:] if line.partition(b':')[0].strip().lower() not in dropped]
+    if compressed:
+        lines += [b'Content-Encoding: gzip', COMPRESSED_MARKER]
+    return b'\r\n'.join(lines) + b'\r\n\r\n'
+
+def get_content_length(headers):
+    """Return the Content-Length of a response header block, or None if absent."""
+    match = re.search(r'^Content-Length:\s*(\d+)\s*$', headers, re.IGNORECASE | re.MULTILINE)
+    if match:
+        return int(match.group(1))
+    return None
+
+def parse_range(spec, length):
+    """Return the byte ranges a Range header asks of a length byte body.
+
+    Ranges are (first, last) offsets, sorted, with overlapping and adjacent
+    ones merged. Returns None if the header is to be ignored and the whole
+    body sent, and [] if no range overlaps the body (416).
+    """
+    unit, _, specs = spec.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for part in specs.split(','):
+        match = re.fullmatch(r'\s*(\d*)\s*-\s*(\d*)\s*', part)
+        if not match or not (match.group(1) or match.group(2)):
+            return None
+        if not match.group(1):
+            # Suffix range: the last n bytes
+            suffix = int(match.group(2))
+            if suffix and length:
+                ranges.append((max(0, length - suffix), length - 1))
+            continue
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else length - 1
+        if match.group(2) and last < first:
+            return None
+        if first < length:
+            ranges.append((first, min(last, length - 1)))
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+def if_range_matches(if_range, headers):
+    """Check an If-Range validator against a stored response's headers.
+
+    An entity tag must match the stored ETag strongly, a date the stored
+    Last-Modified exactly; otherwise the whole, changed, object is sent.
+    """
+    if if_range.startswith('W/'):
+        return False
+    if if_range.startswith('"'):
+        return headers.get('etag') == if_range
+    return headers.get('last-modified') == if_range
+
+def prepare_range_response(byte_range, head, length):
+    """Work out how a Range request is answered from a stored 200 response.
+
+    head is the header block about to be sent for the whole body of length
+    bytes. Returns None if the whole response is sent instead, otherwise
+    (head, parts, trailer): the 206 or 416 header block, the parts of the
+    body as (prefix, first, last) - the bytes sent before each range and its
+    offsets in the stored body - and the bytes sent after the last part.
+    """
+    if byte_range is None:
+        return None
+    text = bytes(head).decode('latin-1').rstrip('\r\n')
+    headers = parse_headers(text)
+    if get_status(text) != 200 or (byte_range.if_range is not None
+                                   and not if_range_matches(byte_range.if_range, headers)):
+        return None
+    ranges = parse_range(byte_range.spec, length)
+    if ranges is None:
+        return None
+    if not ranges:
+        return f'HTTP/1.1 416 Range Not Satisfiable\r\nContent-Range: bytes */{length}\r\nContent-Length: 0\r\n\r\n'.encode(), [], b''
+
+    lines = re.split(r'\r?\n', text)
+    kept = [line for line in lines[1:]
+            if line.partition(':')[0].strip().lower() not in ('content-length', 'content-range')]
+    if len(ranges) == 1:
+        first, last = ranges[0]
+        kept.append(f'Content-Range: bytes {first}-{last}/{length}')
+        parts, trailer = [(b'', first, last)], b''
+    else:
+        kept = [line for line in kept if line.partition(':')[0].strip().lower() != 'content-type']
+        boundary = os.urandom(12).hex()
+        kept.append(f'Content-Type: multipart/byteranges; boundary={boundary}')
+        content_type = f"Content-Type: {headers['content-type']}\r\n" if 'content-type' in headers else ''
+        parts = [(f'\r\n--{boundary}\r\n{content_type}Content-Range: bytes {first}-{last}/{length}\r\n\r\n'.encode('latin-1'),
+                  first, last) for first, last in ranges]
+        trailer = f'\r\n--{boundary}--\r\n'.encode()
+    body_length = sum(len(prefix) + last - first + 1 for prefix, first, last in parts) + len(trailer)
+    kept.append(f'Content-Length: {body_length}')
+    version = lines[0].split(' ', 1)[0]
+    head = '\r\n'.join([version + ' 206 Partial Content'] + kept) + '\r\n\r\n'
+    return head.encode('latin-1'), parts, trailer
+
+def join_ranges(body, parts, trailer):
+    """Return the body of a range response cut from a whole body held in memory."""
+    return b''.join(prefix + body[first:last + 1] for prefix, first, last in parts) + trailer
+
+class ResponseFramer:
+    """Track where the headers and body of a relayed origin response end.
+
+    Raw bytes are fed in as they arrive. feed() returns (head, body_part):
+    head is the complete header block the first time it is seen (else None)
+    and body_part is the body bytes contained in the chunk, exactly as they
+    came off the wire. payload holds the same bytes with any chunked encoding
+    removed. Bytes received after the end of the response are kept in excess.
+    """
+
+    def __init__(self, method='GET'):
+        self.method = method
+        self.head = bytearray()
+        self.headers = None
+        self.status = 0
+        self.content_length = None
+        self.chunked = False
+        self.body_received = 0
+        self.done = False
+        self.payload = b''
+        self.excess = b''
+        # Chunked decoding state: the part of the message expected next, the
+        # bytes left in the current chunk and any incomplete line
+        self.chunk_state = 'size'
+        self.chunk_remaining = 0
+        self.chunk_line = bytearray()
+
+    def feed(self, chunk):
+        head = None
+        if self.headers is None:
+            # Still waiting for the end of the response headers
+            self.head += chunk
+            header_end = self.head.find(b'\r\n\r\n')
+            if header_end < 0:
+                return None, b''
+            head = self.head[:header_end+4]
+            chunk = self.head[header_end+4:]
+            self.head = bytearray()
+            self.headers = head[:-4].decode('utf-8', errors='replace')
+            self.status = get_status(self.headers)
+            self.content_length = get_content_length(self.headers)
+            self.chunked = re.search(r'^Transfer-Encoding:.*chunked', self.headers, re.IGNORECASE | re.MULTILINE) is not None
+            if self.method == 'HEAD' or self.status in NO_BODY_STATUSES or 100 <= self.status < 200:
+                # These responses end with their headers, whatever they say
+                self.content_length = 0
+                self.chunked = False
+
+        if self.done:
+            self.excess = bytes(self.excess) + bytes(chunk)
+            self.payload = b''
+            return head, b''
+        if self.chunked:
+            used, self.payload = self.feed_chunked(bytes(chunk))
+        else:
+            used = len(chunk)
+            if self.content_length is not None:
+                used = min(used, self.content_length - self.body_received)
+                if self.body_received + used >= self.content_length:
+                    self.done = True
+            self.payload = chunk[:used]
+        if used < len(chunk):
+            self.excess = bytes(chunk[used:])
+            chunk = chunk[:used]
+        self.body_received += len(chunk)
+        return head, chunk
+
+    def feed_chunked(self, data):
+        """Decode chunked body bytes; returns (bytes used, decoded payload).
+
+        Raises ValueError if a chunk size line is malformed.
+        """
+        payload = bytearray()
+        pos = 0
+        while pos < len(data) and not self.done:
+            if self.chunk_remaining:
+                take = min(self.chunk_remaining, len(data) - pos)
+                payload += data[pos:pos+take]
+                pos += take
+                self.chunk_remaining -= take
+                continue
+
+            # Everything else is line based: chunk sizes, the CRLF after each
+            # chunk's data and the trailer section
+            line_end = data.find(b'\n', pos)
+            if line_end < 0:
+                self.chunk_line += data[pos:]
+                pos = len(data)
+                break
+            line = bytes(self.chunk_line + data[pos:line_end]).rstrip(b'\r')
+            self.chunk_line = bytearray()
+            pos = line_end + 1
+
+            if self.chunk_state == 'size':
+                size = int(line.split(b';', 1)[0].strip(), 16)
+                if size:
+                    self.chunk_remaining = size
+                    self.chunk_state = 'data-end'
+                else:
+                    self.chunk_state = 'trailer'
+            elif self.chunk_state == 'data-end':
+                self.chunk_state = 'size'
+            elif not line:
+                # A blank line ends the trailer section and the response
+                self.done = True
+        return pos, bytes(payload)
+
+    def started(self):
+        """True once any part of the response has been received."""
+        return self.headers is not None or len(self.head) > 0
+
+    def complete_at_close(self):
+        """Without a Content-Length or chunked encoding the response ends when the origin closes."""
+        return self.headers is not None and self.content_length is None and not self.chunked
+
+    def origin_reusable(self):
+        """True if the origin connection can carry another request after this response."""
+        if not self.done or self.excess:
+            return False
+        connection = parse_headers(self.headers).get('connection', '').lower()
+        if self.headers.startswith('HTTP/1.0'):
+            return 'keep-alive' in connection
+        return 'close' not in connection
+
+class OriginClosedError(ConnectionError):
+    """The origin server closed its connection without sending a response."""
+
+# Outcome of relaying one origin response to a client. intercepted is the
+# header block of a response that was not relayed because its status was
+# one the caller asked to handle itself; body_length counts the body bytes
+# received from the origin, and oversized is set if the response was
+# abandoned for being larger than max_size.
+RelayResult = namedtuple('RelayResult', ['cached', 'is_redirect', 'is_html', 'keep_alive', 'origin_reusable',
+                                         'intercepted', 'body_length', 'oversized'])
+
+def relay_response(originReader, clientSocket, cacheLocation, method='GET', keep_alive=False, intercept=(),
+                   inflight=None, url=None, prefetch=None, max_size=None, compress=True):
+    """Stream an origin response to the client while teeing it into the cache.
+
+    The rewritten header block and then every body chunk are forwarded to the
+    client as soon as they arrive and, when the response is cacheable, written
+    to a temporary cache file at the same time. The file is committed only if
+    the whole response arrived; a timeout or a short body discards it.
+    Chunked bodies are stored decoded. clientSocket may be None when the
+    response is only fetched into the cache (prefetching).
+    keep_alive in the result says whether the client connection may be
+    reused afterwards and origin_reusable whether the origin connection may.
+    Responses with a status in intercept (such as the 304 Not Modified
+    answering a revalidation) are read but neither sent to the client nor
+    cached; their header block is returned in intercepted instead.
+    inflight is the InFlightFetch (see proxy_inflight.py) other requests for
+    the object follow; it is told about every part written to the cache.
+    url is recorded next to the object when it is cached.
+    prefetch, if given, is called with the Links (see proxy_links.py) found
+    in a cached HTML page or stylesheet as its chunks arrive.
+    A response whose body is longer than max_size bytes, by its
+    Content-Length or as it arrives, is abandoned and not cached.
+    With compress False text bodies are stored as they are, for callers
+    that send cache files to clients without inflating them.
+    Raises OriginClosedError if the origin closes before sending anything.
+    """
+    framer = ResponseFramer(method)
+    cacheWriter = None
+    is_redirect, is_html = False, False
+    extractor = None
+    complete = False
+    client_gone = clientSocket is None
+    intercepted = None
+    oversized = False
+
+    def send_to_client(data):
+        # If the client has gone away keep downloading, so the object still
+        # reaches the cache
+        nonlocal client_gone
+        if client_gone:
+            return
+        try:
+            clientSocket.sendall(data)
+        except OSError as e:
+            print(f"Client went away during relay: {e}")
+            client_gone = True
+
+    try:
+        while True:
+            try:
+                chunk = originReader.recv_chunk()
+            except OSError as e:
+                # Nothing has reached the client yet, so it can still get an error page
+                if not framer.started():
+                    raise
+                print(f"Origin connection failed while receiving ({e}) - response is incomplete")
+                break
+            if not chunk:
+                if not framer.started():
+                    raise OriginClosedError('origin server closed the connection without a response')
+                complete = framer.complete_at_close()
+                break
+
+            try:
+                head, body_part = framer.feed(chunk)
+            except ValueError as e:
+                print(f"Malformed response from origin ({e}) - response is incomplete")
+                break
+            if head is not None and framer.status in intercept:
+                # The caller answers the client, usually from the cached copy
+                intercepted = bytes(head)
+            elif head is not None:
+                if max_size is not None and (framer.content_length or 0) > max_size:
+                    print(f"Response of {framer.content_length} bytes is larger than {max_size} - abandoned")
+                    oversized = True
+                    break
+                should_cache, is_redirect, is_html = check_headers(framer.headers)
+                clientHead, keep_alive = prepare_client_head(head, keep_alive)
+                send_to_client(clientHead)
+                if should_cache and method == 'GET':
+                    compress = compress and cache_compression.should_compress(framer.headers)
+                    cacheWriter = CacheWriter(cacheLocation, url, compress)
+                    cacheWriter.write(prepare_cache_head(head, framer.chunked, compress))
+                    if prefetch is not None and not is_redirect:
+                        extractor = make_link_extractor(framer.headers, url)
+                if inflight is not None:
+                    inflight.publish(cacheWriter)
+
+            # Send the response to the client as it arrives; it goes to the
+            # cache first, so followers do not wait on a slow client
+            if body_part:
+                if max_size is not None and framer.body_received > max_size:
+                    print(f"Response is larger than {max_size} bytes - abandoned")
+                    oversized = True
+                    break
+                if cacheWriter:
+                    cacheWriter.write(framer.payload)
+                    if inflight is not None:
+                        inflight.progress(cacheWriter)
+                if intercepted is None:
+                    send_to_client(body_part)
+                # BONUS FEATURE 22: Streaming Link Extraction
+                if extractor is not None:
+                    links = extractor.feed(framer.payload)
+                    if links:
+                        prefetch(links)
+            if framer.done:
+                complete = True
+                break
+    finally:
+        if cacheWriter:
+            if complete:
+                # Followers have to get the end of a compressed body before
+                # the fetch finishes
+                cacheWriter.end_body()
+                if inflight is not None:
+                    inflight.progress(cacheWriter)
+                cacheWriter.commit()
+            else:
+                cacheWriter.discard()
+            if inflight is not None:
+                inflight.finish(complete)
+
+    if extractor is not None and complete:
+        links = extractor.close()
+        if links:
+            prefetch(links)
+    if not complete:
+        # The client cannot tell where a broken response ends
+        keep_alive = False
+    return RelayResult(cacheWriter is not None and complete, is_redirect, is_html,
+                       keep_alive and not client_gone, complete and framer.origin_reusable(), intercepted,
+                       framer.body_received, oversized)
@@ -0,0 +1,192 @@
+# proxy_inflight.py - Collapsed forwarding of concurrent cache misses
+#
+# When several clients miss on the same object at once, only the first one
+# (the leader) fetches it from the origin server. The others (followers)
+# attach to the leader's fetch: the leader streams the response into a
+# temporary cache file as usual, and followers send the file to their own
+# clients as it grows, so they do not wait for the download to finish.
+# Prefetches lead fetches too, so a client asking for an object that is
+# being prefetched follows the prefetch instead of fetching it again.
+#
+# Responses that are not cached (no-store, redirects) are not shared:
+# followers of such a fetch go to the origin server themselves.
+
+import asyncio
+import threading
+
+from proxy_stats import register
+
+# Seconds a follower waits for the leader to make progress before giving up
+FOLLOW_TIMEOUT = 30
+
+class InFlightFetch:
+    """One origin fetch into the cache that other requests for the object can follow.
+
+    Threads wait on a condition variable; asyncio tasks register an event
+    that is set from whichever thread makes progress.
+    """
+
+    def __init__(self, cacheLocation):
+        self.cacheLocation = cacheLocation
+        self.cond = threading.Condition()
+        # Header block stored in the cache and the temporary file it and the
+        # body are written to, once the leader has them
+        self.head = None
+        self.tempLocation = None
+        # Bytes of the temporary file followers may read
+        self.available = 0
+        self.finished = False
+        # True if the leader left a fresh copy in the cache
+        self.stored = False
+        # (event loop, asyncio.Event) of waiting asyncio followers
+        self.waiters = []
+
+    def notify(self):
+        """Wake every follower (lock held)."""
+        self.cond.notify_all()
+        for loop, event in self.waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def publish(self, cacheWriter):
+        """Leader: the response headers arrived; cacheWriter is None if it is not cached."""
+        if cacheWriter is None:
+            self.finish(False)
+            return
+        with self.cond:
+            self.head = cacheWriter.head
+            self.tempLocation = cacheWriter.tempLocation
+        self.progress(cacheWriter)
+
+    def progress(self, cacheWriter):
+        """Leader: make everything written to the cache so far readable by followers."""
+        cacheWriter.cacheFile.flush()
+        with self.cond:
+            self.available = cacheWriter.cacheFile.tell()
+            self.notify()
+
+    def finish(self, stored):
+        """Leader: the fetch is over; stored says whether the cache now holds the object."""
+        with self.cond:
+            if self.finished:
+                return
+            self.finished = True
+            self.stored = stored
+            self.notify()
+
+    def has_head(self):
+        return self.head is not None or self.finished
+
+    def open_temp(self):
+        """Open the leader's temporary cache file (lock held).
+
+        Returns (tempFile, head), or (None, None) if there is nothing to
+        follow: the response is not cached, or it already finished (and the
+        temporary file was renamed into place or removed).
+        """
+        if self.finished or self.head is None:
+            return None, None
+        try:
+            return open(self.tempLocation, 'rb'), self.head
+        except FileNotFoundError:
+            return None, None
+
+    def attach(self, timeout=FOLLOW_TIMEOUT):
+        """Follower: wait for the response headers and open the file being written."""
+        with self.cond:
+            if not self.cond.wait_for(self.has_head, timeout):
+                return None, None
+            return self.open_temp()
+
+    def wait(self, offset, timeout=FOLLOW_TIMEOUT):
+        """Follower: wait until more than offset bytes are readable or the fetch ends.
+
+        Returns (available, finished, stored); a leader that makes no
+        progress within timeout counts as failed.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.available > offset or self.finished, timeout):
+                return offset, True, False
+            return self.available, self.finished, self.stored
+
+    async def wait_async_until(self, ready, timeout):
+        """Wait on the event loop until ready() holds (checked with the lock held)."""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self.cond:
+            if ready():
+                return True
+            self.waiters.append(waiter)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    return False
+                waiter[1].clear()
+                with self.cond:
+                    if ready():
+                        return True
+        finally:
+            with self.cond:
+                self.waiters.remove(waiter)
+
+    async def attach_async(self, timeout=FOLLOW_TIMEOUT):
+        """Follower on the event loop: like attach."""
+        if not await self.wait_async_until(self.has_head, timeout):
+            return None, None
+        with self.cond:
+            return self.open_temp()
+
+    async def wait_async(self, offset, timeout=FOLLOW_TIMEOUT):
+        """Follower on the event loop: like wait."""
+        if not await self.wait_async_until(lambda: self.available > offset or self.finished, timeout):
+            return offset, True, False
+        with self.cond:
+            return self.available, self.finished, self.stored
+
+class InFlightTable:
+    """Origin fetches in progress, keyed by cache location."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fetches = {}
+        self.led = 0
+        self.followed = 0
+
+    def join(self, cacheLocation, lead=True):
+        """Find the fetch of cacheLocation in progress, or start one.
+
+        Returns (fetch, leading). If nothing is in flight and lead is True a
+        new fetch is registered and the caller leads it (and must end() it);
+        with lead False (None, False) is returned instead.
+        """
+        with self.lock:
+            fetch = self.fetches.get(cacheLocation)
+            if fetch is not None:
+                self.followed += 1
+                return fetch, False
+            if not lead:
+                return None, False
+            fetch = self.fetches[cacheLocation] = InFlightFetch(cacheLocation)
+            self.led += 1
+            return fetch, True
+
+    def end(self, fetch):
+        """Leader: remove a fetch from the table, failing it if it never finished."""
+        with self.lock:
+            if self.fetches.get(fetch.cacheLocation) is fetch:
+                del self.fetches[fetch.cacheLocation]
+        fetch.finish(False)
+
+    def __contains__(self, cacheLocation):
+        with self.lock:
+            return cacheLocation in self.fetches
+
+    def counters(self):
+        """Return the collapsed forwarding counters for the stats report."""
+        with self.lock:
+            return {'leaders': self.led, 'followers': self.followed, 'in_flight': len(self.fetches)}
+
+# Shared by client misses and prefetches of this process
+inflight_fetches = InFlightTable()
+register('inflight', inflight_fetches.counters)
@@ -0,0 +1,285 @@
+# proxy_learning.py - Learning which linked resources clients go on to fetch
+#
+# Prefetching every resource a page links wastes origin fetches on the ones
+# clients never ask for. For every page whose links were extracted, the
+# learner counts how often the page is requested and how often each of its
+# linked resources is requested soon after it, as a follow-up. A request is
+# a follow-up of the page its Referer header names, if that page was
+# requested within FOLLOW_UP_WINDOW seconds. Once a page has been requested
+# LEARN_MIN_VIEWS times, only the links followed up at least a threshold
+# fraction of the time are prefetched.
+#
+# Counts decay with a half-life of LEARN_HALF_LIFE seconds, so what clients
+# did recently weighs most. At most LEARN_PAGES pages, least recently
+# requested first out, and LEARN_LINKS links per page, least followed first
+# out, are kept. The counts are saved to an SQLite file in the cache
+# directory every LEARN_SAVE_INTERVAL seconds and on exit, and loaded back
+# at startup.
+#
+# Prefetched objects are remembered until a client asks for them, which
+# gives the precision (prefetches a client used) and recall (follow-ups
+# answered from a prefetched copy) reported at http://proxy.stats/. Only a
+# prefetch that stored its object counts as used; a client asking while it
+# is still running, or after it failed, does not.
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from urllib.parse import urlsplit
+
+from proxy_cache import get_cache_url
+from proxy_stats import register
+
+# File the counts are saved to, and seconds between saves
+LEARN_LOCATION = './cache/prefetch.sqlite'
+LEARN_SAVE_INTERVAL = 30
+
+# Seconds after a page is requested that requests naming it as Referer
+# count as its follow-ups
+FOLLOW_UP_WINDOW = 30
+
+# Seconds for the counts to halve
+LEARN_HALF_LIFE = 24 * 3600
+
+# Pages and links per page counted, and prefetched objects remembered
+LEARN_PAGES = 4096
+LEARN_LINKS = 64
+LEARN_PREFETCHED = 4096
+
+# Requests of a page before its links are judged, and the fraction of them
+# a link must be followed up in to be prefetched (0 prefetches every link)
+LEARN_MIN_VIEWS = 2
+PREFETCH_THRESHOLD = 0.25
+
+LEARN_SCHEMA = 'CREATE TABLE IF NOT EXISTS pages (url PRIMARY KEY, views, stamp, links) WITHOUT ROWID'
+
+class PageCounts:
+    """Decaying request counts of a page and its linked resources."""
+
+    def __init__(self, views=0.0, stamp=0.0, links=None):
+        self.views = views
+        # Time the counts were last decayed to
+        self.stamp = stamp
+        # link URL -> follow-ups
+        self.links = links if links is not None else {}
+        # Time a client last requested the page; not saved
+        self.last_view = 0.0
+
+    def decay(self, now, half_life):
+        if self.stamp and now > self.stamp:
+            factor = 0.5 ** ((now - self.stamp) / half_life)
+            self.views *= factor
+            for url in self.links:
+                self.links[url] *= factor
+        self.stamp = now
+
+    def add_link(self, url, max_links):
+        """Start counting a link, making room by dropping the least followed one."""
+        if url in self.links:
+            return
+        if len(self.links) >= max_links:
+            del self.links[min(self.links, key=self.links.get)]
+        self.links[url] = 0.0
+
+def referer_url(referer):
+    """Return the cache URL of a Referer header, or None if it is not a plain HTTP URL."""
+    parsed = urlsplit(referer.strip())
+    if parsed.scheme != 'http' or not parsed.hostname:
+        return None
+    try:
+        port = parsed.port or 80
+    except ValueError:
+        return None
+    resource = parsed.path or '/'
+    if parsed.query:
+        resource += '?' + parsed.query
+    return get_cache_url(parsed.hostname, port, resource)
+
+class PrefetchLearner:
+    """Follow-up counts of every page whose links were extracted, keyed by page URL.
+
+    observe is called for every client GET, page_links when the links of a
+    page or prefetched stylesheet are found, and likely decides whether one
+    of them is worth prefetching.
+    """
+
+    def __init__(self, location=LEARN_LOCATION, threshold=PREFETCH_THRESHOLD, half_life=LEARN_HALF_LIFE,
+                 max_pages=LEARN_PAGES, max_links=LEARN_LINKS):
+        self.location = location
+        self.threshold = threshold
+        self.half_life = half_life
+        self.max_pages = max_pages
+        self.max_links = max_links
+        self.lock = threading.Lock()
+        # page URL -> PageCounts, least recently requested first
+        self.pages = OrderedDict()
+        # Pages changed, and dropped, since the last save
+        self.changed = set()
+        self.removed = set()
+        # cacheLocations of prefetched objects no client has asked for yet,
+        # oldest first, each True once its prefetch stored it
+        self.prefetched = OrderedDict()
+        self.views = 0
+        self.follow_ups = 0
+        self.follow_ups_prefetched = 0
+        self.prefetches = 0
+        self.used = 0
+        self.unlikely = 0
+
+    def page(self, url, now):
+        """Return the counts of a known page, decayed to now, or None."""
+        counts = self.pages.get(url)
+        if counts is not None:
+            counts.decay(now, self.half_life)
+            self.changed.add(url)
+        return counts
+
+    def observe(self, url, cacheLocation, referer=None):
+        """Record a client request for url, which may be a page view or a follow-up."""
+        now = time.time()
+        page_url = referer_url(referer) if referer else None
+        with self.lock:
+            used = self.prefetched.pop(cacheLocation, False)
+            if used:
+                self.used += 1
+            counts = self.page(url, now)
+            if counts is not None:
+                counts.views += 1
+                counts.last_view = now
+                self.pages.move_to_end(url)
+                self.views += 1
+            counts = self.page(page_url, now) if page_url is not None else None
+            if counts is not None and url in counts.links and now - counts.last_view <= FOLLOW_UP_WINDOW:
+                counts.links[url] += 1
+                self.follow_ups += 1
+                if used:
+                    self.follow_ups_prefetched += 1
+
+    def page_links(self, url, links, viewed):
+        """Start counting the links found in a page; viewed if a client requested it just now."""
+        now = time.time()
+        with self.lock:
+            counts = self.page(url, now)
+            if counts is None:
+                counts = self.pages[url] = PageCounts(stamp=now)
+                self.changed.add(url)
+                self.removed.discard(url)
+                if viewed:
+                    # The request went by before the page was known
+                    counts.views += 1
+                    counts.last_view = now
+                    self.views += 1
+                while len(self.pages) > self.max_pages:
+                    dropped, _ = self.pages.popitem(last=False)
+                    self.changed.discard(dropped)
+                    self.removed.add(dropped)
+            for link in links:
+                counts.add_link(link, self.max_links)
+
+    def likely(self, url, link):
+        """Return True if link, found in page url, is followed up often enough to prefetch."""
+        with self.lock:
+            counts = self.pages.get(url)
+            if self.threshold <= 0 or counts is None or counts.views < LEARN_MIN_VIEWS:
+                return True
+            if counts.links.get(link, 0.0) >= self.threshold * counts.views:
+                return True
+            self.unlikely += 1
+            return False
+
+    def prefetching(self, cacheLocation):
+        """Remember an object being prefetched, until a client asks for it."""
+        with self.lock:
+            self.prefetched[cacheLocation] = False
+            self.prefetched.move_to_end(cacheLocation)
+            while len(self.prefetched) > LEARN_PREFETCHED:
+                self.prefetched.popitem(last=False)
+
+    def prefetched_done(self, cacheLocation, cached):
+        """Note that a prefetch ended, and whether it stored its object."""
+        with self.lock:
+            if cached:
+                self.prefetches += 1
+                # Unless a client already asked for it while it ran
+                if cacheLocation in self.prefetched:
+                    self.prefetched[cacheLocation] = True
+            else:
+                self.prefetched.pop(cacheLocation, None)
+
+    def connect(self):
+        """Open the counts file, creating it if needed."""
+        os.makedirs(os.path.dirname(self.location), exist_ok=True)
+        db = sqlite3.connect(self.location, timeout=10)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute(LEARN_SCHEMA)
+        return db
+
+    def load(self):
+        """Add the saved counts of pages not counted since startup."""
+        if not os.path.exists(self.location):
+            return
+        with closing(self.connect()) as db:
+            rows = db.execute('SELECT url, views, stamp, links FROM pages ORDER BY stamp DESC').fetchall()
+        with self.lock:
+            for url, views, stamp, links in rows:
+                # Older than every page counted since startup, newest first
+                if url not in self.pages and url not in self.removed:
+                    self.pages[url] = PageCounts(views, stamp, json.loads(links))
+                    self.pages.move_to_end(url, last=False)
+            while len(self.pages) > self.max_pages:
+                self.removed.add(self.pages.popitem(last=False)[0])
+        print(f'Loaded prefetch counts of {len(rows)} pages from {self.location}')
+
+    def save(self):
+        """Write the pages changed since the last save in one transaction."""
+        with self.lock:
+            if not self.changed and not self.removed:
+                return
+            changed, self.changed = self.changed, set()
+            removed, self.removed = self.removed, set()
+            rows = [(url, self.pages[url].views, self.pages[url].stamp, json.dumps(self.pages[url].links))
+                    for url in changed if url in self.pages]
+        try:
+            with closing(self.connect()) as db, db:
+                db.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)', rows)
+                db.executemany('DELETE FROM pages WHERE url = ?', [(url,) for url in removed])
+        except BaseException:
+            with self.lock:
+                self.changed |= changed
+                self.removed |= removed
+            raise
+
+    def start(self, interval=LEARN_SAVE_INTERVAL):
+        """Load the saved counts, then save them every interval seconds, from a daemon thread."""
+        def saver():
+            try:
+                self.load()
+            except (OSError, sqlite3.Error, ValueError) as e:
+                print(f'Failed to load prefetch counts: {e}')
+            while True:
+                time.sleep(interval)
+                try:
+                    self.save()
+                except (OSError, sqlite3.Error) as e:
+                    print(f'Failed to save prefetch counts: {e}')
+        saverThread = threading.Thread(target=saver)
+        saverThread.daemon = True
+        saverThread.start()
+
+    def counters(self):
+        """Return the learning counters, with precision and recall, for the stats report."""
+        with self.lock:
+            precision = self.used / self.prefetches if self.prefetches else 0.0
+            recall = self.follow_ups_prefetched / self.follow_ups if self.follow_ups else 0.0
+            return {'pages': len(self.pages), 'threshold': self.threshold, 'views': self.views,
+                    'follow_ups': self.follow_ups, 'follow_ups_prefetched': self.follow_ups_prefetched,
+                    'prefetched': self.prefetches, 'used': self.used, 'unlikely': self.unlikely,
+                    'precision': round(precision, 3), 'recall': round(recall, 3)}
+
+# Shared by every thread of this process
+prefetch_learner = PrefetchLearner()
+register('prefetch_learning', prefetch_learner.counters)
@@ -0,0 +1,220 @@
+# proxy_links.py - Incremental link extraction from HTML pages and stylesheets
+#
+# Pages are scanned for the resources they link to while they are relayed,
+# one chunk at a time, so prefetching starts before the download finishes.
+# HTML goes through html.parser, which keeps an unfinished tag from one
+# chunk until the next; stylesheets, <style> elements and style attributes
+# go through a small CSS scanner that does the same with an unfinished
+# declaration.
+#
+# Every link is resolved against the page URL, or the page's <base href>,
+# and classified by what it points to: a stylesheet, script, image, font,
+# media file, or a navigation link (<a href>, frames, <link rel=next>),
+# which the prefetcher normally leaves alone.
+
+import re
+import codecs
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urldefrag
+
+# Kinds of link
+STYLESHEET = 'stylesheet'
+SCRIPT = 'script'
+IMAGE = 'image'
+FONT = 'font'
+MEDIA = 'media'
+NAVIGATION = 'navigation'
+
+# A resolved link found in a page
+Link = namedtuple('Link', ['url', 'kind'])
+
+# Kind of the resource a <link rel=preload> fetches, by its "as" attribute
+PRELOAD_KINDS = {'style': STYLESHEET, 'script': SCRIPT, 'image': IMAGE, 'font': FONT,
+                 'audio': MEDIA, 'video': MEDIA, 'track': MEDIA}
+
+# File extensions of fonts referenced from CSS with url()
+FONT_EXTENSIONS = ('.woff', '.woff2', '.ttf', '.otf', '.eot')
+
+# Unfinished CSS kept between chunks before it is scanned anyway
+CSS_CARRY_LIMIT = 16384
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_IMPORT = re.compile(r'@import\s+(?:url\(\s*)?([\'"]?)([^\'"()\s;]+)\1', re.IGNORECASE)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'"()]+?)\1\s*\)', re.IGNORECASE)
+
+def css_links(text):
+    """Return (url, kind) for every @import and url() in a piece of CSS."""
+    text = CSS_COMMENT.sub('', text)
+    links = [(match.group(2), STYLESHEET) for match in CSS_IMPORT.finditer(text)]
+    imported = {url for url, kind in links}
+    for match in CSS_URL.finditer(text):
+        url = match.group(2).strip()
+        if url in imported:
+            continue
+        path = urldefrag(url)[0].split('?', 1)[0].lower()
+        links.append((url, FONT if path.endswith(FONT_EXTENSIONS) else IMAGE))
+    return links
+
+class CssScanner:
+    """Finds the links in CSS fed to it in pieces."""
+
+    def __init__(self):
+        self.carry = ''
+
+    def feed(self, text):
+        """Scan text; returns the (url, kind) pairs found in what is complete so far."""
+        text = self.carry + text
+        # Declarations and rules end at ';' or '}'; keep what follows the
+        # last one for the next piece
+        end = max(text.rfind(';'), text.rfind('}')) + 1
+        if not end and len(text) > CSS_CARRY_LIMIT:
+            end = len(text)
+        self.carry = text[end:]
+        return css_links(text[:end])
+
+    def close(self):
+        text, self.carry = self.carry, ''
+        return css_links(text)
+
+def srcset_urls(value):
+    """Return the URLs of a srcset attribute ("url 2x, url 640w")."""
+    return [candidate.split()[0] for candidate in value.split(',') if candidate.strip()]
+
+class HtmlLinkParser(HTMLParser):
+    """html.parser handler that collects the links of the tags it sees."""
+
+    def __init__(self, url):
+        super().__init__(convert_charrefs=True)
+        self.base = url
+        self.base_set = False
+        self.found = []
+        self.style = None
+
+    def add(self, url, kind):
+        self.found.append((urljoin(self.base, url.strip()), kind))
+
+    def add_css(self, links):
+        for url, kind in links:
+            self.add(url, kind)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value for name, value in attrs if value}
+        if tag == 'base' and 'href' in attrs and not self.base_set:
+            # Only the first <base href> counts
+            self.base = urljoin(self.base, attrs['href'].strip())
+            self.base_set = True
+        elif tag == 'link' and 'href' in attrs:
+            rel = attrs.get('rel', '').lower().split()
+            if 'stylesheet' in rel:
+                self.add(attrs['href'], STYLESHEET)
+            elif 'modulepreload' in rel:
+                self.add(attrs['href'], SCRIPT)
+            elif 'preload' in rel or 'prefetch' in rel:
+                kind = PRELOAD_KINDS.get(attrs.get('as', '').lower())
+                if kind is not None:
+                    self.add(attrs['href'], kind)
+                if kind == IMAGE and 'imagesrcset' in attrs:
+                    for url in srcset_urls(attrs['imagesrcset']):
+                        self.add(url, IMAGE)
+            elif 'icon' in rel or 'apple-touch-icon' in rel:
+                self.add(attrs['href'], IMAGE)
+            elif rel:
+                self.add(attrs['href'], NAVIGATION)
+        elif tag == 'script' and 'src' in attrs:
+            self.add(attrs['src'], SCRIPT)
+        elif tag in ('img', 'source') or (tag == 'input' and attrs.get('type', '').lower() == 'image'):
+            kind = MEDIA if tag == 'source' and 'srcset' not in attrs else IMAGE
+            if 'src' in attrs:
+                self.add(attrs['src'], kind)
+            for url in srcset_urls(attrs.get('srcset', '')):
+                self.add(url, IMAGE)
+        elif tag in ('video', 'audio'):
+            if 'src' in attrs:
+                self.add(attrs['src'], MEDIA)
+            if 'poster' in attrs:
+                self.add(attrs['poster'], IMAGE)
+        elif tag == 'track' and 'src' in attrs:
+            self.add(attrs['src'], MEDIA)
+        elif tag in ('a', 'area') and 'href' in attrs:
+            self.add(attrs['href'], NAVIGATION)
+        elif tag in ('iframe', 'frame') and 'src' in attrs:
+            self.add(attrs['src'], NAVIGATION)
+        elif tag == 'style':
+            self.style = CssScanner()
+        if 'style' in attrs:
+            self.add_css(css_links(attrs['style']))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag == 'style':
+            self.style = None
+
+    def handle_endtag(self, tag):
+        if tag == 'style' and self.style is not None:
+            self.add_css(self.style.close())
+            self.style = None
+
+    def handle_data(self, data):
+        if self.style is not None:
+            self.add_css(self.style.feed(data))
+
+class LinkExtractor:
+    """Finds the links in an HTML page or a stylesheet fed to it chunk by chunk.
+
+    feed and close return the Links found since the last call, each URL
+    once per page; data:, javascript: and other non-HTTP links are left out.
+    """
+
+    def __init__(self, url, is_css=False, charset='utf-8'):
+        try:
+            self.decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.url = url
+        self.css = CssScanner() if is_css else None
+        self.html = None if is_css else HtmlLinkParser(url)
+        self.seen = set()
+
+    def links(self, found):
+        links = []
+        for url, kind in found:
+            url = urldefrag(url)[0]
+            if url.startswith(('http://', 'https://')) and url not in self.seen:
+                self.seen.add(url)
+                links.append(Link(url, kind))
+        return links
+
+    def scan(self, text, final=False):
+        if self.css is not None:
+            found = self.css.feed(text) + (self.css.close() if final else [])
+            # URLs in a stylesheet are relative to the stylesheet
+            return [(urljoin(self.url, url), kind) for url, kind in found]
+        self.html.feed(text)
+        if final:
+            self.html.close()
+        found, self.html.found = self.html.found, []
+        return found
+
+    def feed(self, data):
+        """Scan the next chunk of the body."""
+        return self.links(self.scan(self.decoder.decode(bytes(data))))
+
+    def close(self):
+        """Scan whatever is left at the end of the body."""
+        return self.links(self.scan(self.decoder.decode(b'', final=True), final=True))
+
+def make_link_extractor(headers, url):
+    """Return a LinkExtractor for a response if it is an HTML page or a stylesheet, else None.
+
+    headers is the response header block as text; bodies with a
+    Content-Encoding cannot be scanned.
+    """
+    content_type = re.search(r'^Content-Type:\s*([^;\r\n]*)(.*)$', headers, re.IGNORECASE | re.MULTILINE)
+    if not content_type or re.search(r'^Content-Encoding:', headers, re.IGNORECASE | re.MULTILINE):
+        return None
+    media_type = content_type.group(1).strip().lower()
+    if media_type not in ('text/html', 'application/xhtml+xml', 'text/css'):
+        return None
+    charset = re.search(r'charset\s*=\s*["\']?([\w.:-]+)', content_type.group(2), re.IGNORECASE)
+    return LinkExtractor(url, media_type == 'text/css', charset.group(1) if charset else 'utf-8')
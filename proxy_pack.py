@@ -0,0 +1,292 @@
+# proxy_pack.py - Append-only packfile store for small cached objects
+#
+# Every loose cache file costs an inode, and a hit that misses the memory
+# cache costs an open, a read and a close. With "--pack-object-size N" cached
+# objects of at most N bytes are appended to large segment files instead,
+# indexed in memory by cache location -> (segment, offset, length), and read
+# through a read-only mmap of their segment, so reading one needs no system
+# calls at all.
+#
+# Segments are created SEGMENT_SIZE bytes long (sparse, so unwritten space
+# takes no disk) and mapped once; records are written after the last one with
+# pwrite. A record holds the cache location, the URL and the stored response
+# exactly as a loose cache file would, plus the time it was stored, which
+# stands in for the file's modification time. Overwriting or removing an
+# object leaves its old record dead, and a removal appends a tombstone so it
+# survives a restart. Segments that are mostly dead are compacted in the
+# background: their live records are copied to the active segment and the
+# segment file is deleted.
+#
+# The in-memory index is rebuilt by scanning the segments at startup. Each
+# record carries a CRC-32, so a record cut short by a crash ends the scan and
+# is written over by the next one. Only one process may write the segments,
+# so the store is not used together with worker processes (--processes).
+
+import os
+import mmap
+import time
+import zlib
+import struct
+import threading
+from collections import namedtuple
+
+from proxy_stats import register
+
+# Largest object in bytes (header block and body) stored in the packfiles;
+# 0 keeps every object in its own cache file
+PACK_OBJECT_SIZE = 0
+
+# Directory the segment files are kept in, and the size of each segment
+PACK_DIRECTORY = './cache/packs'
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+# A full segment is compacted once this fraction of it is dead, checked
+# every COMPACT_INTERVAL seconds
+COMPACT_RATIO = 0.5
+COMPACT_INTERVAL = 60
+
+# Record header: magic, kind, key length, URL length, data length, CRC-32
+# of key, URL and data, time stored (ns) and serial number
+RECORD_HEADER = struct.Struct('<4sBxHHIIQQ')
+RECORD_MAGIC = b'PKR1'
+RECORD_OBJECT = 0
+RECORD_TOMBSTONE = 1
+
+# Where an object's record is: segment id, record offset and length, and
+# the offset and length of the stored response within the segment
+PackEntry = namedtuple('PackEntry', ['segment', 'offset', 'size', 'data_offset', 'length', 'mtime_ns', 'serial', 'url'])
+
+# Stands in for os.stat_result of a packed object. The serial number is
+# unique per stored copy and survives compaction, so (st_ino, st_mtime_ns)
+# identifies the copy the way it does for a loose file
+PackStat = namedtuple('PackStat', ['st_ino', 'st_mtime_ns', 'st_mtime', 'st_size'])
+
+# A packed object read from its segment
+PackedObject = namedtuple('PackedObject', ['data', 'stat', 'url'])
+
+class Segment:
+    """One segment file, mapped read-only for its whole length."""
+
+    def __init__(self, segment_id, path, minimum_size):
+        self.id = segment_id
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < minimum_size:
+            os.ftruncate(self.fd, minimum_size)
+        self.capacity = os.fstat(self.fd).st_size
+        self.map = mmap.mmap(self.fd, self.capacity, access=mmap.ACCESS_READ)
+        # Offset the next record is written at, and bytes of live records
+        self.end = 0
+        self.live = 0
+
+    def records(self):
+        """Yield (offset, kind, key, url, data_offset, length, mtime_ns, serial) for each record."""
+        offset = 0
+        while offset + RECORD_HEADER.size <= self.capacity:
+            magic, kind, key_length, url_length, length, crc, mtime_ns, serial = RECORD_HEADER.unpack_from(self.map, offset)
+            key_offset = offset + RECORD_HEADER.size
+            data_offset = key_offset + key_length + url_length
+            if (magic != RECORD_MAGIC or data_offset + length > self.capacity
+                    or zlib.crc32(self.map[key_offset:data_offset + length]) != crc):
+                # Unwritten space, or a record cut short by a crash
+                return
+            key = self.map[key_offset:key_offset + key_length].decode()
+            url = self.map[key_offset + key_length:data_offset].decode() or None
+            yield offset, kind, key, url, data_offset, length, mtime_ns, serial
+            offset = data_offset + length
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+class PackStore:
+    """Small cached objects kept in append-only segment files."""
+
+    def __init__(self, directory=PACK_DIRECTORY, max_object_size=PACK_OBJECT_SIZE, segment_size=SEGMENT_SIZE):
+        self.directory = directory
+        self.max_object_size = max_object_size
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        # cacheLocation -> PackEntry of its live record
+        self.entries = {}
+        self.segments = {}
+        self.active = None
+        self.serial = 0
+        self.puts = 0
+        self.deletes = 0
+        self.compactions = 0
+        self.reclaimed_bytes = 0
+
+    def accepts(self, size):
+        """True if an object of size bytes is stored in the packfiles."""
+        return self.active is not None and 0 < size <= self.max_object_size
+
+    def open(self):
+        """Open the segments and rebuild the index from their records."""
+        if not self.max_object_size:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        segment_ids = sorted(int(name[:-5]) for name in os.listdir(self.directory)
+                             if name.endswith('.pack') and name[:-5].isdigit())
+        with self.lock:
+            for segment_id in segment_ids:
+                segment = Segment(segment_id, self.segment_path(segment_id), 0)
+                self.segments[segment_id] = segment
+                for offset, kind, key, url, data_offset, length, mtime_ns, serial in segment.records():
+                    self.serial = max(self.serial, serial)
+                    self.kill(self.entries.pop(key, None))
+                    if kind == RECORD_OBJECT:
+                        entry = PackEntry(segment_id, offset, data_offset + length - offset, data_offset, length,
+                                          mtime_ns, serial, url)
+                        self.entries[key] = entry
+                        segment.live += entry.size
+                    segment.end = data_offset + length
+            if segment_ids:
+                self.active = self.segments[segment_ids[-1]]
+            else:
+                self.start_segment()
+        print(f'Opened {len(self.segments)} pack segments holding {len(self.entries)} objects')
+
+    def segment_path(self, segment_id):
+        return os.path.join(self.directory, f'{segment_id:08d}.pack')
+
+    def start_segment(self):
+        """Make a new, empty segment the active one (lock held)."""
+        segment_id = max(self.segments, default=0) + 1
+        self.active = Segment(segment_id, self.segment_path(segment_id), self.segment_size)
+        self.segments[segment_id] = self.active
+
+    def kill(self, entry):
+        """Count an entry's record as dead (lock held); tombstones never count as live."""
+        if entry is not None:
+            self.segments[entry.segment].live -= entry.size
+
+    def append(self, kind, key, url, data, mtime_ns, serial):
+        """Write a record to the active segment (lock held); returns its PackEntry."""
+        key_bytes = key.encode()
+        url_bytes = (url or '').encode()
+        if len(url_bytes) > 0xffff:
+            url_bytes = b''
+        body = key_bytes + url_bytes + data
+        record = RECORD_HEADER.pack(RECORD_MAGIC, kind, len(key_bytes), len(url_bytes), len(data), zlib.crc32(body),
+                                    mtime_ns, serial) + body
+        if self.active.end + len(record) > self.active.capacity:
+            self.start_segment()
+        segment = self.active
+        os.pwrite(segment.fd, record, segment.end)
+        entry = PackEntry(segment.id, segment.end, len(record), segment.end + len(record) - len(data), len(data),
+                          mtime_ns, serial, url)
+        segment.end += len(record)
+        return entry
+
+    def put(self, key, data, url=None, mtime_ns=None, serial=None):
+        """Store an object's response, replacing any earlier copy; returns its PackStat."""
+        with self.lock:
+            if serial is None:
+                self.serial += 1
+                serial = self.serial
+            entry = self.append(RECORD_OBJECT, key, url, data, mtime_ns or time.time_ns(), serial)
+            self.kill(self.entries.get(key))
+            self.entries[key] = entry
+            self.segments[entry.segment].live += entry.size
+            self.puts += 1
+        return self.stat_of(entry)
+
+    def stat_of(self, entry):
+        return PackStat(-entry.serial, entry.mtime_ns, entry.mtime_ns / 1e9, entry.length)
+
+    def get(self, key):
+        """Return the PackedObject stored for key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            data = self.segments[entry.segment].map[entry.data_offset:entry.data_offset + entry.length]
+        return PackedObject(data, self.stat_of(entry), entry.url)
+
+    def stat(self, key):
+        """Return the PackStat of key's stored copy, or None."""
+        entry = self.entries.get(key)
+        return self.stat_of(entry) if entry is not None else None
+
+    def url(self, key):
+        entry = self.entries.get(key)
+        return entry.url if entry is not None else None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def delete(self, key):
+        """Remove key's stored copy; returns False if there was none."""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return False
+            self.kill(entry)
+            self.append(RECORD_TOMBSTONE, key, None, b'', time.time_ns(), 0)
+            self.deletes += 1
+        return True
+
+    def compact(self):
+        """Compact every full segment that is at least COMPACT_RATIO dead, oldest first."""
+        with self.lock:
+            candidates = [segment for segment_id, segment in sorted(self.segments.items())
+                          if segment is not self.active and segment.live <= segment.end * (1 - COMPACT_RATIO)]
+        for segment in candidates:
+            self.compact_segment(segment)
+
+    def compact_segment(self, segment):
+        """Copy a segment's live records to the active segment and delete it.
+
+        The segment is no longer written to, so it is read without the lock;
+        each record is checked and copied under the lock, so objects stored
+        or removed meanwhile are not brought back. A tombstone is kept only
+        while an older segment may still hold the record it removes.
+        """
+        copied = 0
+        for offset, kind, key, url, data_offset, length, mtime_ns, serial in segment.records():
+            with self.lock:
+                entry = self.entries.get(key)
+                if kind == RECORD_OBJECT and entry is not None and (entry.segment, entry.offset) == (segment.id, offset):
+                    data = segment.map[data_offset:data_offset + length]
+                    moved = self.append(RECORD_OBJECT, key, url, data, mtime_ns, serial)
+                    self.entries[key] = moved
+                    self.active.live += moved.size
+                    copied += moved.size
+                elif kind == RECORD_TOMBSTONE and entry is None and segment.id != min(self.segments):
+                    self.append(RECORD_TOMBSTONE, key, None, b'', mtime_ns, 0)
+        with self.lock:
+            del self.segments[segment.id]
+            self.compactions += 1
+            self.reclaimed_bytes += segment.end - copied
+        segment.close()
+        os.unlink(segment.path)
+        print(f'Compacted pack segment {segment.path}, reclaimed {segment.end - copied} bytes')
+
+    def start_compactor(self, interval=COMPACT_INTERVAL):
+        """Compact segments every interval seconds from a daemon thread."""
+        if self.active is None:
+            return
+        def compactor():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.compact()
+                except OSError as e:
+                    print(f'Failed to compact pack segments: {e}')
+        compactorThread = threading.Thread(target=compactor)
+        compactorThread.daemon = True
+        compactorThread.start()
+
+    def counters(self):
+        """Return the packfile counters for the stats report."""
+        with self.lock:
+            return {'object_size': self.max_object_size, 'objects': len(self.entries), 'segments': len(self.segments),
+                    'bytes': sum(segment.end for segment in self.segments.values()),
+                    'live_bytes': sum(segment.live for segment in self.segments.values()),
+                    'puts': self.puts, 'deletes': self.deletes, 'compactions': self.compactions,
+                    'reclaimed_bytes': self.reclaimed_bytes}
+
+# Shared by every thread of this process
+pack_store = PackStore()
+register('pack', pack_store.counters)
@@ -0,0 +1,246 @@
+# proxy_pool.py - Persistent origin server connections
+#
+# Opening a new TCP connection for every object costs a handshake round trip
+# each time. Once a response has been read to its framed end (Content-Length
+# or the last chunk), its origin connection goes back into the pool and the
+# next request to the same (hostname, port) reuses it. Cache misses and
+# prefetches share one pool per process; in the asyncio mode cache misses
+# use a pool of the event loop's own with the same limits (see
+# proxy_async.py).
+#
+# Connections that sit idle for too long are closed, and an idle connection
+# is checked before it is handed out again, since the origin may have closed
+# it in the meantime.
+#
+# The time origin servers take to start answering is averaged, so
+# prefetching can back off when they slow down (see proxy_prefetch.py). It
+# is measured when the response's first bytes are read; a request that
+# times out before any arrive counts as the whole timeout.
+
+import socket
+import threading
+import time
+
+from proxy_http import SocketReader
+from proxy_dns import dns_cache, connect_to
+
+# Most connections open to one origin server, and to all of them together
+MAX_CONNECTIONS_PER_HOST = 6
+MAX_CONNECTIONS_TOTAL = 64
+
+# Seconds an unused origin connection is kept open
+IDLE_TIMEOUT = 30
+
+# Seconds to wait for connecting and for each origin read
+ORIGIN_TIMEOUT = 10
+
+# Weight of a new sample in the average origin latency, and seconds after
+# which the average no longer counts without new samples
+LATENCY_WEIGHT = 0.3
+LATENCY_MAX_AGE = 10
+
+class OriginConnection:
+    """A connection to an origin server together with its buffered reader."""
+
+    def __init__(self, key, sock):
+        self.key = key
+        self.sock = sock
+        self.reader = SocketReader(sock)
+        self.requests = 0
+        self.idle_since = time.monotonic()
+
+    def is_healthy(self):
+        """Check that an idle connection is still open and has nothing unread.
+
+        A closed connection reads as EOF; bytes the origin sent without being
+        asked would be mistaken for the next response.
+        """
+        if self.reader.pending:
+            return False
+        try:
+            self.sock.setblocking(False)
+            try:
+                self.sock.recv(1, socket.MSG_PEEK)
+            finally:
+                self.sock.settimeout(ORIGIN_TIMEOUT)
+        except BlockingIOError:
+            # Nothing to read: the connection is open and quiet
+            return True
+        except OSError:
+            return False
+        return False
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class ConnectionPool:
+    """Keep-alive connections to origin servers, keyed by (hostname, port)."""
+
+    def __init__(self, max_per_host=MAX_CONNECTIONS_PER_HOST, max_total=MAX_CONNECTIONS_TOTAL,
+                 idle_timeout=IDLE_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Condition()
+        # Idle connections per key, most recently used last
+        self.idle = {}
+        # Open connections (idle or in use) per key and in total
+        self.open_per_host = {}
+        self.open_total = 0
+        # Moving average of the seconds from sending a request to the first
+        # byte of the response, and when it was last updated
+        self.latency = 0.0
+        self.latency_at = 0.0
+
+    def acquire(self, hostname, port, timeout=ORIGIN_TIMEOUT):
+        """Return an idle connection to hostname:port, or open a new one.
+
+        Waits up to timeout seconds for a free slot when the per-host or total
+        limit is reached, then raises socket.timeout.
+        """
+        key = (hostname, port)
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                self.expire_idle()
+                idle = self.idle.get(key, [])
+                while idle:
+                    connection = idle.pop()
+                    if connection.is_healthy():
+                        print(f'Reusing connection to {hostname}:{port}')
+                        return connection
+                    print(f'Pooled connection to {hostname}:{port} was closed by the origin')
+                    self.forget(connection)
+
+                if self.open_per_host.get(key, 0) < self.max_per_host:
+                    if self.open_total >= self.max_total:
+                        self.close_oldest_idle()
+                    if self.open_total < self.max_total:
+                        # Reserve the slot before connecting outside the lock
+                        self.open_per_host[key] = self.open_per_host.get(key, 0) + 1
+                        self.open_total += 1
+                        break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout(f'no free origin connection to {hostname}:{port}')
+                self.lock.wait(remaining)
+
+        try:
+            return OriginConnection(key, self.connect(hostname, port, timeout))
+        except BaseException:
+            with self.lock:
+                self.unreserve(key)
+            raise
+
+    def connect(self, hostname, port, timeout):
+        """Open a new connection to an origin server."""
+        # Get the IP addresses for a hostname
+        addresses = dns_cache.resolve(hostname)
+        # BONUS FEATURE 3: Connect using the custom port
+        originServerSocket = connect_to(addresses, port, timeout)
+        print(f'Connected to origin server {hostname}:{port}')
+        return originServerSocket
+
+    def release(self, connection, reusable):
+        """Return a connection after use; it is kept only if reusable."""
+        with self.lock:
+            if reusable:
+                connection.requests += 1
+                connection.idle_since = time.monotonic()
+                self.idle.setdefault(connection.key, []).append(connection)
+            else:
+                self.forget(connection)
+            self.lock.notify_all()
+
+    def send_request(self, hostname, port, request_bytes, read_response, idempotent=True, timeout=ORIGIN_TIMEOUT):
+        """Send a request on a pooled connection and read its response.
+
+        read_response(originReader) reads the response and returns a result
+        with an origin_reusable field, which decides whether the connection
+        goes back into the pool. An origin may close an idle connection just
+        as it is reused, so if a reused connection fails before any response
+        arrives an idempotent request is retried on another connection.
+        """
+        while True:
+            connection = self.acquire(hostname, port, timeout)
+            reused = connection.requests > 0
+            try:
+                connection.sock.settimeout(timeout)
+                sent_at = time.monotonic()
+                connection.sock.sendall(request_bytes)
+                connection.reader.on_first_chunk = lambda: self.record_latency(time.monotonic() - sent_at)
+                result = read_response(connection.reader)
+            except ConnectionError as e:
+                self.release(connection, False)
+                if reused and idempotent:
+                    print(f'Stale connection to {hostname}:{port} ({e}) - retrying on a new one')
+                    continue
+                raise
+            except socket.timeout:
+                if connection.reader.on_first_chunk is not None:
+                    # The origin never started answering
+                    self.record_latency(timeout)
+                self.release(connection, False)
+                raise
+            except BaseException:
+                self.release(connection, False)
+                raise
+            finally:
+                connection.reader.on_first_chunk = None
+            self.release(connection, result.origin_reusable)
+            return result
+
+    def record_latency(self, seconds):
+        """Add the time an origin server took to start answering to the average."""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.latency_at > LATENCY_MAX_AGE:
+                self.latency = seconds
+            else:
+                self.latency += LATENCY_WEIGHT * (seconds - self.latency)
+            self.latency_at = now
+
+    def current_latency(self):
+        """Return the average origin latency, or 0 if there have been no recent responses."""
+        with self.lock:
+            if time.monotonic() - self.latency_at > LATENCY_MAX_AGE:
+                return 0.0
+            return self.latency
+
+    def expire_idle(self):
+        """Close connections that have been idle longer than idle_timeout (lock held)."""
+        cutoff = time.monotonic() - self.idle_timeout
+        for key, idle in list(self.idle.items()):
+            while idle and idle[0].idle_since < cutoff:
+                self.forget(idle.pop(0))
+            if not idle:
+                del self.idle[key]
+
+    def close_oldest_idle(self):
+        """Close the longest-idle connection to make room under the total limit (lock held)."""
+        oldest = None
+        for idle in self.idle.values():
+            if idle and (oldest is None or idle[0].idle_since < oldest.idle_since):
+                oldest = idle[0]
+        if oldest:
+            self.idle[oldest.key].remove(oldest)
+            self.forget(oldest)
+
+    def forget(self, connection):
+        """Close a connection and give up its slot (lock held)."""
+        connection.close()
+        self.unreserve(connection.key)
+
+    def unreserve(self, key):
+        self.open_per_host[key] -= 1
+        if not self.open_per_host[key]:
+            del self.open_per_host[key]
+        self.open_total -= 1
+        self.lock.notify_all()
+
+# Shared by the miss path and the prefetch threads
+origin_pool = ConnectionPool()
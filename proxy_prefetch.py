@@ -0,0 +1,514 @@
+# proxy_prefetch.py - BONUS FEATURE 2: Pre-fetching Associated Files
+#
+# While an HTML page or stylesheet is relayed into the cache, the links found
+# in it so far (see proxy_links.py) are queued on a shared prefetch queue, so
+# prefetching starts before the page has finished downloading. A fixed pool of
+# worker threads fetches them into the cache, drawing on the same origin
+# connection pool as client cache misses. The queue is keyed by cache
+# location, so a resource linked from many pages is queued once, and one
+# already queued, being fetched or cached is skipped. At most
+# PREFETCH_PER_HOST resources of one origin are fetched at a time, so a page
+# full of links to one host cannot flood it or take every worker. A prefetch
+# leads an in-flight fetch (see proxy_inflight.py), so clients that ask for
+# the resource while it downloads follow the prefetch.
+#
+# What is prefetched is limited by a policy. Render-blocking stylesheets and
+# scripts are taken from the queue before fonts and images. Each page may
+# queue at most PREFETCH_PAGE_COUNT resources and fetch PREFETCH_PAGE_BYTES
+# bytes of them; a resource larger than PREFETCH_MAX_SIZE, by its
+# Content-Length or as it arrives, is abandoned. Only resources on the
+# page's own origin are prefetched, or on the hosts of an allow list. The
+# links of a prefetched stylesheet are prefetched too, up to
+# PREFETCH_CSS_DEPTH stylesheets deep, within the budget of the page.
+# Links clients seldom go on to request are left out once the learner (see
+# proxy_learning.py) has seen enough requests of the page.
+#
+# Prefetching gives way to clients. While the connections waiting for a
+# worker thread, the client requests being served or the average origin
+# latency are at their PrefetchThrottle limit, one prefetch runs at a time;
+# at twice the limit none do. A queued prefetch is cancelled when it is
+# taken if a client has cached or is fetching the object meanwhile, if the
+# page that linked it is no longer cached, or if it has waited longer than
+# PREFETCH_MAX_WAIT seconds.
+#
+# Stale copies served under stale-while-revalidate are refreshed the same
+# way: revalidated, or fetched again, in a background thread. A Range request
+# that misses starts the full fetch in the background too, and is answered
+# from the leader's file as the bytes it asks for arrive.
+
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from urllib.parse import urlsplit
+
+from proxy_cache import (get_cache_location, get_cache_url, cache_index, conditional_headers, refresh_cached_response,
+                         is_stored)
+from proxy_http import build_origin_request, relay_response, get_status, ORIGIN_ERROR_STATUSES
+from proxy_links import STYLESHEET, SCRIPT, IMAGE, FONT, MEDIA, NAVIGATION
+from proxy_inflight import inflight_fetches
+from proxy_learning import prefetch_learner
+from proxy_pool import origin_pool, ORIGIN_TIMEOUT
+from proxy_stats import register
+
+# Seconds to wait for a prefetched resource (shorter than for client requests)
+PREFETCH_TIMEOUT = 5
+
+# Worker threads fetching queued resources, resources of one origin fetched
+# at a time, and resources waiting in the queue before new ones are dropped
+PREFETCH_WORKERS = 4
+PREFETCH_PER_HOST = 2
+PREFETCH_QUEUE_SIZE = 1024
+
+# Kinds of link (see proxy_links.py) whose resources are prefetched;
+# navigation links and media files are left for the client to ask for
+PREFETCH_KINDS = (STYLESHEET, SCRIPT, IMAGE, FONT)
+
+# Order in which queued resources are fetched, lowest first: render-blocking
+# stylesheets and scripts before fonts and images
+KIND_PRIORITIES = {STYLESHEET: 0, SCRIPT: 1, FONT: 2, IMAGE: 3, MEDIA: 4, NAVIGATION: 5}
+
+# Resources one page may queue, bytes of them it may fetch, and the largest
+# resource prefetched
+PREFETCH_PAGE_COUNT = 32
+PREFETCH_PAGE_BYTES = 4 * 1024 * 1024
+PREFETCH_MAX_SIZE = 1024 * 1024
+
+# Hosts resources are prefetched from: the page's own origin only, that and
+# the hosts allowed with --prefetch-allow, or any host
+PREFETCH_SCOPES = ('same-origin', 'allow-list', 'any')
+PREFETCH_SCOPE = 'same-origin'
+
+# Stylesheets deep the links of prefetched stylesheets are followed (0 for not at all)
+PREFETCH_CSS_DEPTH = 1
+
+# Client load at which prefetching slows down to one fetch at a time (and
+# stops at twice as much): connections waiting for a worker thread, client
+# requests being served, and seconds origin servers take to start answering
+PREFETCH_MAX_QUEUE_DEPTH = 1
+PREFETCH_MAX_ACTIVE = 12
+PREFETCH_MAX_LATENCY = 1.0
+
+# Seconds a throttled worker waits before checking the load again, and
+# seconds a resource may wait in the queue before it is no longer wanted
+THROTTLE_INTERVAL = 0.2
+PREFETCH_MAX_WAIT = 10
+
+# A resource to prefetch. page is the PrefetchPage it was found on, depth the
+# number of stylesheets between that page and the resource, queued_at the
+# time.monotonic() it was queued.
+PrefetchJob = namedtuple('PrefetchJob', ['hostname', 'port', 'resource', 'cacheLocation', 'kind', 'page', 'depth',
+                                         'queued_at'])
+
+def make_prefetch_job(link, page=None, depth=0):
+    """Return the PrefetchJob for a Link found in a page, or None if it is not prefetched."""
+    if link.kind not in PREFETCH_KINDS:
+        return None
+    parsed = urlsplit(link.url)
+    # Only plain HTTP resources can be fetched into the cache
+    if parsed.scheme != 'http' or not parsed.hostname:
+        return None
+    try:
+        port = parsed.port or 80
+    except ValueError:
+        return None
+    resource = parsed.path or '/'
+    if parsed.query:
+        resource += '?' + parsed.query
+    return PrefetchJob(parsed.hostname, port, resource, get_cache_location(parsed.hostname, port, resource),
+                       link.kind, page, depth, time.monotonic())
+
+class PrefetchPolicy:
+    """Limits on what is prefetched for a page, and counts of what they turned away."""
+
+    def __init__(self):
+        self.scope = PREFETCH_SCOPE
+        self.allowed_hosts = set()
+        self.page_count = PREFETCH_PAGE_COUNT
+        self.page_bytes = PREFETCH_PAGE_BYTES
+        self.max_size = PREFETCH_MAX_SIZE
+        self.css_depth = PREFETCH_CSS_DEPTH
+        self.lock = threading.Lock()
+        self.off_site = 0
+        self.over_count = 0
+        self.over_bytes = 0
+        self.too_large = 0
+
+    def allows_host(self, page, job):
+        """Return True if job's host is in scope for a page on page's origin."""
+        if self.scope == 'any' or (job.hostname.lower(), job.port) == (page.hostname.lower(), page.port):
+            return True
+        return self.scope == 'allow-list' and job.hostname.lower() in self.allowed_hosts
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def counters(self):
+        """Return the policy settings and counters for the stats report."""
+        with self.lock:
+            return {'scope': self.scope, 'page_count': self.page_count, 'page_bytes': self.page_bytes,
+                    'max_size': self.max_size, 'css_depth': self.css_depth, 'off_site': self.off_site,
+                    'over_count': self.over_count, 'over_bytes': self.over_bytes, 'too_large': self.too_large}
+
+# Shared by every thread of this process
+prefetch_policy = PrefetchPolicy()
+register('prefetch_policy', prefetch_policy.counters)
+
+class PrefetchPage:
+    """The prefetch budget of one relayed page, shared by the stylesheets it links.
+
+    queue is given to relay_response as its prefetch callback. Bytes are
+    reserved from the budget when a fetch starts, up to the size limit,
+    and what the fetch did not use is given back when it ends.
+    """
+
+    def __init__(self, hostname, port, url, cacheLocation):
+        self.hostname = hostname
+        self.port = port
+        self.url = url
+        self.cacheLocation = cacheLocation
+        # Set once the page is seen in the cache; until then it may still
+        # be downloading
+        self.seen_stored = False
+        self.lock = threading.Lock()
+        self.count = 0
+        self.bytes_left = prefetch_policy.page_bytes
+
+    def queue(self, links, depth=0, source=None):
+        """Queue the resources of Links found in the page, or in a stylesheet depth deep.
+
+        source is the URL of that stylesheet.
+        """
+        try:
+            jobs = []
+            for job in (make_prefetch_job(link, self, depth) for link in links):
+                if job is None:
+                    continue
+                if not prefetch_policy.allows_host(self, job):
+                    prefetch_policy.count('off_site')
+                    continue
+                jobs.append(job)
+            if not jobs:
+                return
+            # BONUS FEATURE 24: only links clients tend to follow up
+            source = source or self.url
+            urls = [get_cache_url(job.hostname, job.port, job.resource) for job in jobs]
+            prefetch_learner.page_links(source, urls, viewed=depth == 0)
+            jobs = [job for job, url in zip(jobs, urls) if prefetch_learner.likely(source, url)]
+            if not jobs:
+                return
+            prefetch_queue.start()
+            queued = 0
+            for job in jobs:
+                with self.lock:
+                    if self.count >= prefetch_policy.page_count:
+                        prefetch_policy.count('over_count')
+                        continue
+                if prefetch_queue.put(job):
+                    with self.lock:
+                        self.count += 1
+                    queued += 1
+            print(f"Found {len(jobs)} resources to prefetch, queued {queued}")
+        except Exception as e:
+            print(f"Error queueing resources to prefetch: {e}")
+
+    def reserve(self):
+        """Take bytes for one fetch from the budget; returns how many, 0 if it is spent."""
+        with self.lock:
+            size = min(prefetch_policy.max_size, self.bytes_left)
+            self.bytes_left -= size
+            return size
+
+    def release(self, reserved, used):
+        with self.lock:
+            self.bytes_left += reserved - min(used, reserved)
+
+    def evicted(self):
+        """Return True if the page has been cached and has since gone from the cache."""
+        if is_stored(self.cacheLocation):
+            self.seen_stored = True
+            return False
+        return self.seen_stored
+
+def prefetch_resource(job):
+    """Fetch one resource into the cache; returns False if it was not cached."""
+    # Skip if a client or another prefetch is fetching it right now;
+    # otherwise lead the fetch, so clients asking for it meanwhile
+    # follow this one
+    fetch, leading = inflight_fetches.join(job.cacheLocation)
+    if not leading:
+        return False
+
+    url = get_cache_url(job.hostname, job.port, job.resource)
+    reserved = job.page.reserve()
+    if not reserved:
+        inflight_fetches.end(fetch)
+        prefetch_policy.count('over_bytes')
+        print(f"Prefetch budget of the page spent - skipping {url}")
+        return False
+    print(f"Prefetching: {url}")
+
+    # The links of a stylesheet are prefetched for the page that linked it
+    prefetch = None
+    if job.kind == STYLESHEET and job.depth < prefetch_policy.css_depth:
+        prefetch = lambda links: job.page.queue(links, job.depth + 1, url)
+
+    # Fetch it over the same pooled origin connections as cache
+    # misses; relay_response caches it unless the origin forbids it,
+    # and abandons it once it is larger than the bytes reserved for it
+    body_length = 0
+    cached = False
+    prefetch_learner.prefetching(job.cacheLocation)
+    try:
+        prefetch_request = build_origin_request('GET', job.hostname, job.resource)
+        relay = origin_pool.send_request(
+            job.hostname, job.port, prefetch_request.encode(),
+            lambda originReader: relay_response(originReader, None, job.cacheLocation, inflight=fetch, url=url,
+                                                prefetch=prefetch, max_size=reserved),
+            timeout=PREFETCH_TIMEOUT)
+        body_length, cached = relay.body_length, relay.cached
+        if relay.cached:
+            print(f"Successfully cached prefetched resource: {url}")
+        elif relay.oversized:
+            prefetch_policy.count('too_large')
+        return relay.cached
+    finally:
+        prefetch_learner.prefetched_done(job.cacheLocation, cached)
+        job.page.release(reserved, body_length)
+        inflight_fetches.end(fetch)
+
+def stale_reason(job):
+    """Return why a queued resource is no longer worth prefetching, or None if it still is."""
+    if time.monotonic() - job.queued_at > PREFETCH_MAX_WAIT:
+        return 'waited too long'
+    if job.cacheLocation in inflight_fetches or is_stored(job.cacheLocation):
+        return 'cached by a client meanwhile'
+    if job.page.evicted():
+        return 'page evicted'
+    return None
+
+class PrefetchThrottle:
+    """Decides how many prefetches may run, from the load clients put on the proxy.
+
+    The serving modes report the client requests they are serving with
+    begin and end, and the threaded mode sets queue_depth to a function
+    returning the connections waiting for a worker thread. Origin latency
+    is the origin pool's average time to the first byte of a response.
+    """
+
+    def __init__(self):
+        self.max_queue_depth = PREFETCH_MAX_QUEUE_DEPTH
+        self.max_active = PREFETCH_MAX_ACTIVE
+        self.max_latency = PREFETCH_MAX_LATENCY
+        self.queue_depth = lambda: 0
+        self.lock = threading.Lock()
+        self.active = 0
+        self.state = 'full'
+        self.shrunk = 0
+        self.paused = 0
+
+    def begin(self, requests=1):
+        with self.lock:
+            self.active += requests
+
+    def end(self, requests=1):
+        with self.lock:
+            self.active -= requests
+
+    def load(self):
+        """Return the highest of the load figures, each as a fraction of its limit."""
+        with self.lock:
+            active = self.active
+        fractions = [active / self.max_active if self.max_active > 0 else 0,
+                     self.queue_depth() / self.max_queue_depth if self.max_queue_depth > 0 else 0,
+                     origin_pool.current_latency() / self.max_latency if self.max_latency > 0 else 0]
+        return max(fractions)
+
+    def limit(self, workers):
+        """Return how many of workers prefetch workers may fetch at the moment."""
+        load = self.load()
+        state = 'paused' if load >= 2 else 'shrunk' if load >= 1 else 'full'
+        with self.lock:
+            if state != self.state:
+                print(f'Client load at {load:.0%} of the limit - prefetching {state}')
+                if state == 'shrunk':
+                    self.shrunk += 1
+                elif state == 'paused':
+                    self.paused += 1
+                self.state = state
+        return {'paused': 0, 'shrunk': 1}.get(state, workers)
+
+    def counters(self):
+        """Return the load, limits and state changes for the stats report."""
+        with self.lock:
+            active, state = self.active, self.state
+        return {'state': state, 'active': active, 'queue_depth': self.queue_depth(),
+                'latency_ms': round(origin_pool.current_latency() * 1000), 'max_active': self.max_active,
+                'max_queue_depth': self.max_queue_depth, 'max_latency_ms': round(self.max_latency * 1000),
+                'shrunk': self.shrunk, 'paused': self.paused}
+
+# Shared by every thread of this process
+prefetch_throttle = PrefetchThrottle()
+register('prefetch_throttle', prefetch_throttle.counters)
+
+class PrefetchQueue:
+    """Resources waiting to be prefetched, and the worker threads fetching them.
+
+    Jobs are kept in arrival order, keyed by cache location. A worker takes
+    the job with the highest priority, by kind and then stylesheet depth,
+    whose origin has fewer than per_host fetches running; the oldest of
+    those first. Fewer fetches, or none, run while prefetch_throttle says
+    clients need the capacity.
+    """
+
+    def __init__(self, workers=PREFETCH_WORKERS, per_host=PREFETCH_PER_HOST, max_queued=PREFETCH_QUEUE_SIZE):
+        self.workers = workers
+        self.per_host = per_host
+        self.max_queued = max_queued
+        self.cond = threading.Condition()
+        # cacheLocation -> PrefetchJob, oldest first
+        self.jobs = OrderedDict()
+        # Cache locations being fetched, and fetches running per (hostname, port)
+        self.running = set()
+        self.active = {}
+        self.started = False
+        self.queued = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.fetched = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def put(self, job):
+        """Queue a resource; returns False if it is skipped or the queue is full."""
+        if job.cacheLocation in inflight_fetches or is_stored(job.cacheLocation):
+            with self.cond:
+                self.skipped += 1
+            return False
+        with self.cond:
+            if job.cacheLocation in self.jobs or job.cacheLocation in self.running:
+                self.skipped += 1
+                return False
+            if len(self.jobs) >= self.max_queued:
+                self.dropped += 1
+                return False
+            self.jobs[job.cacheLocation] = job
+            self.queued += 1
+            self.cond.notify()
+        return True
+
+    def take(self):
+        """Worker: wait for a job whose origin is below its limit and claim it."""
+        with self.cond:
+            while True:
+                if self.jobs and len(self.running) >= prefetch_throttle.limit(self.workers):
+                    # The load is not announced; look again in a moment
+                    self.cond.wait(THROTTLE_INTERVAL)
+                    continue
+                ready = [job for job in self.jobs.values()
+                         if self.active.get((job.hostname, job.port), 0) < self.per_host]
+                if ready:
+                    # min keeps the first, so the oldest, of equal priority
+                    job = min(ready, key=lambda job: (KIND_PRIORITIES[job.kind], job.depth))
+                    del self.jobs[job.cacheLocation]
+                    self.running.add(job.cacheLocation)
+                    self.active[job.hostname, job.port] = self.active.get((job.hostname, job.port), 0) + 1
+                    return job
+                self.cond.wait()
+
+    def done(self, job, cached, cancelled=False):
+        """Worker: release a job's origin slot and count the outcome."""
+        with self.cond:
+            self.running.discard(job.cacheLocation)
+            host = (job.hostname, job.port)
+            self.active[host] -= 1
+            if not self.active[host]:
+                del self.active[host]
+            if cancelled:
+                self.cancelled += 1
+            elif cached:
+                self.fetched += 1
+            else:
+                self.failed += 1
+            # A job held back by the per-host limit may be taken now
+            self.cond.notify_all()
+
+    def work(self):
+        while True:
+            job = self.take()
+            cached, reason = False, None
+            try:
+                # BONUS FEATURE 25: drop prefetches that are no longer wanted
+                reason = stale_reason(job)
+                if reason is not None:
+                    print(f"Prefetch of {get_cache_url(job.hostname, job.port, job.resource)} cancelled: {reason}")
+                else:
+                    cached = prefetch_resource(job)
+            except Exception as e:
+                print(f"Error prefetching {get_cache_url(job.hostname, job.port, job.resource)}: {e}")
+            finally:
+                self.done(job, cached, reason is not None)
+
+    def start(self):
+        """Start the worker threads, once per process."""
+        with self.cond:
+            if self.started:
+                return
+            self.started = True
+        for i in range(self.workers):
+            workerThread = threading.Thread(target=self.work, name=f'prefetch-{i}')
+            workerThread.daemon = True
+            workerThread.start()
+
+    def counters(self):
+        """Return the prefetch counters for the stats report."""
+        with self.cond:
+            return {'workers': self.workers, 'per_host': self.per_host, 'waiting': len(self.jobs),
+                    'running': len(self.running), 'queued': self.queued, 'skipped': self.skipped,
+                    'dropped': self.dropped, 'fetched': self.fetched, 'failed': self.failed,
+                    'cancelled': self.cancelled}
+
+# Shared by every thread of this process
+prefetch_queue = PrefetchQueue()
+register('prefetch', prefetch_queue.counters)
+
+def refresh_resource(hostname, port, resource, cacheLocation, fetch, timeout=PREFETCH_TIMEOUT):
+    """Revalidate or fetch an object into the cache, leading the in-flight fetch.
+
+    A stale copy with validators is revalidated; a server error leaves it
+    in place.
+    """
+    try:
+        validators = conditional_headers(cache_index.lookup(cacheLocation))
+        refresh_request = build_origin_request('GET', hostname, resource, headers=validators)
+        relay = origin_pool.send_request(
+            hostname, port, refresh_request.encode(),
+            lambda originReader: relay_response(originReader, None, cacheLocation,
+                                                intercept=(304,) + ORIGIN_ERROR_STATUSES, inflight=fetch,
+                                                url=get_cache_url(hostname, port, resource)),
+            timeout=timeout)
+        if relay.intercepted is not None and get_status(relay.intercepted) == 304:
+            fetch.finish(refresh_cached_response(cacheLocation, relay.intercepted))
+        elif relay.intercepted is not None:
+            print(f"Refreshing {cacheLocation} failed with status {get_status(relay.intercepted)}")
+        elif relay.cached:
+            print(f"Refreshed stale copy: {cacheLocation}")
+    except Exception as e:
+        print(f"Error refreshing {cacheLocation}: {e}")
+    finally:
+        inflight_fetches.end(fetch)
+
+def start_refresh(hostname, port, resource, cacheLocation):
+    """Refresh a stale cached copy in a daemon thread (stale-while-revalidate)."""
+    fetch, leading = inflight_fetches.join(cacheLocation)
+    if not leading:
+        # Already being fetched; that fetch refreshes the copy
+        return
+    start_background_fetch(hostname, port, resource, cacheLocation, fetch, PREFETCH_TIMEOUT)
+
+def start_background_fetch(hostname, port, resource, cacheLocation, fetch, timeout=ORIGIN_TIMEOUT):
+    """Fetch an object into the cache in a daemon thread that leads fetch."""
+    refresh_thread = threading.Thread(target=refresh_resource,
+                                      args=(hostname, port, resource, cacheLocation, fetch, timeout))
+    refresh_thread.daemon = True
+    refresh_thread.start()
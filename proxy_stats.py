@@ -0,0 +1,40 @@
+# proxy_stats.py - Counters reported by the proxy
+#
+# Components register a function returning a dict of their counters.
+# Requesting http://proxy.stats/ through the proxy returns all of them as
+# plain text, one "section.counter: value" line each. With several worker
+# processes every process keeps its own counters, so the report covers the
+# worker that answered it (its pid is included).
+
+import os
+import threading
+
+# Requests for this hostname are answered by the proxy itself
+STATS_HOSTNAME = 'proxy.stats'
+
+# section name -> function returning that section's counters
+stats_sources = {}
+stats_lock = threading.Lock()
+
+def register(name, counters_function):
+    """Add a section of counters to the stats report."""
+    with stats_lock:
+        stats_sources[name] = counters_function
+
+def collect():
+    """Return every registered section's counters as {section: {counter: value}}."""
+    with stats_lock:
+        sources = list(stats_sources.items())
+    return {name: counters_function() for name, counters_function in sources}
+
+def stats_response(keep_alive=False):
+    """Build the framed plain-text stats report sent to the client."""
+    lines = [f'pid: {os.getpid()}']
+    for name, counters in collect().items():
+        for counter, value in counters.items():
+            lines.append(f'{name}.{counter}: {value}')
+    body = ('\n'.join(lines) + '\n').encode()
+    connection = 'keep-alive' if keep_alive else 'close'
+    head = (f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nCache-Control: no-store\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {connection}\r\n\r\n")
+    return head.encode() + body
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Master test script for Proxy-bonus.py
-This script runs all three bonus feature tests sequentially
+This script runs all bonus feature tests sequentially
 """
 
 import os
@@ -13,7 +13,30 @@ import time
 TEST_SCRIPTS = [
     "test_expires_header.py",
     "test_prefetching.py",
-    "test_custom_ports.py"
+    "test_custom_ports.py",
+    "test_concurrency.py",
+    "test_async_mode.py",
+    "test_worker_processes.py",
+    "test_keepalive.py",
+    "test_connection_pool.py",
+    "test_dns_cache.py",
+    "test_memory_cache.py",
+    "test_cache_index.py",
+    "test_revalidation.py",
+    "test_collapsed_forwarding.py",
+    "test_stale_serving.py",
+    "test_disk_quota.py",
+    "test_cache_layout.py",
+    "test_compression.py",
+    "test_basic_proxy.py",
+    "test_packfile.py",
+    "test_fast_startup.py",
+    "test_range_requests.py",
+    "test_prefetch_pool.py",
+    "test_link_extraction.py",
+    "test_prefetch_policy.py",
+    "test_prefetch_learning.py",
+    "test_prefetch_throttle.py"
 ]
 
 def check_proxy_running(host='localhost', port=8081):
@@ -29,7 +52,7 @@ def check_proxy_running(host='localhost', port=8081):
         return False
 
 def run_tests():
-    """Run all three bonus feature tests."""
+    """Run all bonus feature tests."""
     print("\n" + "=" * 80)
     print(" PROXY BONUS FEATURE TESTING SCRIPT ".center(80, "="))
     print("=" * 80 + "\n")
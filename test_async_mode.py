@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 5: asyncio Serving Mode
+This script tests if your proxy serves clients correctly from its event loop:
+1. Starts Proxy-bonus.py with --mode async in a scratch directory
+2. Requests a cacheable page twice and checks that the second response came
+   from the cache, with the same body, and the test server was asked once
+3. Requests a page whose origin connection is reset partway through the body
+   and checks that the client got the start of the body, no 502 appended to
+   it, and a closed connection
+
+Unlike most other tests this one needs no running proxy; it starts its own
+on PROXY_PORT.
+"""
+
+import os
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8068  # Port the test's own proxy listens on
+PROXY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Proxy-bonus.py')
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8067  # Port for our test server
+START_TIMEOUT = 10
+RESET_LENGTH = 100000  # Content-Length the reset response announces
+RESET_SENT = 1000  # Bytes of it sent before the reset
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+PAGE_PATH = f"/async-{run_id}/page.html"
+RESET_PATH = f"/async-{run_id}/reset.bin"
+PAGE = b"<html><body>" + b"<p>Served from the event loop.</p>\n" * 20 + b"</body></html>"
+
+# Requests the test server received
+requested = []
+
+class OriginHandler(socketserver.BaseRequestHandler):
+    """Raw handler that serves one cacheable page or resets partway through a body."""
+
+    def handle(self):
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            data += chunk
+        path = data.split(b" ", 2)[1].decode()
+        requested.append(path)
+
+        if path == RESET_PATH:
+            self.request.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                                 b"Cache-Control: max-age=3600\r\n"
+                                 b"Content-Length: " + str(RESET_LENGTH).encode() + b"\r\n\r\n" + b"x" * RESET_SENT)
+            time.sleep(0.2)
+            # Close with a RST instead of a FIN, before the server shuts the
+            # socket down for writing
+            self.request.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.request.close()
+            return
+        self.request.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nCache-Control: max-age=3600\r\n"
+                             b"Content-Length: " + str(len(PAGE)).encode() + b"\r\nConnection: close\r\n\r\n" + PAGE)
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), OriginHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy, keeping the connection alive; returns (header block, body, closed)."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}:{TEST_PORT}\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        closed = False
+        while True:
+            try:
+                data = client_socket.recv(65536)
+            except socket.timeout:
+                break
+            except ConnectionResetError:
+                closed = True
+                break
+            if not data:
+                closed = True
+                break
+            response += data
+            head, _, body = response.partition(b'\r\n\r\n')
+            if _ and f'content-length: {len(body)}\r\n'.encode() in head.lower() + b'\r\n':
+                break
+        head, _, body = response.partition(b'\r\n\r\n')
+        return head.decode('utf-8', errors='replace'), body, closed
+    finally:
+        client_socket.close()
+
+def start_proxy(workDir):
+    """Start Proxy-bonus.py in async mode in workDir and wait until it accepts connections; None if it does not."""
+    proxy = subprocess.Popen([sys.executable, PROXY_SCRIPT, PROXY_HOST, str(PROXY_PORT), '--mode', 'async'],
+                             cwd=workDir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((PROXY_HOST, PROXY_PORT), timeout=1).close()
+            return proxy
+        except OSError:
+            time.sleep(0.05)
+    proxy.kill()
+    proxy.wait()
+    return None
+
+def stop_proxy(proxy):
+    proxy.send_signal(signal.SIGTERM)
+    try:
+        proxy.wait(10)
+    except subprocess.TimeoutExpired:
+        proxy.kill()
+        proxy.wait()
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_hit_and_miss():
+    """A cacheable page is fetched once and then served from the cache."""
+    url = f"http://{TEST_HOST}:{TEST_PORT}{PAGE_PATH}"
+    head1, body1, _ = fetch(url)
+    head2, body2, _ = fetch(url)
+    passed = check("first response 200", head1.split()[1:2] == ['200'])
+    passed = check("second response 200", head2.split()[1:2] == ['200']) and passed
+    passed = check("both bodies as sent by the test server", body1 == PAGE and body2 == PAGE) and passed
+    return check(f"test server asked once ({requested.count(PAGE_PATH)})", requested.count(PAGE_PATH) == 1) and passed
+
+def check_reset_mid_body():
+    """An origin reset partway through the body closes the client connection, without a 502."""
+    head, body, closed = fetch(f"http://{TEST_HOST}:{TEST_PORT}{RESET_PATH}")
+    passed = check("response 200", head.split()[1:2] == ['200'])
+    passed = check(f"start of the body relayed ({len(body)} bytes)", body[:RESET_SENT] == b"x" * RESET_SENT) and passed
+    passed = check("no 502 after the partial body", b"502" not in body) and passed
+    return check("client connection closed", closed) and passed
+
+def test_async_mode():
+    """Test if the asyncio serving mode caches responses and handles broken origin connections."""
+    print("\nTesting BONUS FEATURE 5: asyncio Serving Mode")
+    print("=" * 70)
+
+    workDir = tempfile.mkdtemp(prefix='async-mode-')
+    proxy = start_proxy(workDir)
+    try:
+        if proxy is None:
+            print("TEST FAILED: The proxy did not start in async mode.")
+            return False
+
+        print("\nCacheable page requested twice:")
+        passed = check_hit_and_miss()
+        print("\nOrigin connection reset partway through the body:")
+        passed = check_reset_mid_body() and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+    finally:
+        if proxy is not None:
+            stop_proxy(proxy)
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    if passed:
+        print("\nTEST PASSED: The async mode served the cache and broken responses correctly!")
+    else:
+        print("\nTEST FAILED: The async mode did not serve correctly.")
+    return passed
+
+if __name__ == "__main__":
+    httpd = start_test_server()
+    try:
+        success = test_async_mode()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Test script for Proxy.py, the basic single-file proxy
+This script tests if the basic proxy serves cached text as it was received:
+1. Starts a test server on port 80 (Proxy.py only connects to origin
+   servers there) with a cacheable text page large enough to be stored
+   compressed by Proxy-bonus.py
+2. Starts Proxy.py in a scratch directory and requests the page twice,
+   without Accept-Encoding
+3. Checks that both responses carry the page as sent by the test server,
+   the second from the cache, and no Content-Encoding or X-Cache-Encoding
+
+Unlike most other tests this one needs no running proxy; it starts its own
+on PROXY_PORT. It is skipped if port 80 cannot be listened on.
+"""
+
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8075  # Port the test's own proxy listens on
+PROXY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Proxy.py')
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 80  # Proxy.py always connects to port 80
+START_TIMEOUT = 10
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+PAGE_PATH = f"/basic-{run_id}/page.html"
+PAGE = ("<html><body>" + "<p>The basic proxy stores this page as it is.</p>\n" * 40 + "</body></html>").encode()
+
+# Requests the test server received
+requested = []
+
+class PageHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves one cacheable text page."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        requested.append(self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread; None if port 80 is not available."""
+    try:
+        httpd = ThreadingServer((TEST_HOST, TEST_PORT), PageHandler)
+    except OSError as e:
+        print(f"Cannot listen on port {TEST_PORT} ({e}); skipping.")
+        return None
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy without Accept-Encoding; returns (header block, body)."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        head, _, body = response.partition(b'\r\n\r\n')
+        return head.decode('utf-8', errors='replace'), body
+    finally:
+        client_socket.close()
+
+def start_proxy(workDir):
+    """Start Proxy.py in workDir and wait until it accepts connections; None if it does not."""
+    proxy = subprocess.Popen([sys.executable, PROXY_SCRIPT, PROXY_HOST, str(PROXY_PORT)], cwd=workDir,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((PROXY_HOST, PROXY_PORT), timeout=1).close()
+            return proxy
+        except OSError:
+            time.sleep(0.05)
+    proxy.kill()
+    proxy.wait()
+    return None
+
+def stop_proxy(proxy):
+    proxy.send_signal(signal.SIGTERM)
+    try:
+        proxy.wait(10)
+    except subprocess.TimeoutExpired:
+        proxy.kill()
+        proxy.wait()
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_response(head, body):
+    """Check one response carries the page unencoded."""
+    lower = head.lower()
+    passed = check("status 200", head.split()[1:2] == ['200'])
+    passed = check("body as sent by the test server", body == PAGE) and passed
+    passed = check("no Content-Encoding", 'content-encoding:' not in lower) and passed
+    return check("no X-Cache-Encoding", 'x-cache-encoding:' not in lower) and passed
+
+def test_basic_proxy():
+    """Test if Proxy.py serves a cached text page as the origin sent it."""
+    print("\nTesting Proxy.py: Cached Text Served As Received")
+    print("=" * 70)
+
+    workDir = tempfile.mkdtemp(prefix='basic-proxy-')
+    proxy = start_proxy(workDir)
+    try:
+        if proxy is None:
+            print("TEST FAILED: Proxy.py did not start.")
+            return False
+        url = f"http://{TEST_HOST}{PAGE_PATH}"
+
+        print("\nFirst request, from the origin:")
+        passed = check_response(*fetch(url))
+        print("\nSecond request, from the cache:")
+        passed = check_response(*fetch(url)) and passed
+        passed = check("test server asked once", requested.count(PAGE_PATH) == 1) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+    finally:
+        if proxy is not None:
+            stop_proxy(proxy)
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    if passed:
+        print("\nTEST PASSED: Proxy.py served the cached page as it was received!")
+    else:
+        print("\nTEST FAILED: Proxy.py changed the cached page.")
+    return passed
+
+if __name__ == "__main__":
+    httpd = start_test_server()
+    if httpd is None:
+        sys.exit(0)
+    try:
+        success = test_basic_proxy()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
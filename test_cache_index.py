@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 11: Cache Index
+This script tests if your proxy checks freshness from its cache index:
+1. Reads the proxy's cache index counters from http://proxy.stats/
+2. Requests an object and checks that it was indexed, with its size
+3. Requests it REQUEST_COUNT more times and checks that every request was
+   answered from the cache after an index lookup, without scanning the
+   cached file's headers again
+
+The object is larger than the default memory object size, so the hits go
+through the disk cache and its index rather than the memory cache.
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8072  # Port for our test server
+STATS_URL = 'http://proxy.stats/'
+REQUEST_COUNT = 3
+OBJECT_SIZE = 512 * 1024  # Twice the default --memory-object-size
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+OBJECT_PATH = f"/index-{run_id}/object.bin"
+OBJECT = os.urandom(OBJECT_SIZE)
+
+# Requests the test server received
+requested = []
+
+class ObjectHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves one cacheable object."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        requested.append(self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(OBJECT)))
+        self.end_headers()
+        self.wfile.write(OBJECT)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), ObjectHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_counters(section):
+    """Return the proxy's <section>.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith(section + '.'):
+            counters[name[len(section) + 1:]] = int(value) if value.isdigit() else value
+    return counters
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_indexed(url, before):
+    """The object is indexed with its size once stored; returns (passed, counters)."""
+    body = fetch(url)
+    after = read_counters('index')
+    passed = check("response carries the object", body == OBJECT)
+    passed = check(f"object indexed ({before['entries']} -> {after['entries']} entries)",
+                   after['entries'] > before['entries']) and passed
+    grown = after['bytes'] - before['bytes']
+    return check(f"indexed bytes grew by the object's size ({grown})", grown >= OBJECT_SIZE) and passed, after
+
+def check_hits(url, before):
+    """Hits are decided from the index without rescanning the cached file."""
+    bodies = [fetch(url) for i in range(REQUEST_COUNT)]
+    after = read_counters('index')
+    lookups = after['lookups'] - before['lookups']
+    scans = after['scans'] - before['scans']
+    passed = check("every response carries the object", all(body == OBJECT for body in bodies))
+    passed = check(f"test server asked once ({requested.count(OBJECT_PATH)})",
+                   requested.count(OBJECT_PATH) == 1) and passed
+    passed = check(f"every request looked up in the index ({lookups} lookups)", lookups >= REQUEST_COUNT) and passed
+    return check(f"no cached headers scanned again ({scans} scans)", scans == 0) and passed
+
+def test_cache_index():
+    """Test if the proxy indexes stored objects and answers hits from the index."""
+    print("\nTesting BONUS FEATURE 11: Cache Index")
+    print("=" * 70)
+
+    url = f"http://{TEST_HOST}:{TEST_PORT}{OBJECT_PATH}"
+    try:
+        before = read_counters('index')
+        if not before:
+            print("TEST FAILED: The proxy did not report cache index counters.")
+            return False
+
+        print("\nObject requested for the first time:")
+        passed, indexed = check_indexed(url, before)
+        print(f"\nObject requested {REQUEST_COUNT} more times:")
+        passed = check_hits(url, indexed) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Hits were answered from the cache index!")
+    else:
+        print("\nTEST FAILED: The cache index did not answer as expected.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_cache_index()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 16: Hashed Cache Layout
+This script tests if your proxy stores objects in the hashed, sharded layout:
+1. Starts a test server and requests resources with a query string, a very
+   long path, and both /a and /a/b, which the old layout could not store
+2. Checks that each was cached at its hashed location with its URL recorded
+   next to it
+3. Writes a fresh cache file in the old ./<hostname>/<path> layout,
+   requests it, and checks that it was served from the cache and moved
+   into the hashed layout
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+from datetime import datetime, timedelta
+
+from proxy_cache import get_cache_location, get_cache_url, read_cache_url, CACHE_ROOT
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8094  # Port for our test server
+LEGACY_HOST = 'test-layout.com'  # Never contacted; its only object is already cached
+
+class PathHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that answers every GET with a cacheable copy of its path."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), PathHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url, host):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_hashed_storage(run_id):
+    """Awkward URLs are each cached at their hashed location with their URL recorded."""
+    print("\nHashed storage:")
+    resources = [
+        f"/search-{run_id}?q=a/b&page=2",
+        f"/long-{run_id}/" + 'x' * 300,
+        f"/tree-{run_id}/a",
+        f"/tree-{run_id}/a/b",
+    ]
+    passed = True
+    for resource in resources:
+        body = fetch(f"http://{TEST_HOST}:{TEST_PORT}{resource}", TEST_HOST)
+        cache_path = get_cache_location(TEST_HOST, TEST_PORT, resource)
+        url = get_cache_url(TEST_HOST, TEST_PORT, resource)
+        shard = os.path.relpath(cache_path, CACHE_ROOT).split(os.sep)
+        passed = check(f"{resource[:40]} cached under {'/'.join(shard[:2])}/",
+                       body == resource.encode() and os.path.isfile(cache_path) and len(shard) == 3
+                       and read_cache_url(cache_path) == url) and passed
+    return passed
+
+def check_legacy_import(run_id):
+    """A fresh file in the old layout is served from the cache and moved into the new one."""
+    print("\nLegacy cache file:")
+    resource = f"/legacy-{run_id}.html"
+    legacy_dir = './' + LEGACY_HOST
+    legacy_path = legacy_dir + resource
+    expires = (datetime.utcnow() + timedelta(days=1)).strftime("%a, %d %b %Y %H:%M:%S GMT")
+    content = f"legacy {run_id}"
+    os.makedirs(legacy_dir, exist_ok=True)
+    with open(legacy_path, 'w') as f:
+        f.write(f"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nExpires: {expires}\r\n"
+                f"Content-Length: {len(content)}\r\n\r\n{content}")
+
+    body = fetch(f"http://{LEGACY_HOST}{resource}", LEGACY_HOST)
+    passed = check("legacy copy served from the cache", body == content.encode())
+    passed = check("legacy copy moved into the hashed layout",
+                   not os.path.exists(legacy_path)
+                   and os.path.isfile(get_cache_location(LEGACY_HOST, 80, resource))) and passed
+    try:
+        os.rmdir(legacy_dir)
+    except OSError:
+        pass
+    return passed
+
+def test_cache_layout():
+    """Test if objects are stored in the hashed layout and legacy files are moved into it."""
+    print("\nTesting BONUS FEATURE 16: Hashed Cache Layout")
+    print("=" * 70)
+
+    # Fresh paths per run, so objects cached by an earlier run are not counted
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    try:
+        passed = check_hashed_storage(run_id)
+        passed = check_legacy_import(run_id) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Objects were stored in the hashed cache layout!")
+    else:
+        print("\nTEST FAILED: Objects were not stored in the hashed cache layout.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_cache_layout()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 13: Collapsed Forwarding
+This script tests if your proxy coalesces concurrent misses on one object:
+1. Starts a test server that sends a cacheable asset slowly, in pieces, and
+   counts the requests it receives
+2. Sends CLIENT_COUNT concurrent requests for the asset through the proxy
+3. Checks that every client received the whole asset and that the origin
+   server was asked for it only once
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8097  # Port for our slow test server
+CLIENT_COUNT = 5
+PIECE_COUNT = 5
+PIECE_DELAY = 0.3  # Seconds between the pieces of the asset
+ASSET_PIECE = b'collapsed forwarding ' * 2000
+
+request_count = 0
+count_lock = threading.Lock()
+
+class SlowAssetHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that sends a cacheable asset in slow pieces."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        global request_count
+        with count_lock:
+            request_count += 1
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(ASSET_PIECE) * PIECE_COUNT))
+        self.end_headers()
+        for i in range(PIECE_COUNT):
+            self.wfile.write(ASSET_PIECE)
+            self.wfile.flush()
+            time.sleep(PIECE_DELAY)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), SlowAssetHandler)
+
+    print(f"Starting slow test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url, results, index):
+    """Request url through the proxy and store the response body in results[index]."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(30)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        results[index] = response.partition(b'\r\n\r\n')[2]
+    except Exception as e:
+        print(f"Client {index} failed: {e}")
+    finally:
+        client_socket.close()
+
+def test_collapsed_forwarding():
+    """Test if concurrent misses on one object share a single origin fetch."""
+    print("\nTesting BONUS FEATURE 13: Collapsed Forwarding")
+    print("=" * 70)
+
+    # A fresh path per run, so the asset is not already cached by an earlier run
+    url = f"http://{TEST_HOST}:{TEST_PORT}/collapsed-{os.getpid()}-{int(time.time())}.bin"
+    results = [None] * CLIENT_COUNT
+    threads = []
+    for i in range(CLIENT_COUNT):
+        thread = threading.Thread(target=fetch, args=(url, results, i))
+        threads.append(thread)
+        thread.start()
+        # Let the first request become the leader before the others arrive
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+
+    expected = ASSET_PIECE * PIECE_COUNT
+    complete = sum(1 for body in results if body == expected)
+    print(f"{complete} of {CLIENT_COUNT} clients received the whole asset")
+    print(f"Origin server received {request_count} request(s)")
+
+    passed = complete == CLIENT_COUNT and request_count == 1
+    if passed:
+        print("TEST PASSED: Concurrent misses were collapsed into one origin fetch!")
+    else:
+        print("TEST FAILED: Clients got incomplete responses or the origin was asked more than once.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_collapsed_forwarding()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 17: Compressed Storage
+This script tests if your proxy stores text bodies compressed:
+1. Starts a test server with a small stylesheet and a large script
+2. Requests each through the proxy to cache it, then requests it again with
+   and without "Accept-Encoding: gzip"
+3. Checks that gzip-capable clients got the compressed bytes with the right
+   Content-Encoding and Content-Length, that other clients got the original
+   body, and that the cache file is smaller than the original body
+"""
+
+import gzip
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+from proxy_cache import get_cache_location
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8089  # Port for our test server
+SMALL_BODY = b'body { color: #333; margin: 0 auto; }\n' * 200
+# Varied text, so it still takes more than the memory cache's largest object once compressed
+words = [b'function', b'return', b'var', b'const', b'let', b'if', b'else', b'for', b'while', b'null']
+rng = random.Random(17)
+LARGE_BODY = b' '.join(rng.choice(words) + str(rng.randrange(100000)).encode() for i in range(250000))
+
+class AssetHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves the stylesheet and the script."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        if self.path.endswith('.css'):
+            content_type, body = 'text/css', SMALL_BODY
+        else:
+            content_type, body = 'application/javascript', LARGE_BODY
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), AssetHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url, accept_gzip=False):
+    """Request url through the proxy and return (headers dict, body)."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n"
+        if accept_gzip:
+            request += "Accept-Encoding: gzip, deflate\r\n"
+        client_socket.sendall((request + "\r\n").encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        head, _, body = response.partition(b'\r\n\r\n')
+        headers = {}
+        for line in head.decode('latin-1').split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return headers, body
+    finally:
+        client_socket.close()
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_asset(resource, original):
+    """An asset is stored compressed and served to both kinds of client."""
+    print(f"\n{resource} ({len(original)} bytes):")
+    url = f"http://{TEST_HOST}:{TEST_PORT}{resource}"
+    _, first = fetch(url)
+    passed = check("first request answered with the original body", first == original)
+
+    headers, body = fetch(url, accept_gzip=True)
+    print(f"  gzip client got {len(body)} bytes with Content-Encoding: {headers.get('content-encoding')}")
+    passed = check("gzip client got the compressed body",
+                   headers.get('content-encoding') == 'gzip' and headers.get('content-length') == str(len(body))
+                   and len(body) < len(original) and gzip.decompress(body) == original) and passed
+
+    headers, body = fetch(url)
+    passed = check("other client got the original body",
+                   'content-encoding' not in headers and headers.get('content-length') == str(len(original))
+                   and body == original) and passed
+
+    cache_path = get_cache_location(TEST_HOST, TEST_PORT, resource)
+    if os.path.exists(cache_path):
+        passed = check("cache file is smaller than the body", os.path.getsize(cache_path) < len(original)) and passed
+    return passed
+
+def test_compression():
+    """Test if text bodies are stored compressed and served in the encoding each client accepts."""
+    print("\nTesting BONUS FEATURE 17: Compressed Storage")
+    print("=" * 70)
+
+    # Fresh paths per run, so copies cached by an earlier run are not used
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    try:
+        passed = check_asset(f"/style-{run_id}.css", SMALL_BODY)
+        passed = check_asset(f"/script-{run_id}.js", LARGE_BODY) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Text bodies were stored compressed and served in the right encoding!")
+    else:
+        print("\nTEST FAILED: Text bodies were not stored or served as expected.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_compression()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
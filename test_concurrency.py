@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 4: Concurrent Client Handling
+This script tests if your proxy serves several clients at the same time:
+1. Starts a test server that takes SLOW_SECONDS to answer every request
+2. Sends CLIENT_COUNT requests for different resources through the proxy at once
+3. Checks that the total time is close to one slow response, not the sum of all
+"""
+
+import socket
+import time
+import sys
+import threading
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8090  # Port for our slow test server
+SLOW_SECONDS = 2
+CLIENT_COUNT = 5
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that sleeps before answering, like a slow origin server."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        time.sleep(SLOW_SECONDS)
+        body = f"<html><body>{self.path} at {time.time()}</body></html>".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the slow test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), SlowHandler)
+
+    print(f"Starting slow test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(index, results):
+    """Request one resource through the proxy and record the response."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(SLOW_SECONDS * CLIENT_COUNT + 10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET http://{TEST_HOST}:{TEST_PORT}/slow-{index} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data:
+                break
+            response += data
+        results[index] = response
+    except Exception as e:
+        print(f"Error in client {index}: {e}")
+        results[index] = b""
+    finally:
+        client_socket.close()
+
+def test_concurrency():
+    """Test if the proxy answers concurrent clients in parallel."""
+    print("\nTesting BONUS FEATURE 4: Concurrent Client Handling")
+    print("=" * 70)
+
+    results = {}
+    threads = []
+    start_time = time.time()
+    for i in range(CLIENT_COUNT):
+        thread = threading.Thread(target=fetch, args=(i, results))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start_time
+
+    ok_count = sum(1 for r in results.values() if r.startswith(b'HTTP/1.') and b' 200 ' in r[:20])
+    print(f"{ok_count}/{CLIENT_COUNT} requests succeeded in {elapsed:.2f}s")
+    print(f"Serial handling would take at least {SLOW_SECONDS * CLIENT_COUNT}s")
+
+    passed = ok_count == CLIENT_COUNT and elapsed < SLOW_SECONDS * 2
+    if passed:
+        print("TEST PASSED: Requests were served concurrently!")
+    else:
+        print("TEST FAILED: Requests were not served concurrently.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_concurrency()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 8: Origin Connection Pool
+This script tests if your proxy reuses connections to the origin server:
+1. Starts a keep-alive test server that counts the connections it accepts
+   and answers with chunked responses
+2. Requests REQUEST_COUNT different resources through the proxy, one at a time
+3. Checks that every response is complete and that the origin server saw a single connection
+"""
+
+import socket
+import sys
+import threading
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8092  # Port for our keep-alive test server
+REQUEST_COUNT = 4
+CHUNK_SIZE = 100
+
+connection_count = 0
+
+class KeepAliveHandler(socketserver.StreamRequestHandler):
+    """Answers every request on a connection with a chunked response until the proxy closes it."""
+
+    def handle(self):
+        global connection_count
+        connection_count += 1
+        while True:
+            request_line = self.rfile.readline()
+            if not request_line:
+                return
+            # Skip the request headers
+            while self.rfile.readline() not in (b'\r\n', b''):
+                pass
+
+            path = request_line.split()[1]
+            body = (b'<p>' + path + b'</p>') * 20
+            self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+                             b"Cache-Control: no-store\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for start in range(0, len(body), CHUNK_SIZE):
+                chunk = body[start:start + CHUNK_SIZE]
+                self.wfile.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the keep-alive test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), KeepAliveHandler)
+
+    print(f"Starting keep-alive test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(path):
+    """Request one resource through the proxy and return the whole response."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET http://{TEST_HOST}:{TEST_PORT}{path} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data:
+                break
+            response += data
+        return response
+    finally:
+        client_socket.close()
+
+def test_connection_pool():
+    """Test if the proxy sends consecutive requests over one origin connection."""
+    print("\nTesting BONUS FEATURE 8: Origin Connection Pool")
+    print("=" * 70)
+
+    all_complete = True
+    for i in range(REQUEST_COUNT):
+        path = f'/pooled-{i}'
+        try:
+            response = fetch(path)
+        except Exception as e:
+            print(f"Error fetching {path}: {e}")
+            response = b""
+        complete = path.encode() in response and response.endswith(b'0\r\n\r\n')
+        print(f"  {path}: {'complete' if complete else 'INCOMPLETE'} ({len(response)} bytes)")
+        all_complete = all_complete and complete
+
+    print(f"\nOrigin server accepted {connection_count} connection(s) for {REQUEST_COUNT} requests")
+
+    passed = all_complete and connection_count == 1
+    if passed:
+        print("TEST PASSED: Origin connection was reused!")
+    else:
+        print("TEST FAILED: Responses were incomplete or origin connections were not reused.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_connection_pool()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 15: Disk Quota
+This script tests if your proxy keeps its cache within the disk quota:
+1. Reads the proxy's quota from http://proxy.stats/; start the proxy with
+   a small one for this test, e.g. "--disk-cache-size 2000000"
+2. Starts a test server and requests enough distinct cacheable objects
+   through the proxy to fill the quota twice over, requesting one hot
+   object again between them
+3. Checks that the cached bytes stayed within the quota, that objects were
+   evicted, and that the hot object was never evicted
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8093  # Port for our test server
+STATS_URL = 'http://proxy.stats/'
+OBJECT_SIZE = 100 * 1000
+MAX_OBJECTS = 60  # Quotas too large to fill with this many objects are not tested
+
+# Paths the test server was asked for, in order
+origin_log = []
+
+class ObjectHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that answers every GET with a cacheable OBJECT_SIZE-byte object."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        origin_log.append(self.path)
+        body = b'q' * OBJECT_SIZE
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), ObjectHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_index_counters():
+    """Return the proxy's index.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith('index.'):
+            counters[name[6:]] = value
+    return counters
+
+def test_disk_quota():
+    """Test if the cache is kept within the disk quota by evicting cold objects."""
+    print("\nTesting BONUS FEATURE 15: Disk Quota")
+    print("=" * 70)
+
+    try:
+        before = read_index_counters()
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+    if 'quota' not in before:
+        print("TEST FAILED: The proxy did not report its disk quota.")
+        return False
+
+    quota = int(before['quota'])
+    if quota == 0 or 2 * quota > OBJECT_SIZE * MAX_OBJECTS:
+        print(f"The proxy's disk quota ({quota} bytes) is too large to fill in this test.")
+        print("Restart the proxy with e.g. --disk-cache-size 2000000 to run it; skipping.")
+        return True
+
+    # Fresh paths per run, so objects cached by an earlier run are not counted
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    hot_url = f"http://{TEST_HOST}:{TEST_PORT}/hot-{run_id}.bin"
+    object_count = 2 * quota // OBJECT_SIZE + 1
+    try:
+        fetch(hot_url)
+        for i in range(object_count):
+            fetch(f"http://{TEST_HOST}:{TEST_PORT}/cold-{run_id}-{i}.bin")
+            fetch(hot_url)
+        after = read_index_counters()
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    cached = int(after['bytes'])
+    evictions = int(after['evictions']) - int(before['evictions'])
+    hot_fetches = sum(1 for path in origin_log if path.startswith('/hot-'))
+    print(f"Requested {object_count} objects of {OBJECT_SIZE} bytes with a {quota}-byte quota "
+          f"({after['policy']} eviction)")
+    print(f"Cache holds {cached} bytes after {evictions} evictions; the hot object was fetched {hot_fetches} time(s)")
+
+    passed = True
+    if cached > quota:
+        print("TEST FAILED: The cache grew past its disk quota.")
+        passed = False
+    if evictions == 0:
+        print("TEST FAILED: No objects were evicted.")
+        passed = False
+    if hot_fetches != 1:
+        print("TEST FAILED: The frequently requested object was evicted.")
+        passed = False
+    if passed:
+        print("TEST PASSED: The cache stayed within its disk quota!")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_disk_quota()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
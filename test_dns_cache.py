@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 9: DNS Cache
+This script tests if your proxy caches hostname lookups:
+1. Starts a test server and reads the proxy's DNS counters from http://proxy.stats/
+2. Requests REQUEST_COUNT resources from the test server through the proxy
+3. Checks that at most one new lookup was made and the rest were cache hits
+"""
+
+import socket
+import sys
+import threading
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8095  # Port for our test server
+REQUEST_COUNT = 5
+STATS_URL = 'http://proxy.stats/'
+
+class PlainHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that answers every GET with a short uncacheable page."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        body = f"<html><body>{self.path}</body></html>".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), PlainHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_dns_counters():
+    """Return the proxy's dns.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith('dns.'):
+            counters[name[4:]] = int(value)
+    return counters
+
+def test_dns_cache():
+    """Test if repeated requests to one host reuse a cached lookup."""
+    print("\nTesting BONUS FEATURE 9: DNS Cache")
+    print("=" * 70)
+
+    try:
+        before = read_dns_counters()
+        for i in range(REQUEST_COUNT):
+            fetch(f"http://{TEST_HOST}:{TEST_PORT}/dns-{i}")
+        after = read_dns_counters()
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if not before or not after:
+        print("TEST FAILED: The proxy did not report DNS counters.")
+        return False
+
+    misses = after['misses'] - before['misses']
+    lookups = misses + after['hits'] - before['hits'] + after['collapsed'] - before['collapsed']
+    print(f"{REQUEST_COUNT} requests made {lookups} lookups, {misses} of them reached the resolver")
+
+    # Reused origin connections need no lookup at all, so only the misses are checked
+    passed = misses <= 1
+    if passed:
+        print("TEST PASSED: Hostname lookups were cached!")
+    else:
+        print("TEST FAILED: The proxy resolved the same hostname more than once.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_dns_cache()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 19: Fast Startup
+This script tests if your proxy starts serving a warm cache at once:
+1. Fills a scratch directory with a cache of OBJECT_COUNT objects in the
+   hashed layout, plus one object in the legacy layout create_cache.py
+   writes, with no cache index snapshot
+2. Starts its own proxy there, checks that cached objects are served
+   straight away, and that the background load imports the legacy object
+   and indexes every object on disk
+3. Stops the proxy, checks the snapshot it saved, starts it again and
+   checks that the index is loaded from the snapshot this time
+
+Unlike the other tests this one needs no running proxy; it starts its own
+on PROXY_PORT.
+"""
+
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from proxy_cache import get_cache_url, get_hashed_location, get_url_location
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8086  # Port the test's own proxy listens on
+PROXY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Proxy-bonus.py')
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8085  # Never listened on; every object requested is already cached
+LEGACY_HOST = 'fast-startup.test'
+STATS_URL = 'http://proxy.stats/'
+OBJECT_COUNT = 5000
+LOAD_TIMEOUT = 30
+
+def cached_response(body):
+    """Return a stored response for body that stays fresh for a day."""
+    expires = (datetime.utcnow() + timedelta(days=1)).strftime("%a, %d %b %Y %H:%M:%S GMT")
+    return (f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nExpires: {expires}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n{body}").encode()
+
+def fill_cache(workDir):
+    """Write OBJECT_COUNT objects in the hashed layout and one legacy object."""
+    cacheRoot = os.path.join(workDir, 'cache')
+    for i in range(OBJECT_COUNT):
+        url = get_cache_url(TEST_HOST, TEST_PORT, f'/object-{i}')
+        cacheLocation = get_hashed_location(url, cacheRoot)
+        os.makedirs(os.path.dirname(cacheLocation), exist_ok=True)
+        with open(cacheLocation, 'wb') as cacheFile:
+            cacheFile.write(cached_response(f'object {i}'))
+        with open(get_url_location(cacheLocation), 'w') as urlFile:
+            urlFile.write(url + '\n')
+    # Where create_cache.py puts its object: ./<hostname>/default
+    os.makedirs(os.path.join(workDir, LEGACY_HOST))
+    with open(os.path.join(workDir, LEGACY_HOST, 'default'), 'wb') as cacheFile:
+        cacheFile.write(cached_response('legacy object'))
+
+def fetch(url, host=TEST_HOST):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_index_counters():
+    """Return the proxy's index.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith('index.'):
+            counters[name[6:]] = value
+    return counters
+
+def start_proxy(workDir):
+    """Start a proxy in workDir; returns (process, seconds until a cached object was served)."""
+    startTime = time.monotonic()
+    proxy = subprocess.Popen([sys.executable, PROXY_SCRIPT, PROXY_HOST, str(PROXY_PORT)], cwd=workDir,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while time.monotonic() - startTime < LOAD_TIMEOUT:
+        try:
+            body = fetch(f"http://{TEST_HOST}:{TEST_PORT}/object-{OBJECT_COUNT - 1}")
+            return proxy, time.monotonic() - startTime, body
+        except OSError:
+            time.sleep(0.02)
+    return proxy, None, None
+
+def wait_until_loaded():
+    """Poll the stats until the index is loaded; returns its counters, or None."""
+    deadline = time.monotonic() + LOAD_TIMEOUT
+    while time.monotonic() < deadline:
+        counters = read_index_counters()
+        if counters.get('loaded') == '1':
+            return counters
+        time.sleep(0.1)
+    return None
+
+def stop_proxy(proxy):
+    proxy.send_signal(signal.SIGTERM)
+    try:
+        proxy.wait(10)
+    except subprocess.TimeoutExpired:
+        proxy.kill()
+        proxy.wait()
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_run(workDir, first):
+    """Start the proxy once and check what it served and indexed."""
+    proxy, seconds, body = start_proxy(workDir)
+    try:
+        if seconds is None:
+            return check("proxy started", False)
+        print(f"  first cached object served {seconds:.2f}s after starting the proxy")
+        passed = check("cached object served at startup", body == f'object {OBJECT_COUNT - 1}'.encode())
+        counters = wait_until_loaded()
+        if counters is None:
+            return check("index loaded in the background", False)
+        print(f"  index ready after {counters['load_seconds']}s: {counters['entries']} entries, "
+              f"{counters['snapshot_entries']} from the snapshot, {counters['found_on_disk']} found on disk")
+        passed = check("every cached object indexed", int(counters['entries']) >= OBJECT_COUNT + 1) and passed
+        if first:
+            # All but the object requested at startup, which was scanned on demand
+            passed = check("objects found on disk without a snapshot",
+                           int(counters['found_on_disk']) >= OBJECT_COUNT) and passed
+            passed = check("legacy object imported and served",
+                           not os.path.exists(os.path.join(workDir, LEGACY_HOST))
+                           and fetch(f"http://{LEGACY_HOST}/", LEGACY_HOST) == b'legacy object') and passed
+        else:
+            # The object requested at startup may be indexed before the snapshot is read
+            passed = check("index loaded from the snapshot",
+                           int(counters['snapshot_entries']) >= OBJECT_COUNT
+                           and int(counters['found_on_disk']) == 0) and passed
+    finally:
+        stop_proxy(proxy)
+    return passed
+
+def test_fast_startup():
+    """Test if the proxy serves a warm cache at once and loads its index in the background."""
+    print("\nTesting BONUS FEATURE 19: Fast Startup")
+    print("=" * 70)
+
+    workDir = tempfile.mkdtemp(prefix='test_fast_startup_')
+    try:
+        fill_cache(workDir)
+        print("\nFirst start, without a snapshot:")
+        passed = check_run(workDir, first=True)
+
+        snapshot = os.path.join(workDir, 'cache', 'index.sqlite')
+        with sqlite3.connect(snapshot) as db:
+            rows = db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        passed = check(f"snapshot saved on exit with {rows} entries", rows >= OBJECT_COUNT + 1) and passed
+
+        print("\nSecond start, with the snapshot:")
+        passed = check_run(workDir, first=False) and passed
+    except Exception as e:
+        print(f"Error running the proxy: {e}")
+        return False
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    if passed:
+        print("\nTEST PASSED: The proxy served its warm cache at once and loaded its index in the background!")
+    else:
+        print("\nTEST FAILED: The proxy did not start up as expected.")
+    return passed
+
+if __name__ == "__main__":
+    success = test_fast_startup()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 7: Persistent Client Connections
+This script tests if your proxy keeps client connections open:
+1. Starts a test server whose first resource is slower than the others
+2. Sends two requests one after another on a single connection
+3. Pipelines several requests in one write and checks the answers come back in order
+"""
+
+import socket
+import time
+import sys
+import threading
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8091  # Port for our test server
+SLOW_SECONDS = 1
+PIPELINE_DEPTH = 4
+
+class OrderedHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that names the resource in the body; /slow-* paths answer late."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        if '/slow-' in self.path:
+            time.sleep(SLOW_SECONDS)
+        body = f"<html><body>{self.path}</body></html>".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), OrderedHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def make_request(path):
+    """Build a keep-alive request for path on the test server."""
+    return f"GET http://{TEST_HOST}:{TEST_PORT}{path} HTTP/1.1\r\nHost: {TEST_HOST}\r\n\r\n"
+
+def read_response(client_socket, buffer):
+    """Read one Content-Length framed response; returns (body, remaining buffer)."""
+    while b'\r\n\r\n' not in buffer:
+        data = client_socket.recv(4096)
+        if not data:
+            raise ConnectionError("connection closed before the response headers")
+        buffer += data
+    head, buffer = buffer.split(b'\r\n\r\n', 1)
+    length = 0
+    for line in head.decode('utf-8', errors='replace').split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value.strip())
+    while len(buffer) < length:
+        data = client_socket.recv(4096)
+        if not data:
+            raise ConnectionError("connection closed in the middle of a response body")
+        buffer += data
+    return buffer[:length], buffer[length:]
+
+def test_keepalive():
+    """Test if the proxy answers several requests on one connection, in order."""
+    print("\nTesting BONUS FEATURE 7: Persistent Client Connections")
+    print("=" * 70)
+
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(SLOW_SECONDS * PIPELINE_DEPTH + 10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        buffer = b""
+
+        # Step 1: two requests one after another on the same connection
+        print("\nStep 1: Sending two requests on one connection...")
+        sequential_ok = True
+        for path in ('/first', '/second'):
+            client_socket.sendall(make_request(path).encode())
+            body, buffer = read_response(client_socket, buffer)
+            print(f"  {path}: {body.decode(errors='replace')}")
+            sequential_ok = sequential_ok and path.encode() in body
+
+        # Step 2: pipeline requests, the first one slower than the rest
+        print("\nStep 2: Pipelining requests in a single write...")
+        paths = ['/slow-0'] + [f'/fast-{i}' for i in range(1, PIPELINE_DEPTH)]
+        client_socket.sendall(''.join(make_request(path) for path in paths).encode())
+        pipeline_ok = True
+        for path in paths:
+            body, buffer = read_response(client_socket, buffer)
+            print(f"  {path}: {body.decode(errors='replace')}")
+            pipeline_ok = pipeline_ok and path.encode() in body
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        sequential_ok = pipeline_ok = False
+    finally:
+        client_socket.close()
+
+    passed = sequential_ok and pipeline_ok
+    if passed:
+        print("TEST PASSED: Connection was kept alive and pipelined responses came back in order!")
+    else:
+        print("TEST FAILED: Connection was closed early or responses came back out of order.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_keepalive()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 22: Streaming Link Extraction
+This script tests if your proxy finds the links of a page while relaying it:
+1. Starts a test server with a page that sets <base href> and links a
+   stylesheet, a preloaded font, a script, images with srcset, a CSS url()
+   in a <style> element and a style attribute, and a navigation link; the
+   second half of the page arrives DELAY seconds after the first
+2. Requests the page through the proxy and records when the test server
+   was asked for each linked resource
+3. Checks that the resources were fetched, resolved against <base href>,
+   that those in the first half were fetched before the page finished, and
+   that the navigation link was left alone
+4. Requests a stylesheet and checks that its @import and url() resources
+   are prefetched too
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8079  # Port for our test server
+DELAY = 2  # Seconds between the two halves of the page
+PREFETCH_TIMEOUT = 10
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+ROOT = f"/links-{run_id}"
+
+FIRST_HALF = f"""<!DOCTYPE html>
+<html><head>
+<base href="{ROOT}/static/">
+<link rel="stylesheet" href="main.css">
+<link rel="preload" as="font" href="fonts/body.woff2" crossorigin>
+<script src="app.js"></script>
+<style>.hero {{ background: url('hero.png') }}</style>
+</head><body style="background-image: url(&quot;paper.png&quot;)">
+<img src="logo.png" srcset="logo-2x.png 2x, logo-3x.png 3x">
+<a href="{ROOT}/next.html">Next page</a>
+""".encode()
+SECOND_HALF = b"""<img src="late.png">
+</body></html>
+"""
+PAGE = FIRST_HALF + SECOND_HALF
+
+EARLY_RESOURCES = ['main.css', 'fonts/body.woff2', 'app.js', 'hero.png', 'paper.png', 'logo.png', 'logo-2x.png',
+                   'logo-3x.png']
+LATE_RESOURCES = ['late.png']
+STYLESHEET = b"""@import "theme.css";
+body { background: url(img/bg.png) }
+@font-face { font-family: Title; src: url("fonts/title.woff") format("woff") }
+"""
+STYLESHEET_RESOURCES = ['theme.css', 'img/bg.png', 'fonts/title.woff']
+
+# path -> time the test server was first asked for it
+requested = {}
+requested_lock = threading.Lock()
+
+class LinkHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves the page in two halves and small assets at once."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        with requested_lock:
+            requested.setdefault(self.path, time.time())
+        if self.path.endswith('page.html'):
+            content_type, body = 'text/html; charset=utf-8', PAGE
+        elif self.path.endswith('standalone.css'):
+            content_type, body = 'text/css', STYLESHEET
+        elif self.path.endswith('.css'):
+            content_type, body = 'text/css', b'p { margin: 0 }'
+        elif self.path.endswith('.js'):
+            content_type, body = 'application/javascript', b'console.log(1);'
+        else:
+            content_type, body = 'application/octet-stream', b'asset ' + self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body is PAGE:
+            self.wfile.write(FIRST_HALF)
+            self.wfile.flush()
+            time.sleep(DELAY)
+            self.wfile.write(SECOND_HALF)
+        else:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), LinkHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def wait_for_requests(paths):
+    """Wait until the test server was asked for every path; returns their request times."""
+    deadline = time.time() + PREFETCH_TIMEOUT
+    while time.time() < deadline:
+        with requested_lock:
+            if all(path in requested for path in paths):
+                break
+        time.sleep(0.1)
+    with requested_lock:
+        return {path: requested.get(path) for path in paths}
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def test_link_extraction():
+    """Test if the links of a page are found and prefetched while it is relayed."""
+    print("\nTesting BONUS FEATURE 22: Streaming Link Extraction")
+    print("=" * 70)
+
+    static = f"{ROOT}/static/"
+    try:
+        print("\nPage with a <base href>, arriving in two halves:")
+        body = fetch(f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/page.html")
+        page_done = time.time()
+        passed = check("page relayed", body == PAGE)
+        times = wait_for_requests([static + path for path in EARLY_RESOURCES + LATE_RESOURCES])
+        missing = [path for path, when in times.items() if when is None]
+        passed = check(f"linked resources prefetched relative to <base href> (missing: {missing or 'none'})",
+                       not missing) and passed
+        early = [times[static + path] for path in EARLY_RESOURCES if times[static + path] is not None]
+        if early:
+            print(f"  first-half resources requested {page_done - max(early):.2f}s before the page finished")
+        passed = check("first-half resources prefetched before the page finished",
+                       len(early) == len(EARLY_RESOURCES) and max(early) < page_done - DELAY / 2) and passed
+        time.sleep(0.5)
+        passed = check("navigation link not prefetched", f"{ROOT}/next.html" not in requested) and passed
+
+        print("\nStylesheet with @import and url():")
+        fetch(f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/css/standalone.css")
+        times = wait_for_requests([f"{ROOT}/css/{path}" for path in STYLESHEET_RESOURCES])
+        missing = [path for path, when in times.items() if when is None]
+        passed = check(f"@import and url() resources prefetched (missing: {missing or 'none'})", not missing) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Links were found and prefetched while the page was relayed!")
+    else:
+        print("\nTEST FAILED: Links were not found or prefetched as expected.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_link_extraction()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
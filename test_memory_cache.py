@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 10: Memory Cache
+This script tests if your proxy answers hot small objects from memory:
+1. Reads the proxy's memory cache counters from http://proxy.stats/
+2. Requests a small page REQUEST_COUNT times and checks that it was fetched
+   from the test server once, kept in memory and that the later requests
+   were memory cache hits
+3. Requests an object larger than the default memory object size
+   REQUEST_COUNT times and checks that it was served from the disk cache
+   without being kept in memory
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8073  # Port for our test server
+STATS_URL = 'http://proxy.stats/'
+REQUEST_COUNT = 4
+LARGE_SIZE = 512 * 1024  # Twice the default --memory-object-size
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+SMALL_PATH = f"/memory-{run_id}/small.html"
+LARGE_PATH = f"/memory-{run_id}/large.bin"
+SMALL = b"<html><body>" + b"<p>Kept in memory.</p>\n" * 50 + b"</body></html>"
+LARGE = os.urandom(LARGE_SIZE)
+
+# Requests the test server received
+requested = []
+
+class MemoryHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves one small cacheable page and one large cacheable object."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        requested.append(self.path)
+        if self.path == SMALL_PATH:
+            body, content_type = SMALL, 'text/html'
+        else:
+            body, content_type = LARGE, 'application/octet-stream'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), MemoryHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_counters(section):
+    """Return the proxy's <section>.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith(section + '.'):
+            counters[name[len(section) + 1:]] = int(value) if value.isdigit() else value
+    return counters
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def fetch_repeatedly(path, expected):
+    """Request path REQUEST_COUNT times; returns (bodies as expected, memory counters before, after)."""
+    url = f"http://{TEST_HOST}:{TEST_PORT}{path}"
+    # The first request stores the object and the second loads it from disk
+    bodies = [fetch(url), fetch(url)]
+    before = read_counters('memory_cache')
+    bodies += [fetch(url) for i in range(REQUEST_COUNT - 2)]
+    after = read_counters('memory_cache')
+    return all(body == expected for body in bodies), before, after
+
+def check_small():
+    """A small object is answered from memory once it has been loaded from disk."""
+    start = read_counters('memory_cache')
+    bodies_ok, before, after = fetch_repeatedly(SMALL_PATH, SMALL)
+    hits = after['hits'] - before['hits']
+    passed = check("every response carries the page", bodies_ok)
+    passed = check(f"test server asked once ({requested.count(SMALL_PATH)})",
+                   requested.count(SMALL_PATH) == 1) and passed
+    passed = check(f"page kept in memory ({start['objects']} -> {after['objects']} objects)",
+                   after['objects'] > start['objects']) and passed
+    return check(f"later requests were memory hits ({hits} of {REQUEST_COUNT - 2})",
+                 hits >= REQUEST_COUNT - 2) and passed
+
+def check_large():
+    """An object over the memory object size is served from disk only."""
+    bodies_ok, before, after = fetch_repeatedly(LARGE_PATH, LARGE)
+    passed = check("every response carries the object", bodies_ok)
+    passed = check(f"test server asked once ({requested.count(LARGE_PATH)})",
+                   requested.count(LARGE_PATH) == 1) and passed
+    passed = check(f"no memory hits ({after['hits'] - before['hits']})", after['hits'] == before['hits']) and passed
+    return check(f"object not kept in memory ({before['objects']} -> {after['objects']} objects)",
+                 after['objects'] <= before['objects']) and passed
+
+def test_memory_cache():
+    """Test if the proxy answers small hot objects from memory and keeps large ones out of it."""
+    print("\nTesting BONUS FEATURE 10: Memory Cache")
+    print("=" * 70)
+
+    try:
+        if not read_counters('memory_cache'):
+            print("TEST FAILED: The proxy did not report memory cache counters.")
+            return False
+
+        print("\nSmall page requested repeatedly:")
+        passed = check_small()
+        print("\nLarge object requested repeatedly:")
+        passed = check_large() and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Hot small objects were answered from memory!")
+    else:
+        print("\nTEST FAILED: The memory cache did not answer as expected.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_memory_cache()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
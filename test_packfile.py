@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 18: Packfile Store
+This script tests if your proxy keeps small objects in its packfile store:
+1. Reads the proxy's largest packed object size from http://proxy.stats/;
+   start the proxy with the store enabled for this test, e.g.
+   "--pack-object-size 16384"
+2. Starts a test server and requests a batch of small objects and one
+   object larger than that size through the proxy, then requests them all
+   again
+3. Checks that the small objects were packed rather than given files of
+   their own, that the large one got its own cache file, and that every
+   object was served from the cache with its original body
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+from proxy_cache import get_cache_location
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8087  # Port for our test server
+STATS_URL = 'http://proxy.stats/'
+SMALL_OBJECTS = 20
+
+# Paths the test server was asked for, in order
+origin_log = []
+
+class SizedHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that answers /<size>/<name> with a cacheable body of that many bytes."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        origin_log.append(self.path)
+        body = make_body(self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), SizedHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def make_body(path):
+    """Return the body served for path: its name repeated to the size in the path."""
+    size = int(path.split('/')[1])
+    return (path.encode() * (size // len(path) + 1))[:size]
+
+def fetch(url):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_pack_counters():
+    """Return the proxy's pack.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith('pack.'):
+            counters[name[5:]] = int(value)
+    return counters
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def test_packfile():
+    """Test if small objects are kept in the packfile store and served from it."""
+    print("\nTesting BONUS FEATURE 18: Packfile Store")
+    print("=" * 70)
+
+    try:
+        before = read_pack_counters()
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+    if 'object_size' not in before:
+        print("TEST FAILED: The proxy did not report its packfile store.")
+        return False
+    object_size = before['object_size']
+    if object_size < 1024:
+        print(f"The proxy's packfile store is off or packs only objects up to {object_size} bytes.")
+        print("Restart the proxy with e.g. --pack-object-size 16384 to run this test; skipping.")
+        return True
+
+    # Fresh paths per run, so objects cached by an earlier run are not counted
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    small = [f"/{object_size // 4}/small-{run_id}-{i}.bin" for i in range(SMALL_OBJECTS)]
+    large = f"/{object_size * 2}/large-{run_id}.bin"
+    try:
+        first = [fetch(f"http://{TEST_HOST}:{TEST_PORT}{path}") for path in small + [large]]
+        after = read_pack_counters()
+        second = [fetch(f"http://{TEST_HOST}:{TEST_PORT}{path}") for path in small + [large]]
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    expected = [make_body(path) for path in small + [large]]
+    print(f"Requested {SMALL_OBJECTS} objects of {object_size // 4} bytes and one of {object_size * 2} bytes "
+          f"twice; the pack holds {after['objects']} objects in {after['segments']} segment(s)")
+    passed = check("first requests answered with the original bodies", first == expected)
+    passed = check("second requests answered with the original bodies", second == expected) and passed
+    passed = check("every object fetched from the origin once", sorted(origin_log) == sorted(small + [large])) and passed
+    passed = check(f"{SMALL_OBJECTS} small objects added to the pack",
+                   after['objects'] - before['objects'] >= SMALL_OBJECTS) and passed
+    passed = check("small objects have no cache files of their own",
+                   not any(os.path.exists(get_cache_location(TEST_HOST, TEST_PORT, path)) for path in small)) and passed
+    passed = check("large object has its own cache file",
+                   os.path.isfile(get_cache_location(TEST_HOST, TEST_PORT, large))) and passed
+
+    if passed:
+        print("\nTEST PASSED: Small objects were kept in the packfile store!")
+    else:
+        print("\nTEST FAILED: Small objects were not kept in the packfile store as expected.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_packfile()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
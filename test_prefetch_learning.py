@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 24: Learned Prefetching
+This script tests if your proxy learns which linked resources clients fetch:
+1. Starts a test server with a page that expires at once, linking two images
+   the client always goes on to request and two it never requests; none of
+   the images may be cached
+2. Requests the page and the two wanted images (with the page as Referer)
+   twice, then a third time, and checks that the third time only the wanted
+   images were prefetched
+3. Requests a second page linking two cacheable images, then one of them
+   with the page as Referer, and checks that the proxy's prefetch precision
+   and recall counters saw the prefetched copy being used
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+from proxy_cache import get_cache_location, is_stored
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8077  # Port for our test server
+STATS_URL = 'http://proxy.stats/'
+PREFETCH_TIMEOUT = 10
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+ROOT = f"/learn-{run_id}"
+WANTED = ['wanted-0.png', 'wanted-1.png']
+UNWANTED = ['unwanted-0.png', 'unwanted-1.png']
+KEPT = ['kept-0.png', 'kept-1.png']
+
+# path -> number of times the test server was asked for it
+requested = {}
+requested_lock = threading.Lock()
+
+class LearningHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves the pages and their images."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        with requested_lock:
+            requested[self.path] = requested.get(self.path, 0) + 1
+        if self.path.endswith('page.html'):
+            # Stale at once, so every request fetches it and finds its links again
+            body = ''.join(f'<img src="{name}">' for name in WANTED + UNWANTED).encode()
+            content_type, cache_control = 'text/html', 'max-age=0'
+        elif self.path.endswith('kept.html'):
+            body = ''.join(f'<img src="{name}">' for name in KEPT).encode()
+            content_type, cache_control = 'text/html', 'max-age=3600'
+        else:
+            body = b'\x89PNG' + self.path.encode()
+            content_type = 'image/png'
+            cache_control = 'max-age=3600' if '/kept-' in self.path else 'no-store'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), LearningHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url, referer=None):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n"
+        if referer:
+            request += f"Referer: {referer}\r\n"
+        client_socket.sendall((request + "\r\n").encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_learning_counters():
+    """Return the proxy's prefetch_learning.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith('prefetch_learning.'):
+            counters[name[18:]] = float(value)
+    return counters
+
+def requests_of(names):
+    with requested_lock:
+        return {name: requested.get(f"{ROOT}/{name}", 0) for name in names}
+
+def wait_for_requests(names, before):
+    """Wait until the test server was asked for each name once more than before."""
+    deadline = time.time() + PREFETCH_TIMEOUT
+    while time.time() < deadline:
+        if all(requests_of([name])[name] > before[name] for name in names):
+            break
+        time.sleep(0.1)
+    # Give prefetches that should not happen a moment to show up
+    time.sleep(1)
+
+def view_page(page, follow_ups):
+    """Request a page, wait for its prefetches, then request follow_ups with it as Referer.
+
+    Returns how often the test server was asked for each image meanwhile.
+    """
+    names = WANTED + UNWANTED
+    before = requests_of(names)
+    fetch(page)
+    wait_for_requests(WANTED, before)
+    prefetched = {name: count - before[name] for name, count in requests_of(names).items()}
+    for name in follow_ups:
+        fetch(f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/{name}", referer=page)
+    return prefetched
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def test_prefetch_learning():
+    """Test if only the linked resources clients go on to request are prefetched."""
+    print("\nTesting BONUS FEATURE 24: Learned Prefetching")
+    print("=" * 70)
+
+    page = f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/page.html"
+    try:
+        before = read_learning_counters()
+        if not before:
+            print("TEST FAILED: The proxy did not report prefetch learning counters.")
+            return False
+        threshold = before['threshold']
+        print(f"Follow-up threshold: {threshold}")
+
+        print("\nPage requested twice, followed by two of its four images:")
+        first = view_page(page, WANTED)
+        passed = check("every image prefetched the first time", all(count >= 1 for count in first.values()))
+        view_page(page, WANTED)
+        middle = read_learning_counters()
+        passed = check("follow-ups counted", middle['follow_ups'] - before['follow_ups'] == 2 * len(WANTED)) and passed
+
+        print("\nPage requested a third time:")
+        third = view_page(page, [])
+        after = read_learning_counters()
+        print(f"  prefetched: {', '.join(name for name, count in third.items() if count) or 'nothing'}")
+        passed = check("followed-up images prefetched", all(third[name] >= 1 for name in WANTED)) and passed
+        if threshold > 0:
+            passed = check("images never followed up left alone", all(third[name] == 0 for name in UNWANTED)) and passed
+            passed = check("unlikely links counted", after['unlikely'] - middle['unlikely'] >= len(UNWANTED)) and passed
+
+        print("\nPage with cacheable images, one of them requested:")
+        kept_page = f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/kept.html"
+        fetch(kept_page)
+        locations = [get_cache_location(TEST_HOST, TEST_PORT, f"{ROOT}/{name}") for name in KEPT]
+        deadline = time.time() + PREFETCH_TIMEOUT
+        while time.time() < deadline and not all(is_stored(location) for location in locations):
+            time.sleep(0.1)
+        fetch(f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/{KEPT[0]}", referer=kept_page)
+        final = read_learning_counters()
+        print(f"  precision {final['precision']}, recall {final['recall']}")
+        passed = check("prefetched images counted", final['prefetched'] - after['prefetched'] == len(KEPT)) and passed
+        passed = check("prefetched image used", final['used'] - after['used'] == 1
+                       and final['follow_ups_prefetched'] - after['follow_ups_prefetched'] == 1) and passed
+        passed = check("image served from the prefetched copy", requests_of(KEPT)[KEPT[0]] == 1) and passed
+        passed = check("no more prefetches used than stored", final['used'] <= final['prefetched']
+                       and final['precision'] <= 1) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Only the linked resources clients went on to request were prefetched!")
+    else:
+        print("\nTEST FAILED: Prefetching did not follow what clients requested.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_prefetch_learning()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 23: Prefetch Policy
+This script tests if your proxy limits what it prefetches for a page:
+1. Reads the proxy's prefetch policy from http://proxy.stats/
+2. Requests a page linking images, a font, a script and a stylesheet (in
+   that order), an image on another host and an image larger than the size
+   limit, and checks that the stylesheet and script were fetched before the
+   images, that the other host and the large image were left alone, and that
+   the stylesheet's own links were prefetched as deep as the policy allows
+3. Requests a page linking more images than a page may prefetch, and one
+   linking more bytes of images than a page may prefetch, and checks that
+   only as many as the budgets allow were cached
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+from proxy_cache import get_cache_location, is_stored
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+OTHER_HOST = '127.0.0.1'  # The same test server under another host name
+TEST_PORT = 8078  # Port for our test server
+STATS_URL = 'http://proxy.stats/'
+ASSET_DELAY = 0.3  # Seconds the test server takes to answer an asset of the first page
+PREFETCH_TIMEOUT = 20
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+ROOT = f"/policy-{run_id}"
+
+# Set from the proxy's policy before the test server starts
+policy = {}
+
+# path -> order in which the test server was first asked for it
+requested = {}
+requested_lock = threading.Lock()
+
+def order_page():
+    links = ''.join(f'<img src="img-{i}.png">' for i in range(4))
+    links += '<link rel="preload" as="font" href="body.woff2">'
+    links += '<script src="app.js"></script><link rel="stylesheet" href="main.css">'
+    links += f'<img src="http://{OTHER_HOST}:{TEST_PORT}{ROOT}/order/offsite.png"><img src="large.png">'
+    return f'<html><head></head><body>{links}</body></html>'.encode()
+
+def count_page():
+    return ''.join(f'<img src="img-{i}.png">' for i in range(policy['page_count'] + 5)).encode()
+
+def bytes_page():
+    return ''.join(f'<img src="img-{i}.png">' for i in range(bytes_images())).encode()
+
+def bytes_image_size():
+    return policy['max_size'] * 7 // 10
+
+def bytes_images():
+    return policy['page_bytes'] // bytes_image_size() + 2
+
+class PolicyHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves the pages and their assets."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        path = self.path
+        with requested_lock:
+            requested.setdefault(path, len(requested))
+        if path.endswith('.html'):
+            content_type = 'text/html'
+            body = {'order': order_page, 'count': count_page, 'bytes': bytes_page}[path.split('/')[-1][:-5]]()
+        elif path.endswith('main.css'):
+            content_type, body = 'text/css', b'@import "nested.css"; body { background: url(bg.png) }'
+        elif path.endswith('nested.css'):
+            content_type, body = 'text/css', b'@import "deeper.css";'
+        elif path.endswith('.css'):
+            content_type, body = 'text/css', b'p { margin: 0 }'
+        elif path.endswith('large.png'):
+            content_type, body = 'image/png', b'L' * (policy['max_size'] + 1)
+        elif '/bytes/' in path:
+            content_type, body = 'image/png', b'B' * bytes_image_size()
+        else:
+            content_type, body = 'application/octet-stream', b'asset ' + path.encode()
+        if '/order/' in path and not path.endswith('.html'):
+            time.sleep(ASSET_DELAY)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except OSError:
+            # The proxy abandons resources that are too large
+            pass
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer(('', TEST_PORT), PolicyHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_policy():
+    """Return the proxy's prefetch_policy.* settings and counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith('prefetch_policy.'):
+            counters[name[16:]] = int(value) if value.isdigit() else value
+    return counters
+
+def wait_until_idle(paths):
+    """Wait until the test server was asked for every path, or for nothing new for a while."""
+    deadline = time.time() + PREFETCH_TIMEOUT
+    last_count, last_change = -1, time.time()
+    while time.time() < deadline:
+        with requested_lock:
+            if all(path in requested for path in paths):
+                break
+            if len(requested) != last_count:
+                last_count, last_change = len(requested), time.time()
+        if time.time() - last_change > 3:
+            break
+        time.sleep(0.1)
+    # Let the last fetches reach the cache
+    time.sleep(1)
+
+def cached(directory, names):
+    return [name for name in names
+            if is_stored(get_cache_location(TEST_HOST, TEST_PORT, f"{ROOT}/{directory}/{name}"))]
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_order_page():
+    """Priorities, the size limit, the scope and stylesheet recursion."""
+    order = f"{ROOT}/order/"
+    fetch(f"http://{TEST_HOST}:{TEST_PORT}{order}order.html")
+    wait_until_idle([order + name for name in ('img-3.png', 'nested.css', 'bg.png')])
+    with requested_lock:
+        seen = {path[len(order):]: when for path, when in requested.items() if path.startswith(order)}
+
+    images_first = [name for name in seen if name.startswith('img-') and
+                    seen[name] < max(seen.get('main.css', 0), seen.get('app.js', 0))]
+    print(f"  requested in this order: {', '.join(sorted(seen, key=seen.get))}")
+    passed = check(f"stylesheet and script fetched before all but the first images ({len(images_first)} before)",
+                   'main.css' in seen and 'app.js' in seen and len(images_first) <= 2)
+    passed = check("every image and the font prefetched",
+                   cached('order', [f'img-{i}.png' for i in range(4)] + ['body.woff2']) ==
+                   [f'img-{i}.png' for i in range(4)] + ['body.woff2']) and passed
+    passed = check("image larger than the size limit not cached", not cached('order', ['large.png'])) and passed
+    if policy['scope'] == 'same-origin':
+        passed = check("image on another host not prefetched", 'offsite.png' not in seen) and passed
+    if policy['css_depth'] >= 1:
+        passed = check("links of the prefetched stylesheet prefetched",
+                       cached('order', ['nested.css', 'bg.png']) == ['nested.css', 'bg.png']) and passed
+    if policy['css_depth'] == 1:
+        passed = check("links two stylesheets deep left alone", 'deeper.css' not in seen) and passed
+    return passed
+
+def check_count_page():
+    """No more resources than a page may prefetch."""
+    names = [f'img-{i}.png' for i in range(policy['page_count'] + 5)]
+    fetch(f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/count/count.html")
+    wait_until_idle([])
+    count = len(cached('count', names))
+    return check(f"{count} of {len(names)} images prefetched (at most {policy['page_count']} per page)",
+                 count == policy['page_count'])
+
+def check_bytes_page():
+    """No more bytes than a page may prefetch."""
+    names = [f'img-{i}.png' for i in range(bytes_images())]
+    fetch(f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/bytes/bytes.html")
+    wait_until_idle([])
+    count = len(cached('bytes', names))
+    expected = policy['page_bytes'] // bytes_image_size()
+    return check(f"{count} of {len(names)} images of {bytes_image_size()} bytes prefetched "
+                 f"({expected} fit in {policy['page_bytes']} bytes per page)", count == expected)
+
+def test_prefetch_policy():
+    """Test if prefetching follows the priorities, budgets and scope of the policy."""
+    print("\nTesting BONUS FEATURE 23: Prefetch Policy")
+    print("=" * 70)
+
+    try:
+        print(f"Prefetch policy: {policy}")
+        print("\nPage linking assets of every kind:")
+        passed = check_order_page()
+        print("\nPage linking more images than a page may prefetch:")
+        passed = check_count_page() and passed
+        print("\nPage linking more bytes of images than a page may prefetch:")
+        passed = check_bytes_page() and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Prefetching followed the priorities, budgets and scope of the policy!")
+    else:
+        print("\nTEST FAILED: Prefetching did not follow the policy.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    policy.update(read_policy())
+    if not policy:
+        print("TEST FAILED: The proxy did not report its prefetch policy.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_prefetch_policy()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
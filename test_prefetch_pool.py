@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 21: Prefetch Worker Pool
+This script tests if your proxy prefetches through a bounded, deduplicating queue:
+1. Reads the proxy's prefetch settings from http://proxy.stats/
+2. Starts a slow test server with two pages that link to the same
+   ASSET_COUNT assets, some of them more than once
+3. Requests both pages through the proxy at the same time, then waits for
+   the assets to be prefetched
+4. Checks that every asset was cached, that each was fetched from the test
+   server only once, and that no more than the per-host limit were fetched
+   at the same time
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+from proxy_cache import get_cache_location, is_stored
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8084  # Port for our slow test server
+STATS_URL = 'http://proxy.stats/'
+ASSET_COUNT = 12
+ASSET_DELAY = 0.2  # Seconds the test server takes to answer an asset
+PREFETCH_TIMEOUT = 30
+
+class AssetCounter:
+    """Counts asset requests and how many the test server answers at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.running = 0
+        self.max_running = 0
+
+    def begin(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def end(self):
+        with self.lock:
+            self.running -= 1
+
+counter = AssetCounter()
+run_id = f"{os.getpid()}-{int(time.time())}"
+
+def asset_paths():
+    return [f"/pool-{run_id}/asset-{i}.png" for i in range(ASSET_COUNT)]
+
+class PoolHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves the pages at once and the assets slowly."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        if self.path.endswith('.html'):
+            # Both pages link every asset, the first one twice
+            links = asset_paths() + asset_paths()[:1]
+            if self.path.endswith('b.html'):
+                links.reverse()
+            body = ''.join(f'<img src="{path}">' for path in links).encode()
+            content_type = 'text/html'
+        else:
+            counter.begin(self.path)
+            try:
+                time.sleep(ASSET_DELAY)
+            finally:
+                counter.end()
+            body = b'\x89PNG' + self.path.encode()
+            content_type = 'image/png'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), PoolHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_prefetch_counters():
+    """Return the proxy's prefetch.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith('prefetch.'):
+            counters[name[9:]] = int(value)
+    return counters
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def test_prefetch_pool():
+    """Test if linked resources are prefetched once each, within the per-host limit."""
+    print("\nTesting BONUS FEATURE 21: Prefetch Worker Pool")
+    print("=" * 70)
+
+    try:
+        before = read_prefetch_counters()
+        if not before:
+            print("TEST FAILED: The proxy did not report prefetch counters.")
+            return False
+        print(f"{before['workers']} prefetch workers, at most {before['per_host']} per host")
+
+        pages = [f"http://{TEST_HOST}:{TEST_PORT}/pool-{run_id}/{name}.html" for name in ('a', 'b')]
+        threads = [threading.Thread(target=fetch, args=(page,)) for page in pages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        locations = [get_cache_location(TEST_HOST, TEST_PORT, path) for path in asset_paths()]
+        deadline = time.time() + PREFETCH_TIMEOUT
+        while time.time() < deadline and not all(is_stored(location) for location in locations):
+            time.sleep(0.2)
+        after = read_prefetch_counters()
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    cached = sum(is_stored(location) for location in locations)
+    print(f"{cached} of {ASSET_COUNT} assets cached, {len(counter.requests)} fetched from the test server, "
+          f"at most {counter.max_running} at a time")
+    passed = check("every asset prefetched", cached == ASSET_COUNT)
+    passed = check("each asset fetched from the test server once",
+                   all(count == 1 for count in counter.requests.values())) and passed
+    passed = check("no more fetches at a time than the per-host limit",
+                   0 < counter.max_running <= after['per_host']) and passed
+    passed = check("repeated links skipped", after['skipped'] - before['skipped'] >= ASSET_COUNT) and passed
+
+    if passed:
+        print("\nTEST PASSED: Linked resources were prefetched once each, within the per-host limit!")
+    else:
+        print("\nTEST FAILED: Linked resources were not prefetched as expected.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_prefetch_pool()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
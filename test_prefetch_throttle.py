@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 25: Prefetch Throttling
+This script tests if your proxy lets prefetching give way to clients:
+1. Reads the proxy's prefetch settings and load limits from http://proxy.stats/
+2. Requests a page linking slow assets and at once asks for the last of
+   them itself; checks that every asset was fetched from the test server
+   once and that the queued prefetches of the assets the client fetched
+   were cancelled
+3. Requests a page linking slow assets, then puts twice the active request
+   limit of slow client requests through the proxy, and checks that no
+   prefetch started while they were being served and that the assets were
+   prefetched once the load had gone
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+from proxy_cache import get_cache_location, is_stored
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+LOAD_HOST = '127.0.0.1'  # The same test server under another host name, for the client load
+TEST_PORT = 8076  # Port for our test server
+STATS_URL = 'http://proxy.stats/'
+ASSET_COUNT = 8
+CLIENT_ASSETS = 3  # Assets the client asks for itself in the first part
+ASSET_DELAY = 0.5  # Seconds the test server takes to answer an asset
+LOAD_DELAY = 3  # Seconds the test server takes to send the body of a client load request
+PREFETCH_TIMEOUT = 20
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+ROOT = f"/throttle-{run_id}"
+
+# path -> times the test server was asked for it
+requested = {}
+requested_lock = threading.Lock()
+
+class ThrottleHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves pages at once, assets and client load slowly."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        with requested_lock:
+            requested.setdefault(self.path, []).append(time.time())
+        if self.path.endswith('.html'):
+            directory = self.path.rsplit('/', 2)[-2]
+            body = ''.join(f'<img src="{ROOT}/{directory}/asset-{i}.png">' for i in range(ASSET_COUNT)).encode()
+            content_type, cache_control = 'text/html', 'max-age=3600'
+        elif '/load-' in self.path:
+            body = b'load ' + self.path.encode()
+            content_type, cache_control = 'text/plain', 'no-store'
+        else:
+            time.sleep(ASSET_DELAY)
+            body = b'\x89PNG' + self.path.encode()
+            content_type, cache_control = 'image/png', 'max-age=3600'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if '/load-' in self.path:
+            # Answer at once but take a while over the body, so the proxy is
+            # busy without the origin looking slow
+            self.wfile.flush()
+            time.sleep(LOAD_DELAY)
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 64
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer(('', TEST_PORT), ThrottleHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url, timeout=10):
+    """Request url through the proxy and return the response body."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(timeout)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data:
+                break
+            response += data
+        return response.split(b'\r\n\r\n', 1)[-1]
+    finally:
+        client_socket.close()
+
+def read_counters(section):
+    """Return the proxy's <section>.* counters as a dict."""
+    counters = {}
+    for line in fetch(STATS_URL).decode().splitlines():
+        name, _, value = line.partition(': ')
+        if name.startswith(section + '.'):
+            counters[name[len(section) + 1:]] = int(value) if value.isdigit() else value
+    return counters
+
+def asset_paths(directory):
+    return [f"{ROOT}/{directory}/asset-{i}.png" for i in range(ASSET_COUNT)]
+
+def wait_until_cached(directory):
+    """Wait for a page's assets to be cached; returns how many are."""
+    locations = [get_cache_location(TEST_HOST, TEST_PORT, path) for path in asset_paths(directory)]
+    deadline = time.time() + PREFETCH_TIMEOUT
+    while time.time() < deadline and not all(is_stored(location) for location in locations):
+        time.sleep(0.1)
+    return sum(is_stored(location) for location in locations)
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_cancelled():
+    """Queued prefetches of objects a client fetched first are cancelled."""
+    before = read_counters('prefetch')
+    fetch(f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/client/page.html")
+    threads = [threading.Thread(target=fetch, args=(f"http://{TEST_HOST}:{TEST_PORT}{path}",))
+               for path in asset_paths('client')[-CLIENT_ASSETS:]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cached = wait_until_cached('client')
+    time.sleep(0.5)
+    after = read_counters('prefetch')
+    with requested_lock:
+        counts = [len(requested.get(path, [])) for path in asset_paths('client')]
+
+    passed = check(f"every asset cached ({cached} of {ASSET_COUNT})", cached == ASSET_COUNT)
+    passed = check(f"each asset fetched from the test server once ({counts})", counts == [1] * ASSET_COUNT) and passed
+    cancelled = after['cancelled'] - before['cancelled']
+    return check(f"prefetches of assets the client fetched cancelled ({cancelled})", cancelled >= 1) and passed
+
+def check_paused(throttle):
+    """No prefetch starts while clients keep the proxy busy."""
+    load_count = 2 * throttle['max_active']
+    fetch(f"http://{TEST_HOST}:{TEST_PORT}{ROOT}/load/page.html")
+
+    load_started = time.time()
+    finished = []
+    def load(i):
+        try:
+            fetch(f"http://{LOAD_HOST}:{TEST_PORT}{ROOT}/load-{i}.txt", timeout=30)
+        finally:
+            finished.append(time.time())
+    threads = [threading.Thread(target=load, args=(i,)) for i in range(load_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cached = wait_until_cached('load')
+    after = read_counters('prefetch_throttle')
+
+    # The load is at its height from shortly after it starts until the first
+    # of its requests finishes
+    window = (load_started + 0.5, min(finished) - 0.2)
+    with requested_lock:
+        starts = [when for path in asset_paths('load') for when in requested.get(path, [])]
+    during = [when for when in starts if window[0] < when < window[1]]
+    print(f"  {load_count} client requests served for {max(finished) - load_started:.1f}s, "
+          f"load at its height for {window[1] - window[0]:.1f}s")
+    passed = check(f"no prefetch started at the height of the load ({len(during)} did)", not during)
+    passed = check("prefetching was paused", after['paused'] > throttle['paused']) and passed
+    return check(f"assets prefetched once the load had gone ({cached} of {ASSET_COUNT})",
+                 cached == ASSET_COUNT) and passed
+
+def test_prefetch_throttle():
+    """Test if prefetching backs off under client load and drops prefetches no longer wanted."""
+    print("\nTesting BONUS FEATURE 25: Prefetch Throttling")
+    print("=" * 70)
+
+    try:
+        throttle = read_counters('prefetch_throttle')
+        if not throttle:
+            print("TEST FAILED: The proxy did not report prefetch throttle counters.")
+            return False
+        print(f"Prefetching slows down at {throttle['max_active']} active client requests, "
+              f"{throttle['max_queue_depth']} waiting connections or {throttle['max_latency_ms']}ms origin latency")
+
+        print("\nPage whose last assets the client asks for itself:")
+        passed = check_cancelled()
+        print("\nPage requested just before a burst of slow client requests:")
+        passed = check_paused(throttle) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Prefetching gave way to clients!")
+    else:
+        print("\nTEST FAILED: Prefetching did not give way to clients.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_prefetch_throttle()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
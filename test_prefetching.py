@@ -17,6 +17,8 @@ import http.server
 import socketserver
 import shutil
 
+from proxy_cache import CACHE_ROOT, get_cache_url, get_hashed_location, get_url_location
+
 # Proxy settings
 PROXY_HOST = 'localhost'
 PROXY_PORT = 8081  # Update this if you're using a different port
@@ -25,7 +27,12 @@ PROXY_PORT = 8081  # Update this if you're using a different port
 TEST_HOST = 'localhost'
 TEST_PORT = 8000  # Port for our test server
 TEST_DIR = './testserver'
-CACHE_DIR = './' + TEST_HOST + '_' + str(TEST_PORT)  # Where the proxy will cache files
+# The proxy's cache, resolved before the test server changes directory
+CACHE_DIR = os.path.abspath(CACHE_ROOT)
+
+def get_cache_path(resource):
+    """Return where the proxy caches a resource of the test server."""
+    return get_hashed_location(get_cache_url(TEST_HOST, TEST_PORT, resource), CACHE_DIR)
 
 def setup_test_server():
     """Set up a test server with HTML files that have resources to prefetch."""
@@ -118,8 +125,7 @@ def check_prefetched_files():
         '/style.css',
         '/script.js',
         '/image1.jpg',
-        '/image2.jpg',
-        '/page2.html'
+        '/image2.jpg'
     ]
     
     print("\nChecking for prefetched resources:")
@@ -127,7 +133,7 @@ def check_prefetched_files():
     
     all_found = True
     for resource in resources:
-        cache_path = CACHE_DIR + resource
+        cache_path = get_cache_path(resource)
         if os.path.exists(cache_path):
             print(f"✓ Found prefetched resource: {resource}")
         else:
@@ -148,8 +154,11 @@ def test_prefetching():
     print("=" * 70)
     
     # Clean up any existing cache
-    if os.path.exists(CACHE_DIR):
-        shutil.rmtree(CACHE_DIR)
+    for resource in ['/index.html', '/style.css', '/script.js', '/image1.jpg', '/image2.jpg']:
+        cache_path = get_cache_path(resource)
+        for path in (cache_path, get_url_location(cache_path)):
+            if os.path.exists(path):
+                os.unlink(path)
     
     # Connect to proxy
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 20: Range Requests
+This script tests if your proxy answers Range requests in part:
+1. Starts a test server with binary objects whose bodies arrive in two
+   halves, DELAY seconds apart
+2. Asks for the first bytes of an object that is not cached yet and checks
+   that they come back as 206 Partial Content before the whole object has
+   arrived from the test server
+3. Asks for single, suffix and multiple ranges of the cached object and of a
+   small object held in memory, checking the bytes, Content-Range and the
+   multipart/byteranges body, and for unsatisfiable ranges (416) and ranges
+   with a stale If-Range (whole object)
+"""
+
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8099  # Port for our test server
+DELAY = 2  # Seconds between the two halves of a large body
+ETAG = '"range-v1"'
+rng = random.Random(20)
+LARGE_BODY = bytes(rng.randrange(256) for i in range(2 * 1024 * 1024))
+SMALL_BODY = bytes(rng.randrange(256) for i in range(4000))
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves the binary objects, large ones in two halves."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Handle GET requests."""
+        body = SMALL_BODY if '/small-' in self.path else LARGE_BODY
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body is SMALL_BODY:
+            self.wfile.write(body)
+            return
+        half = len(body) // 2
+        self.wfile.write(body[:half])
+        self.wfile.flush()
+        time.sleep(DELAY)
+        self.wfile.write(body[half:])
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), RangeHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url, headers=()):
+    """Request url through the proxy; returns (status, headers dict, body)."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n"
+        for header in headers:
+            request += header + "\r\n"
+        client_socket.sendall((request + "\r\n").encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        head, _, body = response.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        response_headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        return int(lines[0].split()[1]), response_headers, body
+    finally:
+        client_socket.close()
+
+def read_multipart(headers, body):
+    """Split a multipart/byteranges body into a list of (Content-Range, bytes)."""
+    boundary = re.search(r'boundary=(\S+)', headers.get('content-type', '')).group(1).encode()
+    parts = []
+    for part in body.split(b'--' + boundary)[1:]:
+        if part.startswith(b'--'):
+            break
+        part_head, _, data = part.partition(b'\r\n\r\n')
+        content_range = re.search(rb'Content-Range: (.*)', part_head).group(1).strip().decode()
+        parts.append((content_range, data[:-2] if data.endswith(b'\r\n') else data))
+    return parts
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_range(url, original, spec, first, last, headers=()):
+    """A single range comes back as 206 with the right bytes and Content-Range."""
+    status, response_headers, body = fetch(url, [f"Range: {spec}"] + list(headers))
+    return check(f"{spec} answered with bytes {first}-{last}",
+                 status == 206 and body == original[first:last + 1]
+                 and response_headers.get('content-range') == f"bytes {first}-{last}/{len(original)}"
+                 and response_headers.get('content-length') == str(len(body)))
+
+def check_cached(url, original):
+    """Ranges of a cached object are answered in part."""
+    size = len(original)
+    passed = check_range(url, original, "bytes=1000-1999", 1000, 1999)
+    passed = check_range(url, original, "bytes=-500", size - 500, size - 1) and passed
+    passed = check_range(url, original, f"bytes={size - 10}-", size - 10, size - 1) and passed
+    passed = check_range(url, original, "bytes=100-199", 100, 199, [f"If-Range: {ETAG}"]) and passed
+
+    status, headers, body = fetch(url, ["Range: bytes=0-9, 3000-3099, 20-29"])
+    parts = read_multipart(headers, body) if status == 206 else []
+    passed = check("several ranges answered as multipart/byteranges",
+                   headers.get('content-type', '').startswith('multipart/byteranges')
+                   and headers.get('content-length') == str(len(body))
+                   and parts == [(f"bytes 0-9/{size}", original[0:10]), (f"bytes 20-29/{size}", original[20:30]),
+                                 (f"bytes 3000-3099/{size}", original[3000:3100])]) and passed
+
+    status, headers, body = fetch(url, [f"Range: bytes={size}-"])
+    passed = check("unsatisfiable range answered with 416",
+                   status == 416 and headers.get('content-range') == f"bytes */{size}") and passed
+
+    status, headers, body = fetch(url, ["Range: bytes=0-9", 'If-Range: "changed"'])
+    passed = check("range with a stale If-Range answered with the whole object",
+                   status == 200 and body == original) and passed
+    return passed
+
+def test_range_requests():
+    """Test if Range requests are answered with 206 from the cache, and early on a miss."""
+    print("\nTesting BONUS FEATURE 20: Range Requests")
+    print("=" * 70)
+
+    # Fresh paths per run, so copies cached by an earlier run are not used
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    large_url = f"http://{TEST_HOST}:{TEST_PORT}/video-{run_id}.bin"
+    small_url = f"http://{TEST_HOST}:{TEST_PORT}/small-{run_id}.bin"
+    try:
+        print(f"\nFirst bytes of an object that is not cached yet:")
+        start_time = time.time()
+        passed = check_range(large_url, LARGE_BODY, "bytes=0-99", 0, 99)
+        elapsed = time.time() - start_time
+        print(f"  answered after {elapsed:.2f}s")
+        passed = check("answered before the whole object arrived", elapsed < DELAY) and passed
+
+        # The tail arrives with the second half of the body
+        passed = check_range(large_url, LARGE_BODY, "bytes=-100", len(LARGE_BODY) - 100,
+                             len(LARGE_BODY) - 1) and passed
+        status, headers, body = fetch(large_url)
+        passed = check("whole object cached", status == 200 and body == LARGE_BODY) and passed
+
+        print(f"\nRanges of the cached object ({len(LARGE_BODY)} bytes):")
+        passed = check_cached(large_url, LARGE_BODY) and passed
+
+        print(f"\nRanges of a small object ({len(SMALL_BODY)} bytes):")
+        fetch(small_url)
+        passed = check_cached(small_url, SMALL_BODY) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    if passed:
+        print("\nTEST PASSED: Range requests were answered in part, from the cache and early on a miss!")
+    else:
+        print("\nTEST FAILED: Range requests were not answered as expected.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_range_requests()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
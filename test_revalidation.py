@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 12: Conditional Revalidation
+This script tests if your proxy revalidates stale cached copies:
+1. Starts a test server that serves an asset with an ETag, a Last-Modified
+   date and a short max-age, and answers matching conditional requests
+   with 304 Not Modified
+2. Requests the asset through the proxy, waits for the cached copy to go
+   stale and requests it again
+3. Checks that the second request was sent with the validators, that the
+   origin answered 304 and that the client still received the whole asset
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8096  # Port for our test server
+MAX_AGE = 1
+ETAG = '"asset-v1"'
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+ASSET_BODY = b'/* revalidated asset */\n' * 4000
+
+# (status, If-None-Match, If-Modified-Since) of every request the test server answered
+origin_log = []
+
+class ValidatingHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that answers conditional requests for the asset with 304."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        if_none_match = self.headers.get('If-None-Match')
+        if_modified_since = self.headers.get('If-Modified-Since')
+        status = 304 if if_none_match == ETAG or if_modified_since == LAST_MODIFIED else 200
+        origin_log.append((status, if_none_match, if_modified_since))
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/javascript')
+        self.send_header('Cache-Control', f'max-age={MAX_AGE}')
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        if status == 304:
+            self.end_headers()
+            return
+        self.send_header('Content-Length', str(len(ASSET_BODY)))
+        self.end_headers()
+        self.wfile.write(ASSET_BODY)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), ValidatingHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return (status line, body)."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        head, _, body = response.partition(b'\r\n\r\n')
+        return head.split(b'\r\n')[0].decode(), body
+    finally:
+        client_socket.close()
+
+def test_revalidation():
+    """Test if a stale cached copy is revalidated instead of downloaded again."""
+    print("\nTesting BONUS FEATURE 12: Conditional Revalidation")
+    print("=" * 70)
+
+    # A fresh path per run, so a copy cached by an earlier run is not revalidated first
+    url = f"http://{TEST_HOST}:{TEST_PORT}/asset-{os.getpid()}-{int(time.time())}.js"
+    try:
+        first_status, first_body = fetch(url)
+        print(f"First request: {first_status} ({len(first_body)} bytes)")
+        print(f"Waiting {MAX_AGE + 1} seconds for the cached copy to go stale...")
+        time.sleep(MAX_AGE + 1)
+        second_status, second_body = fetch(url)
+        print(f"Second request: {second_status} ({len(second_body)} bytes)")
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+
+    print(f"Origin answered: {[entry[0] for entry in origin_log]}")
+
+    passed = True
+    if first_body != ASSET_BODY or second_body != ASSET_BODY:
+        print("TEST FAILED: The client did not receive the whole asset.")
+        passed = False
+    if second_status.split()[1:2] != ['200']:
+        print("TEST FAILED: The revalidated asset was not served with status 200.")
+        passed = False
+    if len(origin_log) != 2 or origin_log[1] != (304, ETAG, LAST_MODIFIED):
+        print("TEST FAILED: The stale copy was not revalidated with If-None-Match and If-Modified-Since.")
+        passed = False
+    if passed:
+        print("TEST PASSED: The stale copy was revalidated and served from the cache!")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    httpd = start_test_server()
+    try:
+        success = test_revalidation()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)
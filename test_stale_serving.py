@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 14: Stale-While-Revalidate and Stale-If-Error
+This script tests if your proxy serves stale copies when it may:
+1. Starts a test server whose assets carry a short max-age together with
+   stale-while-revalidate or stale-if-error directives, and whose answers
+   carry a version number
+2. Lets a cached copy go stale while the origin is slow, and checks that
+   the stale copy is served at once and refreshed in the background
+3. Lets a cached copy go stale while the origin fails with 503, and then
+   while it is down, and checks that the stale copy is served instead of
+   an error
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8081  # Update this if you're using a different port
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8098  # Port for our test server
+MAX_AGE = 1
+SLOW_DELAY = 2  # Seconds the origin takes to answer once it is slow
+
+# How the test server behaves: 'normal', 'slow' or 'failing'
+origin_state = {'mode': 'normal', 'version': 0}
+
+class VersionedHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that answers with a new version of the asset every time."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        if origin_state['mode'] == 'failing':
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if origin_state['mode'] == 'slow':
+            time.sleep(SLOW_DELAY)
+
+        origin_state['version'] += 1
+        body = f"version {origin_state['version']}".encode()
+        directive = 'stale-while-revalidate=60' if '/swr-' in self.path else 'stale-if-error=60'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Cache-Control', f'max-age={MAX_AGE}, {directive}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), VersionedHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy and return (status line, body, seconds taken)."""
+    start_time = time.time()
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(15)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data:
+                break
+            response += data
+        head, _, body = response.partition(b'\r\n\r\n')
+        return head.split(b'\r\n')[0].decode(), body.decode(), time.time() - start_time
+    finally:
+        client_socket.close()
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_stale_while_revalidate(run_id):
+    """A stale copy within its stale-while-revalidate window is served at once and refreshed."""
+    print("\nStale-while-revalidate:")
+    url = f"http://{TEST_HOST}:{TEST_PORT}/swr-{run_id}.txt"
+    _, first, _ = fetch(url)
+    time.sleep(MAX_AGE + 1)
+
+    origin_state['mode'] = 'slow'
+    _, stale, elapsed = fetch(url)
+    print(f"  stale request answered with '{stale}' in {elapsed:.2f}s")
+    passed = check("stale copy served without waiting for the slow origin",
+                   stale == first and elapsed < SLOW_DELAY / 2)
+
+    # Give the background refresh time to finish
+    time.sleep(SLOW_DELAY + 0.5)
+    origin_state['mode'] = 'normal'
+    _, refreshed, _ = fetch(url)
+    print(f"  next request answered with '{refreshed}'")
+    passed = check("copy refreshed in the background", refreshed not in ('', first)) and passed
+    return passed
+
+def check_stale_if_error(run_id, httpd):
+    """A stale copy within its stale-if-error window is served when the origin fails."""
+    print("\nStale-if-error:")
+    url = f"http://{TEST_HOST}:{TEST_PORT}/sie-{run_id}.txt"
+    _, first, _ = fetch(url)
+    time.sleep(MAX_AGE + 1)
+
+    origin_state['mode'] = 'failing'
+    status, body, _ = fetch(url)
+    print(f"  origin answering 503: got '{status}' with '{body}'")
+    passed = check("stale copy served instead of the 503", status.split()[1:2] == ['200'] and body == first)
+
+    # Take the origin server down completely
+    httpd.shutdown()
+    httpd.server_close()
+    status, body, _ = fetch(url)
+    print(f"  origin down: got '{status}' with '{body}'")
+    passed = check("stale copy served instead of a 502", status.split()[1:2] == ['200'] and body == first) and passed
+    return passed
+
+def test_stale_serving():
+    """Test if stale copies are served while revalidating and when the origin fails.
+
+    The test server is started here, since the test takes it down on purpose.
+    """
+    print("\nTesting BONUS FEATURE 14: Stale-While-Revalidate and Stale-If-Error")
+    print("=" * 70)
+    httpd = start_test_server()
+
+    # Fresh paths per run, so copies cached by an earlier run are not used
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    try:
+        passed = check_stale_while_revalidate(run_id)
+        passed = check_stale_if_error(run_id, httpd) and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+        httpd.server_close()
+
+    if passed:
+        print("\nTEST PASSED: Stale copies were served while revalidating and when the origin failed!")
+    else:
+        print("\nTEST FAILED: Stale copies were not served as expected.")
+    return passed
+
+if __name__ == "__main__":
+    # Check if the proxy is running
+    try:
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(2)
+        test_socket.connect((PROXY_HOST, PROXY_PORT))
+        test_socket.close()
+    except:
+        print(f"ERROR: Could not connect to proxy at {PROXY_HOST}:{PROXY_PORT}")
+        print("Make sure your proxy is running before running this test.")
+        sys.exit(1)
+
+    success = test_stale_serving()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Test script for BONUS FEATURE 6: Multi-Process Workers
+This script tests if your proxy's supervisor keeps its workers running:
+1. Starts Proxy-bonus.py with --processes 2 in a scratch directory and
+   checks that the supervisor forked two worker processes
+2. Kills one worker with SIGKILL and checks that the supervisor starts a
+   new one in its place
+3. Requests a page through the proxy several times and checks that every
+   response carries the page, so the workers still serve clients
+
+Unlike most other tests this one needs no running proxy; it starts its own
+on PROXY_PORT. It finds the workers through /proc, so it runs on Linux only.
+"""
+
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import http.server
+import socketserver
+
+# Proxy settings
+PROXY_HOST = 'localhost'
+PROXY_PORT = 8066  # Port the test's own proxy listens on
+PROXY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Proxy-bonus.py')
+PROCESSES = 2
+
+# Test settings
+TEST_HOST = 'localhost'
+TEST_PORT = 8074  # Port for our test server
+START_TIMEOUT = 10
+RESTART_TIMEOUT = 10
+REQUEST_COUNT = 8
+
+run_id = f"{os.getpid()}-{int(time.time())}"
+PAGE_PATH = f"/workers-{run_id}/page.html"
+PAGE = b"<html><body>" + b"<p>Served by a worker process.</p>\n" * 20 + b"</body></html>"
+
+class PageHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler that serves one cacheable page."""
+
+    def do_GET(self):
+        """Handle GET requests."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        """Override to minimize output."""
+        return
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_test_server():
+    """Start the test server in a background thread."""
+    httpd = ThreadingServer((TEST_HOST, TEST_PORT), PageHandler)
+
+    print(f"Starting test server at http://{TEST_HOST}:{TEST_PORT}")
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return httpd
+
+def fetch(url):
+    """Request url through the proxy; returns (header block, body)."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(10)
+    try:
+        client_socket.connect((PROXY_HOST, PROXY_PORT))
+        request = f"GET {url} HTTP/1.1\r\nHost: {TEST_HOST}:{TEST_PORT}\r\nConnection: close\r\n\r\n"
+        client_socket.sendall(request.encode())
+
+        response = b""
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            response += data
+        head, _, body = response.partition(b'\r\n\r\n')
+        return head.decode('utf-8', errors='replace'), body
+    finally:
+        client_socket.close()
+
+def worker_pids(proxy):
+    """Return the pids of the supervisor's child processes."""
+    try:
+        with open(f"/proc/{proxy.pid}/task/{proxy.pid}/children") as f:
+            return {int(pid) for pid in f.read().split()}
+    except FileNotFoundError:
+        return set()
+
+def wait_for_workers(proxy, timeout, exclude=()):
+    """Wait until the supervisor has PROCESSES children, none of them in exclude; returns them."""
+    deadline = time.monotonic() + timeout
+    pids = worker_pids(proxy)
+    while time.monotonic() < deadline and (len(pids) != PROCESSES or pids & set(exclude)):
+        time.sleep(0.1)
+        pids = worker_pids(proxy)
+    return pids
+
+def start_proxy(workDir):
+    """Start Proxy-bonus.py with worker processes in workDir and wait until it accepts connections; None if it does not."""
+    proxy = subprocess.Popen([sys.executable, PROXY_SCRIPT, PROXY_HOST, str(PROXY_PORT), '--processes', str(PROCESSES)],
+                             cwd=workDir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((PROXY_HOST, PROXY_PORT), timeout=1).close()
+            return proxy
+        except OSError:
+            time.sleep(0.05)
+    stop_proxy(proxy)
+    return None
+
+def stop_proxy(proxy):
+    proxy.send_signal(signal.SIGTERM)
+    try:
+        proxy.wait(10)
+    except subprocess.TimeoutExpired:
+        proxy.kill()
+        proxy.wait()
+
+def check(description, passed):
+    """Print the outcome of one check and return it."""
+    print(f"  {'ok' if passed else 'FAILED'}: {description}")
+    return passed
+
+def check_restart(proxy):
+    """A killed worker is replaced by a new one."""
+    workers = wait_for_workers(proxy, START_TIMEOUT)
+    passed = check(f"{PROCESSES} worker processes started ({len(workers)})", len(workers) == PROCESSES)
+    if not workers:
+        return False
+
+    killed = min(workers)
+    os.kill(killed, signal.SIGKILL)
+    print(f"  Killed worker {killed}")
+    restarted = wait_for_workers(proxy, RESTART_TIMEOUT, exclude=[killed])
+    passed = check(f"killed worker gone ({killed} not in {sorted(restarted)})", killed not in restarted) and passed
+    return check(f"{PROCESSES} worker processes running again ({len(restarted)})",
+                 len(restarted) == PROCESSES) and passed
+
+def check_serving():
+    """Every request through the proxy is answered with the page."""
+    url = f"http://{TEST_HOST}:{TEST_PORT}{PAGE_PATH}"
+    # Each connection comes from a new client port, so SO_REUSEPORT spreads
+    # them over the workers
+    responses = [fetch(url) for i in range(REQUEST_COUNT)]
+    served = sum(head.split()[1:2] == ['200'] and body == PAGE for head, body in responses)
+    return check(f"every request answered with the page ({served} of {REQUEST_COUNT})", served == REQUEST_COUNT)
+
+def test_worker_processes():
+    """Test if the supervisor restarts dead worker processes, which go on serving clients."""
+    print("\nTesting BONUS FEATURE 6: Multi-Process Workers")
+    print("=" * 70)
+
+    workDir = tempfile.mkdtemp(prefix='worker-processes-')
+    proxy = start_proxy(workDir)
+    try:
+        if proxy is None:
+            print("TEST FAILED: The proxy did not start with worker processes.")
+            return False
+
+        print("\nWorker killed:")
+        passed = check_restart(proxy)
+        print("\nRequests after the restart:")
+        passed = check_serving() and passed
+    except Exception as e:
+        print(f"Error talking to the proxy: {e}")
+        return False
+    finally:
+        if proxy is not None:
+            stop_proxy(proxy)
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    if passed:
+        print("\nTEST PASSED: The supervisor restarted the dead worker!")
+    else:
+        print("\nTEST FAILED: The supervisor did not keep its workers running.")
+    return passed
+
+if __name__ == "__main__":
+    httpd = start_test_server()
+    try:
+        success = test_worker_processes()
+    finally:
+        print("\nStopping test server...")
+        httpd.shutdown()
+
+    sys.exit(0 if success else 1)